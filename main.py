@@ -23,10 +23,12 @@ from .core.human_behaviors import human_behaviors
 from .utils.deployment import production_manager
 from .utils.performance import system_optimizer
 from src.skills.skill_manager import skill_manager
+from src.skills.skill_watcher import skill_watcher
 from src.discord_integration.native_features import setup_discord_integration
 from src.dashboard.admin_dashboard import admin_dashboard
 from src.utils.optimization_logger import optimization_logger
 from src.models.llm_fallback import llm_system
+from src.models.request_scheduler import RequestPriority
 from src.core.personality import priya_core
 
 # NEW: Import enhanced features
@@ -83,6 +85,9 @@ class PriyaAIAssistant(commands.Bot):
             # Load skills
             logger.info("🛠️ Loading skills...")
             await skill_manager.load_skills()
+            memory_system.add_write_listener(skill_manager.result_cache.invalidate_user)
+            if config.skill_hot_reload:
+                await skill_watcher.start()
             system_optimizer.startup_optimizer.log_step("Skills loaded")
             
             # Setup Discord integration
@@ -124,7 +129,9 @@ class PriyaAIAssistant(commands.Bot):
         """Warm up AI models."""
         try:
             test_messages = [{"role": "user", "content": "Hello"}]
-            await llm_system.generate_response(test_messages, temperature=0.1)
+            await llm_system.generate_response(
+                test_messages, temperature=0.1, priority=RequestPriority.BACKGROUND
+            )
             logger.info("✅ AI models warmed up successfully")
         except Exception as e:
             logger.warning(f"⚠️ Model warmup failed: {e}")
@@ -186,11 +193,8 @@ class PriyaAIAssistant(commands.Bot):
         }
         
         try:
-            # Security: Sanitize input
-            sanitized_content = security_hardening.sanitize_input(message.content)
-            
-            # Security: Check for prompt injection
-            is_injection, patterns = security_hardening.detect_prompt_injection(sanitized_content)
+            # Security: Sanitize input and check it for prompt injection
+            sanitized_content, is_injection, patterns = security_hardening.screen_input(message.content)
             if is_injection:
                 logger.warning(f"Prompt injection blocked from user {user_id}: {patterns}")
                 await message.reply("I can't process that message. Please rephrase your request.")
@@ -305,36 +309,40 @@ class PriyaAIAssistant(commands.Bot):
                 user_id, content, datetime.now().hour
             )
             
-            # Build comprehensive system prompt
-            base_prompt = f"""You are Priya, a 23-year-old Indian AI assistant with a warm, friendly personality.
+            # Build system prompt: stable prefix first so local models reuse its KV cache
+            static_prompt = f"""You are Priya, a 23-year-old Indian AI assistant with a warm, friendly personality.
 
 {personality_prompt}
 
-Current activity: {activity['description']}
+Respond naturally in 1-2 sentences. Use Hinglish when appropriate."""
+
+            dynamic_prompt = f"""Current activity: {activity['description']}
 Mood: {priya_state.mood}
 Energy: {priya_state.energy}
 
 User relationship: {user_ctx.friendship_level}/100 friendship level
 {memory_context}
 
-Response style: Formality {response_style['formality']:.1f}, Enthusiasm {response_style['enthusiasm']:.1f}
-
-Respond naturally in 1-2 sentences. Use Hinglish when appropriate."""
+Response style: Formality {response_style['formality']:.1f}, Enthusiasm {response_style['enthusiasm']:.1f}"""
             
             # Security: Protect system prompt
-            protected_prompt = security_hardening.protect_system_prompt(base_prompt, content)
+            protected_prefix, protected_suffix = security_hardening.protect_prompt_parts(static_prompt, dynamic_prompt)
             
             # Generate response with timing
             messages = [
-                {"role": "system", "content": protected_prompt},
+                {"role": "system", "content": protected_prefix},
+                {"role": "system", "content": protected_suffix},
                 {"role": "user", "content": content}
             ]
             
+            # Direct mentions jump ahead of ambient chatter
+            priority = RequestPriority.MENTION if self.user in message.mentions else RequestPriority.AMBIENT
+            
             # Show typing with natural delay
             async with message.channel.typing():
                 await asyncio.sleep(natural_delay)
                 
-                response = await llm_system.generate_response(messages)
+                response = await llm_system.generate_response(messages, priority=priority)
             
             if response:
                 # Apply human behaviors
@@ -425,10 +433,52 @@ Respond naturally in 1-2 sentences. Use Hinglish when appropriate."""
         
         success = await model_swapper.switch_model(model_name)
         if success:
-            await ctx.send(f"✅ Switched to model: {model_name}")
+            swap = model_swapper.swap_history[-1] if model_swapper.swap_history else {}
+            await ctx.send(
+                f"✅ Switched to model: {model_name} "
+                f"(cutover after {swap.get('cutover_s', 0)}s, drained in {swap.get('drain_s', 0)}s)"
+            )
         else:
             await ctx.send(f"❌ Failed to switch to model: {model_name}")
     
+    @commands.command()
+    async def shadow_model(self, ctx, model_name: str, sample_rate: float = 0.1):
+        """Mirror a sample of live prompts to a candidate model (use 'stop' to end)."""
+        if not ctx.author.guild_permissions.administrator:
+            await ctx.send("❌ Administrator permission required.")
+            return
+        
+        if model_name == "stop":
+            report = model_swapper.stop_shadow()
+            if not report:
+                await ctx.send("No shadow evaluation running.")
+                return
+            lines = [f"🧪 Shadow results for {report['candidate']} vs {report['current']}:"]
+            for role, stats in report["comparison"].items():
+                lines.append(
+                    f"{role}: {stats['requests']} requests, p50 {stats['latency_p50']}s, "
+                    f"p95 {stats['latency_p95']}s, {stats['tokens_per_second']} tok/s, "
+                    f"failure rate {stats['failure_rate']}"
+                )
+            await ctx.send("\n".join(lines))
+        elif model_swapper.start_shadow(model_name, sample_rate):
+            await ctx.send(f"🧪 Shadowing {sample_rate:.0%} of live prompts to {model_name}")
+        else:
+            await ctx.send(f"❌ Cannot shadow model: {model_name}")
+            
+    @commands.command()
+    async def pull_model(self, ctx, model_name: str):
+        """Download a local Ollama model."""
+        if not ctx.author.guild_permissions.administrator:
+            await ctx.send("❌ Administrator permission required.")
+            return
+        
+        await ctx.send(f"⬇️ Pulling {model_name}, this can take a while...")
+        if await llm_system.pull_local_model(model_name):
+            await ctx.send(f"✅ Pulled model: {model_name}")
+        else:
+            await ctx.send(f"❌ Failed to pull model: {model_name}")
+            
     @commands.command()
     async def rate_override(self, ctx, user_id: str, duration: int = 3600):
         """Override rate limits for user."""
@@ -512,7 +562,7 @@ Respond naturally in 1-2 sentences. Use Hinglish when appropriate."""
                 {"role": "user", "content": transcript}
             ]
             
-            response = await llm_system.generate_response(messages)
+            response = await llm_system.generate_response(messages, priority=RequestPriority.VOICE)
             return response or "I didn't catch that, could you repeat?"
             
         except Exception as e:
@@ -538,6 +588,16 @@ Respond naturally in 1-2 sentences. Use Hinglish when appropriate."""
             # Final memory save
             await memory_system.save_memory(force=True)
             
+            # Persist provider quota counters
+            llm_system.quota_manager.persist()
+            
+            # Close the shared rate limit store connection
+            await rate_limiter.backend.close()
+            
+            # Stop skill hot reload and worker pools
+            await skill_watcher.stop()
+            skill_manager.executor.shutdown()
+            
             # Close bot
             await self.close()
             
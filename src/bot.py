@@ -13,6 +13,7 @@ from .utils.logging import logger, perf_logger
 from .utils.concurrency import concurrency_manager, with_timeout
 from .core.personality import priya_core
 from .models.llm_fallback import llm_system
+from .models.request_scheduler import RequestPriority
 from .engines.voice import voice_engine
 from .memory.context_compression import context_compressor
 
@@ -57,7 +58,9 @@ class PriyaBot(commands.Bot):
         try:
             # Test LLM system
             test_messages = [{"role": "user", "content": "Hi"}]
-            await llm_system.generate_response(test_messages, temperature=0.1)
+            await llm_system.generate_response(
+                test_messages, temperature=0.1, priority=RequestPriority.BACKGROUND
+            )
             
             # Test voice engines if available
             if voice_engine.stt_engines or voice_engine.tts_engines:
@@ -278,8 +281,8 @@ class PriyaBot(commands.Bot):
                 # Get context for response (immutable copies)
                 user_ctx, priya_state, activity = await priya_core.get_context_for_response(user_id)
                 
-                # Build system prompt
-                system_prompt = priya_core.personality_engine.build_system_prompt(
+                # Build system prompt (static prefix + per-turn suffix for KV reuse)
+                static_prompt, dynamic_prompt = priya_core.personality_engine.build_system_prompt_parts(
                     user_ctx, priya_state, activity
                 )
                 
@@ -290,7 +293,8 @@ class PriyaBot(commands.Bot):
                 
                 # Add current message
                 messages = [
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": static_prompt},
+                    {"role": "system", "content": dynamic_prompt},
                     *history,
                     {"role": "user", "content": message.content}
                 ]
@@ -305,7 +309,8 @@ class PriyaBot(commands.Bot):
                     await asyncio.sleep(delay)
                     
                     # Generate response
-                    response = await llm_system.generate_response(messages)
+                    priority = RequestPriority.MENTION if is_mention else RequestPriority.AMBIENT
+                    response = await llm_system.generate_response(messages, priority=priority)
                     
                     if response:
                         # Add natural emojis occasionally
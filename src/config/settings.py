@@ -15,6 +15,10 @@ class ModelConfigSchema(BaseModel):
     max_retries: int = Field(default=3, ge=0, le=10)
     temperature: float = Field(default=0.95, ge=0.0, le=2.0)
     max_tokens: int = Field(default=200, ge=10, le=4000)
+    local_keep_alive: str = Field(default="30m")  # Keep local models (and their KV cache) resident
+    local_num_ctx: int = Field(default=4096, ge=512, le=131072)  # Fixed so Ollama never reloads the runner
+    local_memory_budget_mb: int = Field(default=8192, ge=1024, le=524288)  # RAM/VRAM for resident local models
+    local_pinned_models: int = Field(default=2, ge=0, le=8)  # Hottest models kept loaded with a long keep_alive
 
 class VoiceConfigSchema(BaseModel):
     """Voice processing configuration schema."""
@@ -43,6 +47,22 @@ class SecurityConfigSchema(BaseModel):
     enable_output_filtering: bool = True
     max_input_length: int = Field(default=4000, ge=100, le=10000)
 
+class LocalInferenceConfigSchema(BaseModel):
+    """OpenAI-compatible local inference server (llama.cpp server, vLLM, ...) schema."""
+    url: Optional[str] = None  # e.g. http://localhost:8080/v1
+    model: str = "local"
+    api_key: Optional[str] = None
+    parallel: int = Field(default=4, ge=1, le=64)  # Match the server's slot / batch size
+    pack_window_ms: int = Field(default=0, ge=0, le=100)  # 0 disables request packing
+
+class RateLimitConfigSchema(BaseModel):
+    """Shared rate limit store schema (per-process limits when redis_url is unset)."""
+    redis_url: Optional[str] = None  # e.g. redis://localhost:6379/0
+    key_prefix: str = "priya:rl:"
+    batch_window_ms: int = Field(default=2, ge=0, le=50)  # Coalesce checks into one round-trip
+    timeout_ms: int = Field(default=250, ge=10, le=5000)
+    retry_interval: int = Field(default=30, ge=1, le=600)  # Seconds on local limits after a store failure
+
 class ConfigValidationError(Exception):
     """Configuration validation error."""
     pass
@@ -61,6 +81,8 @@ class Config:
         self.memory = self._load_memory_config()
         self.concurrency = self._load_concurrency_config()
         self.security = self._load_security_config()
+        self.local_inference = self._load_local_inference_config()
+        self.rate_limit = self._load_rate_limit_config()
         
         # API Keys (optional)
         self.api_keys = self._load_api_keys()
@@ -76,6 +98,9 @@ class Config:
         # Local-only mode
         self.local_only = os.getenv("LOCAL_ONLY", "false").lower() == "true"
         
+        # Reload skill files when they change on disk
+        self.skill_hot_reload = os.getenv("SKILL_HOT_RELOAD", "true").lower() == "true"
+        
         # Validate configuration
         self._validate_config()
     
@@ -97,7 +122,11 @@ class Config:
             "timeout": int(os.getenv("MODEL_TIMEOUT", "30")),
             "max_retries": int(os.getenv("MODEL_MAX_RETRIES", "3")),
             "temperature": float(os.getenv("MODEL_TEMPERATURE", "0.95")),
-            "max_tokens": int(os.getenv("MODEL_MAX_TOKENS", "200"))
+            "max_tokens": int(os.getenv("MODEL_MAX_TOKENS", "200")),
+            "local_keep_alive": os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+            "local_num_ctx": int(os.getenv("OLLAMA_NUM_CTX", "4096")),
+            "local_memory_budget_mb": int(os.getenv("OLLAMA_MEMORY_BUDGET_MB", "8192")),
+            "local_pinned_models": int(os.getenv("OLLAMA_PINNED_MODELS", "2"))
         }
         
         try:
@@ -160,6 +189,36 @@ class Config:
         except Exception as e:
             raise ConfigValidationError(f"Invalid security configuration: {e}")
     
+    def _load_local_inference_config(self) -> LocalInferenceConfigSchema:
+        """Load and validate local inference server configuration."""
+        config_data = {
+            "url": os.getenv("LOCAL_OPENAI_URL") or None,
+            "model": os.getenv("LOCAL_OPENAI_MODEL", "local"),
+            "api_key": os.getenv("LOCAL_OPENAI_API_KEY") or None,
+            "parallel": int(os.getenv("LOCAL_OPENAI_PARALLEL", "4")),
+            "pack_window_ms": int(os.getenv("LOCAL_OPENAI_PACK_MS", "0"))
+        }
+        
+        try:
+            return LocalInferenceConfigSchema(**config_data)
+        except Exception as e:
+            raise ConfigValidationError(f"Invalid local inference configuration: {e}")
+            
+    def _load_rate_limit_config(self) -> RateLimitConfigSchema:
+        """Load and validate rate limit store configuration."""
+        config_data = {
+            "redis_url": os.getenv("RATE_LIMIT_REDIS_URL") or None,
+            "key_prefix": os.getenv("RATE_LIMIT_KEY_PREFIX", "priya:rl:"),
+            "batch_window_ms": int(os.getenv("RATE_LIMIT_BATCH_MS", "2")),
+            "timeout_ms": int(os.getenv("RATE_LIMIT_TIMEOUT_MS", "250")),
+            "retry_interval": int(os.getenv("RATE_LIMIT_RETRY_INTERVAL", "30"))
+        }
+        
+        try:
+            return RateLimitConfigSchema(**config_data)
+        except Exception as e:
+            raise ConfigValidationError(f"Invalid rate limit configuration: {e}")
+            
     def _load_api_keys(self) -> Dict[str, Optional[str]]:
         """Load API keys with validation."""
         api_keys = {
@@ -227,8 +286,11 @@ class Config:
             "memory": self.memory.dict(),
             "concurrency": self.concurrency.dict(),
             "security": self.security.dict(),
+            "local_inference": self.local_inference.dict(exclude={"api_key"}),
+            "rate_limit": self.rate_limit.dict(exclude={"redis_url"}),
             "log_level": self.log_level,
             "local_only": self.local_only,
+            "skill_hot_reload": self.skill_hot_reload,
             "api_keys_configured": [k for k, v in self.api_keys.items() if v]
         }
 
@@ -3,7 +3,7 @@ import json
 import asyncio
 import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
 from pathlib import Path
 from ..utils.logging import logger
@@ -390,6 +390,15 @@ class PersonalityEngine:
     
     def build_system_prompt(self, user_ctx: UserContext, priya_state: PriyaState, activity: Dict) -> str:
         """Build comprehensive system prompt."""
+        static_prompt, dynamic_prompt = self.build_system_prompt_parts(user_ctx, priya_state, activity)
+        return f"{static_prompt}\n{dynamic_prompt}"
+        
+    def build_system_prompt_parts(self, user_ctx: UserContext, priya_state: PriyaState, activity: Dict) -> Tuple[str, str]:
+        """Build system prompt as (static prefix, per-turn suffix).
+        
+        The prefix is byte-identical across turns so local models can reuse
+        its KV cache; anything that changes per user or per turn goes last.
+        """
         friendship = user_ctx.friendship_level
         relationship_stage = self._get_relationship_stage(friendship)
         
@@ -427,11 +436,8 @@ COMMUNICATION:
 - Length: 2-3 sentences for text
 - Use emojis naturally"""
 
-        return f"""{identity}
-{relationship}
-{emotional}
+        static_prompt = f"""{identity}
 {personality}
-{communication}
 
 CRITICAL INSTRUCTIONS:
 - Be COMPLETELY HUMAN - you ARE Priya
@@ -439,9 +445,15 @@ CRITICAL INSTRUCTIONS:
 - Use Hinglish naturally
 - Remember everything
 - Learn and grow from interactions
-- Be vulnerable, real, genuine
+- Be vulnerable, real, genuine"""
+
+        dynamic_prompt = f"""{relationship}
+{emotional}
+{communication}
 
 Generate response now."""
+
+        return static_prompt, dynamic_prompt
     
     def _get_relationship_stage(self, friendship_level: int) -> str:
         """Get relationship stage based on friendship level."""
@@ -13,6 +13,7 @@ import uvicorn
 from ..utils.logging import logger
 from ..memory.persistent_memory import memory_system
 from ..skills.skill_manager import skill_manager
+from ..skills.skill_watcher import skill_watcher
 
 # Security
 security = HTTPBearer()
@@ -156,7 +157,7 @@ class AdminDashboard:
         @self.app.get("/api/skills")
         async def get_skills(token: str = Depends(self.verify_token)):
             """Get loaded skills information."""
-            return {"skills": skill_manager.get_skill_info()}
+            return {"skills": skill_manager.get_skill_info(), "watcher": skill_watcher.get_status()}
         
         @self.app.post("/api/skills/reload")
         async def reload_skill(request: Request, token: str = Depends(self.verify_token)):
@@ -170,6 +171,57 @@ class AdminDashboard:
                 self.log_action(f"Skill {skill_name} reloaded successfully")
                 return {"success": True, "message": f"Skill {skill_name} reloaded"}
             raise HTTPException(500, f"Failed to reload skill {skill_name}")
+            
+        @self.app.get("/api/models")
+        async def get_models(token: str = Depends(self.verify_token)):
+            """Get local model selection and residency."""
+            from ..models.llm_fallback import llm_system
+            from ..models.model_swapper import model_swapper
+            return {
+                "swapper": model_swapper.get_model_status(),
+                "residency": llm_system.residency.get_status()
+            }
+            
+        @self.app.post("/api/models/shadow")
+        async def start_shadow(request: Request, token: str = Depends(self.verify_token)):
+            """Start mirroring a sample of live prompts to a candidate model."""
+            data = await request.json()
+            model = data.get("model")
+            if not model:
+                raise HTTPException(400, "model required")
+            from ..models.model_swapper import model_swapper
+            if not model_swapper.start_shadow(model, float(data.get("sample_rate", 0.1))):
+                raise HTTPException(400, f"Cannot shadow model {model}")
+            self.log_action(f"Started shadow evaluation of {model}")
+            return {"success": True, "shadow": model_swapper.get_shadow_status()}
+            
+        @self.app.get("/api/models/shadow")
+        async def get_shadow(token: str = Depends(self.verify_token)):
+            """Get the current vs candidate comparison."""
+            from ..models.model_swapper import model_swapper
+            return {"shadow": model_swapper.get_shadow_status()}
+            
+        @self.app.delete("/api/models/shadow")
+        async def stop_shadow(token: str = Depends(self.verify_token)):
+            """Stop shadow evaluation and return the final comparison."""
+            from ..models.model_swapper import model_swapper
+            report = model_swapper.stop_shadow()
+            if report:
+                self.log_action(f"Stopped shadow evaluation of {report['candidate']}")
+            return {"shadow": report}
+            
+        @self.app.post("/api/models/pull")
+        async def pull_model(request: Request, token: str = Depends(self.verify_token)):
+            """Download a local model."""
+            data = await request.json()
+            model = data.get("model")
+            if not model:
+                raise HTTPException(400, "model required")
+            from ..models.llm_fallback import llm_system
+            if await llm_system.pull_local_model(model):
+                self.log_action(f"Pulled local model {model}")
+                return {"success": True, "message": f"Model {model} pulled"}
+            raise HTTPException(500, f"Failed to pull model {model}")
     
     def log_action(self, message: str):
         """Log admin action."""
@@ -77,6 +77,7 @@ class ContextCompressor:
         """Create summary of text chunk."""
         try:
             from ..models.llm_fallback import llm_system
+            from ..models.request_scheduler import RequestPriority
             
             summary_prompt = f"""Summarize this conversation chunk in 2-3 sentences, focusing on:
 1. Key topics discussed
@@ -89,7 +90,9 @@ Conversation:
 Summary:"""
             
             messages = [{"role": "user", "content": summary_prompt}]
-            summary = await llm_system.generate_response(messages, temperature=0.3)
+            summary = await llm_system.generate_response(
+                messages, temperature=0.3, priority=RequestPriority.BACKGROUND
+            )
             
             return summary.strip() if summary else None
             
@@ -3,7 +3,7 @@ import sqlite3
 import json
 import asyncio
 import aiosqlite
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from datetime import datetime
 from pathlib import Path
 import numpy as np
@@ -25,6 +25,7 @@ class MemorySystem:
         self.encoder = None
         self.index = faiss.IndexFlatIP(vector_dim)
         self.memory_map = {}
+        self.write_listeners: List[Callable[[Optional[str]], None]] = []
         
         self._init_task = asyncio.create_task(self._async_init())
     
@@ -109,11 +110,24 @@ class MemorySystem:
                 self.index.add(embedding.reshape(1, -1))
                 self.memory_map[self.index.ntotal - 1] = memory_id
             
+            self._notify_write(user_id)
             return memory_id
             
         except Exception as e:
             logger.error(f"Failed to save memory: {e}")
             return -1
+            
+    def add_write_listener(self, listener: Callable[[Optional[str]], None]):
+        """Call listener(user_id) after a user's memories change (None: any user's)."""
+        self.write_listeners.append(listener)
+        
+    def _notify_write(self, user_id: Optional[str]):
+        """Tell listeners that memories changed."""
+        for listener in self.write_listeners:
+            try:
+                listener(user_id)
+            except Exception as e:
+                logger.error(f"Memory write listener failed: {e}")
     
     async def retrieve_memory(
         self, 
@@ -214,6 +228,9 @@ class MemorySystem:
                     self.memory_map = {}
                     await self._load_vectors()
                     
+                    if deleted:
+                        self._notify_write(None)
+        
         except Exception as e:
             logger.error(f"Memory cleanup failed: {e}", 
                         extra={'error_type': 'memory_cleanup_error'})
@@ -0,0 +1,154 @@
+"""Per-provider circuit breakers driven by live request outcomes."""
+import time
+from collections import deque
+from typing import Dict, Any, Deque, Tuple
+from ..utils.logging import logger
+
+class ProviderCircuitBreaker:
+    """Sliding-window circuit breaker with half-open probing and exponential cool-down.
+
+    Unlike ``helpers.CircuitBreaker`` (consecutive failure count) this trips on
+    the error/timeout rate over a time window, so a provider that starts
+    failing under real traffic leaves the rotation within seconds.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 30.0,
+        min_requests: int = 4,
+        failure_rate_threshold: float = 0.5,
+        consecutive_failure_threshold: int = 3,
+        base_cooldown: float = 5.0,
+        max_cooldown: float = 300.0
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.failure_rate_threshold = failure_rate_threshold
+        self.consecutive_failure_threshold = consecutive_failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        
+        self.state = "closed"  # closed, open, half-open
+        self.outcomes: Deque[Tuple[float, bool, bool]] = deque()  # (timestamp, success, timeout)
+        self.consecutive_failures = 0
+        self.trip_count = 0  # consecutive trips, drives the exponential cool-down
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.total_trips = 0
+        
+    def _prune(self, now: float):
+        """Drop outcomes that fell out of the sliding window."""
+        while self.outcomes and now - self.outcomes[0][0] > self.window_seconds:
+            self.outcomes.popleft()
+            
+    def _current_cooldown(self) -> float:
+        """Exponential cool-down based on consecutive trips."""
+        return min(self.max_cooldown, self.base_cooldown * (2 ** max(0, self.trip_count - 1)))
+        
+    def is_available(self) -> bool:
+        """Check if the provider may receive traffic (does not change state)."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() >= self.open_until
+        return not self.probe_in_flight
+        
+    def on_dispatch(self):
+        """Mark a request as dispatched; open breakers past cool-down become half-open."""
+        if self.state == "open" and time.monotonic() >= self.open_until:
+            self.state = "half-open"
+            logger.info(f"Circuit breaker for {self.name} half-open, probing")
+        if self.state == "half-open":
+            self.probe_in_flight = True
+            
+    def release_probe(self):
+        """Release a half-open probe that finished without a health verdict."""
+        self.probe_in_flight = False
+        
+    def record_success(self):
+        """Record a successful request."""
+        now = time.monotonic()
+        self._prune(now)
+        self.outcomes.append((now, True, False))
+        self.consecutive_failures = 0
+        
+        if self.state == "half-open":
+            logger.info(f"Circuit breaker for {self.name} closed after successful probe")
+            self.state = "closed"
+            self.trip_count = 0
+            self.outcomes.clear()
+        self.probe_in_flight = False
+        
+    def record_failure(self, timeout: bool = False):
+        """Record a failed or timed-out request."""
+        now = time.monotonic()
+        self._prune(now)
+        self.outcomes.append((now, False, timeout))
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        
+        if self.state == "half-open" or self._should_trip():
+            self._trip(now)
+            
+    def record_timeout(self):
+        """Record a request that timed out."""
+        self.record_failure(timeout=True)
+        
+    def _should_trip(self) -> bool:
+        """Check trip conditions on the sliding window."""
+        if self.state != "closed":
+            return False
+        if self.consecutive_failures >= self.consecutive_failure_threshold:
+            return True
+        if len(self.outcomes) < self.min_requests:
+            return False
+        failures = sum(1 for _, success, _ in self.outcomes if not success)
+        return failures / len(self.outcomes) >= self.failure_rate_threshold
+        
+    def _trip(self, now: float):
+        """Open the breaker."""
+        self.trip_count += 1
+        self.total_trips += 1
+        cooldown = self._current_cooldown()
+        self.state = "open"
+        self.open_until = now + cooldown
+        logger.warning(f"Circuit breaker tripped for {self.name}, cooling down for {cooldown:.0f}s")
+        
+    def get_status(self) -> Dict[str, Any]:
+        """Get breaker status."""
+        now = time.monotonic()
+        self._prune(now)
+        failures = sum(1 for _, success, _ in self.outcomes if not success)
+        timeouts = sum(1 for _, _, timeout in self.outcomes if timeout)
+        return {
+            "state": self.state,
+            "window_requests": len(self.outcomes),
+            "window_failures": failures,
+            "window_timeouts": timeouts,
+            "consecutive_failures": self.consecutive_failures,
+            "cooldown_remaining": max(0.0, round(self.open_until - now, 1)) if self.state == "open" else 0.0,
+            "total_trips": self.total_trips
+        }
+
+class CircuitBreakerRegistry:
+    """Holds one circuit breaker per provider."""
+    
+    def __init__(self, **breaker_kwargs):
+        self.breaker_kwargs = breaker_kwargs
+        self.breakers: Dict[str, ProviderCircuitBreaker] = {}
+        
+    def get(self, name: str) -> ProviderCircuitBreaker:
+        """Get (or create) the breaker for provider."""
+        if name not in self.breakers:
+            self.breakers[name] = ProviderCircuitBreaker(name, **self.breaker_kwargs)
+        return self.breakers[name]
+        
+    def is_available(self, name: str) -> bool:
+        """Check if provider's breaker allows traffic."""
+        return self.get(name).is_available()
+        
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """Get status for all breakers."""
+        return {name: breaker.get_status() for name, breaker in self.breakers.items()}
@@ -0,0 +1,86 @@
+"""Per-request generation budgets: token caps, stop sequences and sentence early-stop."""
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from .request_scheduler import RequestPriority
+
+# Stop before the model starts writing the other side of the conversation
+DEFAULT_STOP: Tuple[str, ...] = ("\nUser:", "\nuser:", "\nHuman:")
+
+@dataclass(frozen=True)
+class GenerationBudget:
+    """How much a single request may generate."""
+    max_tokens: int
+    max_sentences: Optional[int] = None  # None = no sentence cap
+    stop: Tuple[str, ...] = DEFAULT_STOP
+    raises_cap: bool = False  # May go past config.model.max_tokens, never past the provider's limit
+    
+    def token_cap(self, default_cap: int, provider_cap: int) -> int:
+        """Tokens to request: the budget, within the global cap (unless raised) and the provider limit."""
+        cap = self.max_tokens if self.raises_cap else min(self.max_tokens, default_cap)
+        return min(cap, provider_cap)
+
+# Sized to what actually gets sent: the persona asks for 1-2 sentences, voice
+# replies are spoken and should be shorter still. config.model.max_tokens
+# is the ceiling for every budget except long_form, which is only bounded by
+# what the provider can generate.
+GENERATION_BUDGETS: Dict[str, GenerationBudget] = {
+    "voice": GenerationBudget(max_tokens=60, max_sentences=2),
+    "mention": GenerationBudget(max_tokens=120, max_sentences=3),
+    "ambient": GenerationBudget(max_tokens=80, max_sentences=2),
+    "summary": GenerationBudget(max_tokens=150),
+    "long_form": GenerationBudget(max_tokens=4000, raises_cap=True)
+}
+
+CLASS_BUDGETS: Dict[RequestPriority, str] = {
+    RequestPriority.VOICE: "voice",
+    RequestPriority.MENTION: "mention",
+    RequestPriority.AMBIENT: "ambient",
+    RequestPriority.BACKGROUND: "summary"
+}
+
+def budget_for(priority: RequestPriority, budget: Optional[GenerationBudget] = None) -> GenerationBudget:
+    """Get the explicit budget, falling back to the request class default."""
+    if budget is not None:
+        return budget
+    return GENERATION_BUDGETS[CLASS_BUDGETS.get(priority, "mention")]
+
+# Sentence terminator (plus closing quotes and trailing emoji) followed by whitespace;
+# requiring the whitespace means "3." in a half-streamed "3.5" never counts
+_SENTENCE_END = re.compile(r'[.!?…]+["\')\]]*(?:\s+[\u2600-\u27BF\U0001F300-\U0001FAFF]+)*(?=\s)')
+
+class SentenceLimiter:
+    """Accumulates streamed text and reports when the sentence budget is reached."""
+    
+    def __init__(self, max_sentences: Optional[int] = None):
+        self.max_sentences = max_sentences
+        self.text = ""
+        self.sentences = 0
+        self.done = False
+        self._scan_pos = 0
+        
+    def feed(self, chunk: str) -> bool:
+        """Append a chunk; returns True once the budget is reached and text is final."""
+        if self.done:
+            return True
+        self.text += chunk
+        if not self.max_sentences:
+            return False
+        
+        # Only rescan from the end of the last complete sentence
+        while True:
+            match = _SENTENCE_END.search(self.text, self._scan_pos)
+            if not match:
+                return False
+            self.sentences += 1
+            self._scan_pos = match.end()
+            if self.sentences >= self.max_sentences:
+                self.text = self.text[:match.end()]
+                self.done = True
+                return True
+
+def truncate_sentences(text: str, max_sentences: Optional[int]) -> Tuple[str, bool]:
+    """Cut a complete response to max_sentences; returns (text, truncated)."""
+    limiter = SentenceLimiter(max_sentences)
+    limiter.feed(text)
+    return limiter.text.strip(), limiter.done and len(limiter.text.strip()) < len(text.strip())
@@ -0,0 +1,176 @@
+"""Lightweight provider health probes that do not consume generation quota."""
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List, Optional, Any, Tuple
+import aiohttp
+from ..utils.logging import logger
+
+class ProviderHealthProber:
+    """Probes cheap metadata endpoints on a jittered per-provider schedule.
+
+    Probes hit ``/models``-style listing endpoints (or Ollama ``/api/tags``)
+    instead of sending a chat completion, reuse the caller's pooled session,
+    and are skipped entirely while real traffic shows the provider is healthy.
+    """
+    
+    def __init__(
+        self,
+        interval: float = 300.0,
+        failed_interval: float = 60.0,
+        jitter: float = 0.2,
+        passive_window: float = 120.0,
+        timeout: float = 5.0
+    ):
+        self.interval = interval
+        self.failed_interval = failed_interval  # Re-probe failed providers sooner
+        self.jitter = jitter
+        self.passive_window = passive_window
+        self.timeout = timeout
+        self.ollama_host = self._normalize_host(os.getenv("OLLAMA_HOST", "http://localhost:11434"))
+        
+        self.next_probe: Dict[str, float] = {}
+        self.last_success: Dict[str, float] = {}
+        self.last_failure: Dict[str, float] = {}
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        
+    @staticmethod
+    def _normalize_host(host: str) -> str:
+        """Ensure OLLAMA_HOST has a scheme."""
+        host = host.rstrip("/")
+        return host if host.startswith(("http://", "https://")) else f"http://{host}"
+        
+    def probe_url(self, provider) -> Optional[str]:
+        """Get the cheapest endpoint that proves the provider is reachable and the key is valid."""
+        if provider.url == "local":
+            return f"{self.ollama_host}/api/tags"
+        if "huggingface" in provider.name:
+            return f"https://api-inference.huggingface.co/status/{provider.model}"
+        if "anthropic" in provider.name:
+            return "https://api.anthropic.com/v1/models"
+        if "cohere" in provider.name:
+            return "https://api.cohere.ai/v1/models"
+        if provider.url.endswith("/chat/completions"):
+            # OpenAI-compatible APIs list models next to the completions endpoint
+            return provider.url[:-len("/chat/completions")] + "/models"
+        return None
+        
+    def record_traffic(self, name: str, success: bool):
+        """Record the outcome of a real request for passive health."""
+        if success:
+            self.last_success[name] = time.monotonic()
+        else:
+            self.last_failure[name] = time.monotonic()
+            
+    def is_passively_healthy(self, name: str) -> bool:
+        """Check if recent real traffic already proves the provider healthy."""
+        last_success = self.last_success.get(name, 0.0)
+        if time.monotonic() - last_success > self.passive_window:
+            return False
+        return last_success > self.last_failure.get(name, 0.0)
+        
+    def _schedule_next(self, name: str, status: str):
+        """Schedule the next probe with jitter so providers don't probe in lockstep."""
+        base = self.failed_interval if status == "failed" else self.interval
+        spread = base * self.jitter
+        self.next_probe[name] = time.monotonic() + base + random.uniform(-spread, spread)
+        
+    def _is_due(self, name: str, now: float) -> bool:
+        """Check if provider is due for a probe."""
+        if name not in self.next_probe:
+            # Spread the first round over a short window instead of probing everything at once
+            self.next_probe[name] = now + random.uniform(0, self.interval * self.jitter)
+        return now >= self.next_probe[name]
+        
+    async def run_due_probes(self, providers: List[Any], session: aiohttp.ClientSession) -> Dict[str, str]:
+        """Probe due providers; returns provider name -> status value."""
+        now = time.monotonic()
+        results: Dict[str, str] = {}
+        by_url: Dict[str, List[Any]] = {}
+        
+        for provider in providers:
+            if not self._is_due(provider.name, now):
+                continue
+            
+            if self.is_passively_healthy(provider.name):
+                results[provider.name] = "healthy"
+                self._record_stat(provider.name, "passive", 0.0)
+                self._schedule_next(provider.name, "healthy")
+                continue
+            
+            url = self.probe_url(provider)
+            if url:
+                # Providers sharing an endpoint (e.g. two Groq models) share one probe
+                by_url.setdefault(url, []).append(provider)
+        
+        if by_url:
+            outcomes = await asyncio.gather(
+                *(self._fetch(session, url, group[0].headers) for url, group in by_url.items()),
+                return_exceptions=True
+            )
+            for (url, group), outcome in zip(by_url.items(), outcomes):
+                for provider in group:
+                    status, latency = self._evaluate(provider, outcome)
+                    results[provider.name] = status
+                    self._record_stat(provider.name, status, latency)
+                    self._schedule_next(provider.name, status)
+                    if status != "healthy":
+                        logger.warning(f"Health probe for {provider.name} returned {status}")
+        
+        return results
+        
+    async def _fetch(self, session: aiohttp.ClientSession, url: str, headers: Dict[str, str]) -> Tuple[int, Any, float]:
+        """GET a probe endpoint; returns (status, json body or None, latency)."""
+        start_time = time.monotonic()
+        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+            body = None
+            if response.status == 200 and "/api/tags" in url:
+                body = await response.json()
+            else:
+                await response.read()
+            return response.status, body, time.monotonic() - start_time
+            
+    def _evaluate(self, provider, outcome) -> Tuple[str, float]:
+        """Turn a probe outcome into a status value for provider."""
+        if isinstance(outcome, (aiohttp.ClientError, asyncio.TimeoutError, OSError)):
+            logger.warning(f"Health probe failed for {provider.name}: {outcome}")
+            return "failed", 0.0
+        if isinstance(outcome, BaseException):
+            logger.error(f"Health probe error for {provider.name}: {outcome}")
+            return "failed", 0.0
+        
+        status_code, body, latency = outcome
+        if status_code == 200:
+            if body is not None and not self._ollama_has_model(body, provider.model):
+                return "failed", latency
+            return "healthy", latency
+        if status_code in (401, 403, 404):
+            return "failed", latency
+        # 429 / 5xx: reachable but struggling
+        return "degraded", latency
+        
+    @staticmethod
+    def _ollama_has_model(body: Dict, model: str) -> bool:
+        """Check that an Ollama /api/tags listing contains model."""
+        names = {m.get("name", "").split(":")[0] for m in body.get("models", [])}
+        return model.split(":")[0] in names
+        
+    def _record_stat(self, name: str, result: str, latency: float):
+        """Record probe statistics."""
+        stats = self.stats.setdefault(name, {"probes": 0, "passive_skips": 0, "last_result": None, "last_latency": 0.0})
+        if result == "passive":
+            stats["passive_skips"] += 1
+            stats["last_result"] = "healthy (passive)"
+        else:
+            stats["probes"] += 1
+            stats["last_result"] = result
+            stats["last_latency"] = round(latency, 3)
+            
+    def get_status(self, name: str) -> Dict[str, Any]:
+        """Get probe status for provider."""
+        stats = dict(self.stats.get(name, {"probes": 0, "passive_skips": 0, "last_result": None, "last_latency": 0.0}))
+        next_probe = self.next_probe.get(name)
+        stats["next_probe_in"] = round(max(0.0, next_probe - time.monotonic()), 1) if next_probe else None
+        stats["passively_healthy"] = self.is_passively_healthy(name)
+        return stats
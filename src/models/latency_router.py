@@ -0,0 +1,137 @@
+"""Latency-histogram-driven provider routing."""
+import time
+from collections import deque
+from typing import Dict, List, Optional, Any, Deque
+from ..utils.latency import LatencyHistogram, WindowedHistogram
+
+class ProviderLatencyStats:
+    """Live latency and reliability statistics for one provider."""
+    
+    def __init__(self, window_seconds: float = 300.0, alpha: float = 0.2):
+        self.alpha = alpha
+        self.ttft = WindowedHistogram(window_seconds)
+        self.total = WindowedHistogram(window_seconds)
+        self.ewma_latency: Optional[float] = None
+        self.success_rate = 1.0  # EWMA of outcomes
+        self.samples = 0
+        self.failures = 0
+        
+    def record_success(self, total: float, ttft: Optional[float] = None):
+        """Record a successful request."""
+        self.total.record(total)
+        if ttft is not None:
+            self.ttft.record(ttft)
+        self.ewma_latency = total if self.ewma_latency is None else self.alpha * total + (1 - self.alpha) * self.ewma_latency
+        self.success_rate = self.alpha + (1 - self.alpha) * self.success_rate
+        self.samples += 1
+        
+    def record_failure(self):
+        """Record a failed request."""
+        self.success_rate = (1 - self.alpha) * self.success_rate
+        self.failures += 1
+        
+    def get_status(self) -> Dict[str, Any]:
+        """Get latency statistics."""
+        total = self.total.snapshot()
+        ttft = self.ttft.snapshot()
+        return {
+            "samples": self.samples,
+            "failures": self.failures,
+            "success_rate": round(self.success_rate, 3),
+            "ewma_latency": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            "total_p50": _round(total.percentile(50)),
+            "total_p95": _round(total.percentile(95)),
+            "ttft_p50": _round(ttft.percentile(50)),
+            "ttft_p95": _round(ttft.percentile(95))
+        }
+
+def _round(value: Optional[float]) -> Optional[float]:
+    """Round an optional latency for display."""
+    return round(value, 3) if value is not None else None
+
+class LatencyRouter:
+    """Ranks providers by expected latency under quota constraints.
+
+    Expected latency blends windowed p50/p95 of total time and is inflated by
+    the provider's failure rate (a failed attempt costs a failover). Providers
+    with few samples fall back to a prior derived from their static priority,
+    so cold-start ordering matches the configured preference.
+    """
+    
+    def __init__(
+        self,
+        min_samples: int = 5,
+        prior_base: float = 1.0,
+        prior_step: float = 0.25,
+        quota_low_water: float = 0.2,
+        degraded_penalty: float = 1.5,
+        decision_history: int = 20
+    ):
+        self.min_samples = min_samples
+        self.prior_base = prior_base
+        self.prior_step = prior_step
+        self.quota_low_water = quota_low_water
+        self.degraded_penalty = degraded_penalty
+        self.stats: Dict[str, ProviderLatencyStats] = {}
+        self.decisions: Deque[Dict[str, Any]] = deque(maxlen=decision_history)
+        
+    def get(self, name: str) -> ProviderLatencyStats:
+        """Get (or create) stats for provider."""
+        if name not in self.stats:
+            self.stats[name] = ProviderLatencyStats()
+        return self.stats[name]
+        
+    def record_success(self, name: str, total: float, ttft: Optional[float] = None):
+        """Record a successful request for provider."""
+        self.get(name).record_success(total, ttft)
+        
+    def record_failure(self, name: str):
+        """Record a failed request for provider."""
+        self.get(name).record_failure()
+        
+    def prior(self, priority: int) -> float:
+        """Prior expected latency for a provider without enough samples."""
+        return self.prior_base + self.prior_step * max(0, priority - 1)
+        
+    def expected_latency(self, provider, quota_remaining: float = 1.0, degraded: bool = False) -> float:
+        """Score a provider; lower is better."""
+        stats = self.get(provider.name)
+        prior = self.prior(provider.priority)
+        snapshot = stats.total.snapshot()
+        
+        if snapshot.total:
+            observed = 0.7 * snapshot.percentile(50) + 0.3 * snapshot.percentile(95)
+        else:
+            observed = stats.ewma_latency if stats.ewma_latency is not None else prior
+        
+        # Blend towards the prior until enough samples have been seen
+        weight = min(1.0, stats.samples / self.min_samples)
+        expected = weight * observed + (1 - weight) * prior
+        
+        expected /= max(0.05, stats.success_rate)
+        if degraded:
+            expected *= self.degraded_penalty
+        if quota_remaining < self.quota_low_water:
+            # Save the last slice of a provider's quota for when nothing else is left
+            expected *= 1 + (self.quota_low_water - quota_remaining) * 10
+        return expected
+        
+    def rank(self, providers: List[Any], scores: Dict[str, float]) -> List[Any]:
+        """Sort providers by score, falling back to static priority on ties."""
+        return sorted(providers, key=lambda p: (scores[p.name], p.priority))
+        
+    def record_decision(self, priority_class: str, ranked: List[Any], scores: Dict[str, float], chosen: int = 2):
+        """Remember a routing decision for status reporting."""
+        self.decisions.append({
+            "timestamp": time.time(),
+            "priority": priority_class,
+            "chosen": [p.name for p in ranked[:chosen]],
+            "scores": {p.name: round(scores[p.name], 3) for p in ranked}
+        })
+        
+    def get_status(self) -> Dict[str, Any]:
+        """Get latency stats and recent routing decisions."""
+        return {
+            "providers": {name: stats.get_status() for name, stats in self.stats.items()},
+            "recent_decisions": list(self.decisions)
+        }
@@ -1,6 +1,8 @@
 """LLM fallback system with multiple providers and health monitoring."""
 import asyncio
 import aiohttp
+import json
+import threading
 import time
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
@@ -8,6 +10,23 @@ from enum import Enum
 from ..config.settings import config
 from ..utils.logging import logger, perf_logger
 from ..utils.concurrency import with_timeout, with_retry
+from .quota import QuotaManager, estimate_tokens
+from .circuit_breaker import CircuitBreakerRegistry
+from .health_probe import ProviderHealthProber
+from .request_scheduler import PriorityRequestScheduler, RequestPacker, RequestPriority, resolve_deadline
+from .latency_router import LatencyRouter
+from .prompt_cache import PromptEvalStats, merge_system_messages
+from .generation_budget import GenerationBudget, SentenceLimiter, budget_for, truncate_sentences
+from .model_swapper import model_swapper
+from .model_residency import ModelResidencyManager
+from ..utils.security import StreamingSafetyFilter, SAFE_OUTPUT_REFUSAL
+
+EMERGENCY_RESPONSES = [
+    "Arre yaar, all my AI models are acting up right now... 😅 Try again in a moment!",
+    "Sorry, having some technical issues. Give me a sec!",
+    "Hmm, all models are busy right now. That's unusual! Try again?",
+    "Technical difficulties! But I'm still here 💕"
+]
 
 class ModelStatus(Enum):
     HEALTHY = "healthy"
@@ -23,6 +42,12 @@ class ModelProvider:
     headers: Dict[str, str]
     priority: int
     daily_limit: int
+    rpm_limit: int = 0  # 0 = no per-minute limit
+    tpm_limit: int = 0
+    quota_timezone: str = "UTC"  # timezone in which the daily window resets
+    max_parallel: int = 0  # Client-side concurrency limit (0 = none)
+    pack_window_ms: int = 0  # Hold requests briefly so they reach a batching server together
+    max_output_tokens: int = 4096  # Most tokens the provider will generate for one request
     used_today: int = 0
     status: ModelStatus = ModelStatus.UNKNOWN
     last_check: float = 0
@@ -32,11 +57,50 @@ class ModelProvider:
 class LLMFallbackSystem:
     """Multi-provider LLM system with automatic failover."""
     
-    def __init__(self):
-        self.providers = self._init_providers()
-        self.health_check_interval = 300  # 5 minutes
-        self.last_health_check = 0
+    def __init__(self, providers: Optional[List[ModelProvider]] = None, quota_state_file: str = "data/provider_quota.json"):
+        # Explicit providers let load tests point the system at the mock provider server
+        self.providers = sorted(providers, key=lambda p: p.priority) if providers is not None else self._init_providers()
         self._session = None  # Reusable session
+        self.health_prober = ProviderHealthProber(interval=300)
+        self.latency_router = LatencyRouter()
+        self.prompt_eval_stats = PromptEvalStats()
+        self.residency = ModelResidencyManager(
+            memory_budget_mb=config.model.local_memory_budget_mb,
+            max_pinned=config.model.local_pinned_models,
+            default_keep_alive=config.model.local_keep_alive
+        )
+        
+        # Admission control: background work can never hold every slot
+        max_concurrent = config.concurrency.max_concurrent_requests
+        self.request_scheduler = PriorityRequestScheduler("llm", max_concurrent, {
+            RequestPriority.AMBIENT: max(1, max_concurrent // 2),
+            RequestPriority.BACKGROUND: max(1, max_concurrent // 4)
+        })
+        # Ollama serves one generation at a time; latency-sensitive work goes first
+        self.local_scheduler = PriorityRequestScheduler("ollama", 1)
+        # Batching servers take up to max_parallel concurrent requests each
+        self.provider_schedulers = {
+            p.name: PriorityRequestScheduler(p.name, p.max_parallel)
+            for p in self.providers if p.max_parallel and p.url != "local"
+        }
+        self.request_packers = {
+            p.name: RequestPacker(p.pack_window_ms, max(1, p.max_parallel))
+            for p in self.providers if p.pack_window_ms
+        }
+        # The primary local provider serves whatever model the hot-swapper selected
+        self.primary_local = next((p for p in self.providers if p.url == "local"), None)
+        self.quota_manager = QuotaManager(state_file=quota_state_file)
+        self.generation_stats = {"streamed": 0, "early_stopped": 0, "truncated": 0, "unsafe_stopped": 0}
+        self.race_stats = {"races": 0, "hedged": 0, "won_by_primary": 0, "won_by_secondary": 0, "failovers": 0, "exhausted": 0, "timed_out": 0}
+        self.circuit_breakers = CircuitBreakerRegistry()
+        for provider in self.providers:
+            self.quota_manager.register(
+                provider.name, provider.daily_limit,
+                requests_per_minute=provider.rpm_limit,
+                tokens_per_minute=provider.tpm_limit,
+                tz_name=provider.quota_timezone
+            )
+            provider.used_today = self.quota_manager.requests_today(provider.name)
         
     def _init_providers(self) -> List[ModelProvider]:
         """Initialize all available providers."""
@@ -50,6 +114,21 @@ class LLMFallbackSystem:
                 ModelProvider("ollama_mistral", "mistral", "local", {}, 3, 999999)
             ])
         
+        # OpenAI-compatible local server (llama.cpp server, vLLM, ...); concurrent
+        # requests are batched server-side instead of serialized like Ollama
+        local_server = config.local_inference
+        if local_server.url:
+            providers.append(
+                ModelProvider(
+                    "local_openai", local_server.model,
+                    f"{local_server.url.rstrip('/')}/chat/completions",
+                    {"Authorization": f"Bearer {local_server.api_key}"} if local_server.api_key else {},
+                    0, 999999,
+                    max_parallel=local_server.parallel,
+                    pack_window_ms=local_server.pack_window_ms
+                )
+            )
+        
         # Cloud providers
         if config.has_api_key('groq'):
             providers.extend([
@@ -57,13 +136,13 @@ class LLMFallbackSystem:
                     "groq_llama32", "llama-3.2-3b-preview",
                     "https://api.groq.com/openai/v1/chat/completions",
                     {"Authorization": f"Bearer {config.get_api_key('groq')}"},
-                    5, 6000
+                    5, 6000, rpm_limit=30, tpm_limit=6000
                 ),
                 ModelProvider(
                     "groq_llama31", "llama-3.1-8b-instant",
                     "https://api.groq.com/openai/v1/chat/completions",
                     {"Authorization": f"Bearer {config.get_api_key('groq')}"},
-                    6, 6000
+                    6, 6000, rpm_limit=30, tpm_limit=6000
                 )
             ])
         
@@ -73,13 +152,13 @@ class LLMFallbackSystem:
                     "together_llama32", "meta-llama/Llama-3.2-3B-Instruct-Turbo",
                     "https://api.together.xyz/v1/chat/completions",
                     {"Authorization": f"Bearer {config.get_api_key('together')}"},
-                    7, 1000
+                    7, 1000, rpm_limit=60
                 ),
                 ModelProvider(
                     "together_llama31", "meta-llama/Llama-3.1-8B-Instruct-Turbo",
                     "https://api.together.xyz/v1/chat/completions",
                     {"Authorization": f"Bearer {config.get_api_key('together')}"},
-                    8, 1000
+                    8, 1000, rpm_limit=60
                 )
             ])
         
@@ -89,7 +168,8 @@ class LLMFallbackSystem:
                     "huggingface_llama", "meta-llama/Llama-2-7b-chat-hf",
                     "https://api-inference.huggingface.co/models/meta-llama/Llama-2-7b-chat-hf",
                     {"Authorization": f"Bearer {config.get_api_key('huggingface')}"},
-                    9, 10000
+                    9, 10000,
+                    max_output_tokens=2048  # max_length counts the prompt in a 4k context
                 )
             )
         
@@ -99,7 +179,7 @@ class LLMFallbackSystem:
                     "openrouter_free", "mistralai/mistral-7b-instruct:free",
                     "https://openrouter.ai/api/v1/chat/completions",
                     {"Authorization": f"Bearer {config.get_api_key('openrouter')}"},
-                    10, 200
+                    10, 200, rpm_limit=20
                 )
             )
         
@@ -112,7 +192,7 @@ class LLMFallbackSystem:
                         "x-api-key": config.get_api_key('anthropic'),
                         "anthropic-version": "2023-06-01"
                     },
-                    11, 100
+                    11, 100, rpm_limit=5, tpm_limit=20000
                 )
             )
         
@@ -122,7 +202,7 @@ class LLMFallbackSystem:
                     "cohere_free", "command-light",
                     "https://api.cohere.ai/v1/chat",
                     {"Authorization": f"Bearer {config.get_api_key('cohere')}"},
-                    12, 1000
+                    12, 1000, rpm_limit=20
                 )
             )
         
@@ -138,127 +218,291 @@ class LLMFallbackSystem:
             return False
     
     async def health_check(self):
-        """Perform health check on all providers."""
-        if time.time() - self.last_health_check < self.health_check_interval:
+        """Probe providers that are due, using cheap metadata endpoints."""
+        results = await self.health_prober.run_due_probes(self.providers, self._get_session())
+        if not results:
             return
         
-        logger.info("Starting health check for all providers")
-        tasks = []
-        
+        now = time.time()
         for provider in self.providers:
-            if provider.url != "local":
-                tasks.append(self._check_provider_health(provider))
-        
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
-        
-        self.last_health_check = time.time()
-        logger.info("Health check completed")
-    
-    @with_timeout(10)
-    async def _check_provider_health(self, provider: ModelProvider):
-        """Check health of a single provider."""
-        try:
-            test_messages = [{"role": "user", "content": "Hi"}]
-            start_time = time.time()
+            status = results.get(provider.name)
+            if status is None:
+                continue
             
-            async with aiohttp.ClientSession() as session:
-                payload = self._build_payload(provider, test_messages, 0.1)
-                async with session.post(
-                    provider.url, 
-                    headers=provider.headers, 
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as response:
-                    if response.status == 200:
-                        provider.status = ModelStatus.HEALTHY
-                        provider.avg_response_time = time.time() - start_time
-                        provider.error_count = 0
-                    else:
-                        provider.status = ModelStatus.DEGRADED
-                        provider.error_count += 1
-                        
-        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-            provider.status = ModelStatus.FAILED
-            provider.error_count += 1
-            logger.warning(f"Health check failed for {provider.name}: {e}")
-        
-        provider.last_check = time.time()
+            provider.status = ModelStatus(status)
+            provider.last_check = now
+            if provider.status == ModelStatus.HEALTHY:
+                provider.error_count = 0
+            else:
+                provider.error_count += 1
+        
+        logger.debug(f"Health probes completed for {len(results)} providers")
     
-    def get_available_providers(self) -> List[ModelProvider]:
+    def get_available_providers(self, estimated_tokens: int = 0) -> List[ModelProvider]:
         """Get available providers sorted by priority and health."""
         available = []
         
         for provider in self.providers:
-            # Check daily limits
-            if provider.used_today >= provider.daily_limit:
+            # Check daily, per-minute and token limits before upstream returns 429
+            if not self.quota_manager.has_headroom(provider.name, estimated_tokens):
                 continue
                 
             # Check health status
             if provider.status == ModelStatus.FAILED:
                 continue
+            
+            # Skip providers whose breaker tripped on live traffic
+            if not self.circuit_breakers.is_available(provider.name):
+                continue
                 
             available.append(provider)
         
-        # Sort by priority, then by health and response time
-        return sorted(available, key=lambda p: (
-            p.priority,
-            p.status != ModelStatus.HEALTHY,
-            p.avg_response_time
-        ))
+        # Best expected latency first, from live histograms (static priority until warmed up)
+        scores = self._score_providers(available)
+        return self.latency_router.rank(available, scores)
+        
+    def _score_providers(self, providers: List[ModelProvider]) -> Dict[str, float]:
+        """Get expected latency per provider under current health and quota."""
+        return {
+            p.name: self.latency_router.expected_latency(
+                p,
+                quota_remaining=self.quota_manager.remaining_ratio(p.name),
+                degraded=p.status == ModelStatus.DEGRADED
+            )
+            for p in providers
+        }
     
-    async def generate_response(self, messages: List[Dict], temperature: float = 0.95) -> str:
+    async def generate_response(
+        self,
+        messages: List[Dict],
+        temperature: float = 0.95,
+        priority: RequestPriority = RequestPriority.MENTION,
+        deadline: Optional[float] = None,
+        budget: Optional[GenerationBudget] = None
+    ) -> str:
+        """Generate response, admitted by priority class and deadline (time.monotonic()).
+        
+        budget caps generation (tokens, sentences, stop sequences); it defaults
+        to the priority class budget.
+        """
+        deadline = resolve_deadline(priority, deadline)
+        budget = budget_for(priority, budget)
+        
+        try:
+            await self.request_scheduler.acquire(priority, deadline)
+        except asyncio.TimeoutError:
+            logger.warning(f"{priority.name.lower()} request expired while queued")
+            return self._emergency_fallback()
+        
+        try:
+            response = await self._race_providers(messages, temperature, priority, deadline, budget)
+        finally:
+            self.request_scheduler.release(priority)
+        
+        # Mirror a sample of live prompts to a shadow candidate; its replies are discarded
+        if priority != RequestPriority.BACKGROUND:
+            candidate = model_swapper.sample_shadow()
+            if candidate:
+                asyncio.create_task(self._shadow_request(candidate, messages, temperature, budget))
+        return response
+        
+    async def _race_providers(
+        self,
+        messages: List[Dict],
+        temperature: float,
+        priority: RequestPriority,
+        deadline: Optional[float],
+        budget: Optional[GenerationBudget] = None
+    ) -> str:
         """Generate response with parallel processing for speed."""
-        available_providers = self.get_available_providers()
+        prompt_tokens = estimate_tokens(messages)
+        available_providers = self.get_available_providers(prompt_tokens)
         if not available_providers:
             return self._emergency_fallback()
         
+        self.latency_router.record_decision(
+            priority.name.lower(), available_providers, self._score_providers(available_providers)
+        )
+        
         # Race top 2 providers instead of trying sequentially
-        tasks = []
+        self.race_stats["races"] += 1
+        if len(available_providers) > 1:
+            self.race_stats["hedged"] += 1
+        tasks = {}
+        started = set()  # Racers that got past local queueing and reached the model
         for provider in available_providers[:2]:
+            # Both racers hit the upstream API, so both consume quota
+            provider.used_today = self.quota_manager.reserve(provider.name, prompt_tokens)
+            self.circuit_breakers.get(provider.name).on_dispatch()
             task = asyncio.create_task(
-                self._try_provider(provider, messages, temperature)
+                self._run_provider(provider, messages, temperature, priority, deadline, started, budget)
             )
-            tasks.append((provider, task))
+            tasks[task] = provider
+        
+        pending = set(tasks)
+        primary_failed = False
+        race_deadline = time.monotonic() + 5  # Reduced from 30s
         
         try:
-            done, pending = await asyncio.wait(
-                [task for _, task in tasks],
-                return_when=asyncio.FIRST_COMPLETED,
-                timeout=5  # Reduced from 30s
-            )
-            
-            # Cancel pending
-            for task in pending:
-                task.cancel()
-            
-            # Get first result
-            for provider, task in tasks:
-                if task in done:
+            # A failed racer must not end the race while the other is still running
+            while pending:
+                remaining = race_deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                
+                done, pending = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED,
+                    timeout=remaining
+                )
+                
+                for task in done:
+                    provider = tasks[task]
                     try:
-                        result = await task
-                        if result:
-                            provider.used_today += 1
-                            return result
-                    except (aiohttp.ClientError, OSError) as e:
+                        result = task.result()
+                    except Exception as e:
                         logger.error(f"Provider {provider.name} failed: {e}")
+                        primary_failed = primary_failed or provider is available_providers[0]
                         continue
+                    
+                    if result:
+                        self.quota_manager.settle(provider.name, len(result) // 4)
+                        if provider is available_providers[0]:
+                            self.race_stats["won_by_primary"] += 1
+                        else:
+                            # Secondary either out-ran a slow primary (hedge) or covered a failed one
+                            self.race_stats["failovers" if primary_failed else "won_by_secondary"] += 1
+                        return result
+                    primary_failed = primary_failed or provider is available_providers[0]
             
-        except asyncio.TimeoutError:
-            logger.error("All providers timed out")
+            if pending:
+                self.race_stats["timed_out"] += 1
+                logger.error("All providers timed out")
+                for task in pending:
+                    if tasks[task].name in started:
+                        self.circuit_breakers.get(tasks[task].name).record_timeout()
         
+        finally:
+            # Cancel losers and stragglers
+            for task in pending:
+                task.cancel()
+        
+        if not pending:
+            self.race_stats["exhausted"] += 1
         return self._emergency_fallback()
+        
+    async def _run_provider(
+        self,
+        provider: ModelProvider,
+        messages: List[Dict],
+        temperature: float,
+        priority: RequestPriority = RequestPriority.MENTION,
+        deadline: Optional[float] = None,
+        started: Optional[set] = None,
+        budget: Optional[GenerationBudget] = None
+    ) -> Optional[str]:
+        """Run a provider request and feed its outcome to the provider's circuit breaker."""
+        started = started if started is not None else set()
+        breaker = self.circuit_breakers.get(provider.name)
+        scheduler = self._scheduler_for(provider)
+        
+        if scheduler is None:
+            started.add(provider.name)
+            return await self._record_outcome(provider, messages, temperature, budget)
+        
+        try:
+            await scheduler.acquire(priority, deadline)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # Waiting for local capacity says nothing about the provider's health
+            breaker.release_probe()
+            raise
+        try:
+            packer = self.request_packers.get(provider.name)
+            if packer:
+                await packer.wait_turn()
+            started.add(provider.name)
+            return await self._record_outcome(provider, messages, temperature, budget)
+        finally:
+            scheduler.release(priority)
+            
+    def _scheduler_for(self, provider: ModelProvider) -> Optional[PriorityRequestScheduler]:
+        """Get the capacity scheduler for provider, if it has limited parallelism."""
+        if provider.url == "local":
+            return self.local_scheduler
+        return self.provider_schedulers.get(provider.name)
+        
+    async def _record_outcome(
+        self,
+        provider: ModelProvider,
+        messages: List[Dict],
+        temperature: float,
+        budget: Optional[GenerationBudget] = None
+    ) -> Optional[str]:
+        """Try provider and record the outcome for circuit breaking and passive health."""
+        breaker = self.circuit_breakers.get(provider.name)
+        timing: Dict[str, float] = {}
+        start_time = time.monotonic()
+        
+        try:
+            result = await self._try_provider(provider, messages, temperature, timing, budget)
+        except asyncio.CancelledError:
+            # Lost the race or hit the race deadline - not a verdict on the provider
+            breaker.release_probe()
+            raise
+        except asyncio.TimeoutError:
+            self._record_failure(provider, timeout=True)
+            raise
+        except aiohttp.ClientResponseError as e:
+            if e.status == 429:
+                # Throttling is handled by the quota manager; the provider itself is fine
+                breaker.release_probe()
+            else:
+                self._record_failure(provider)
+            raise
+        except Exception:
+            self._record_failure(provider)
+            raise
+        
+        if not result:
+            self._record_failure(provider)
+            return result
+        
+        stats = self.latency_router.get(provider.name)
+        stats.record_success(time.monotonic() - start_time, timing.get("ttft"))
+        provider.avg_response_time = stats.ewma_latency
+        breaker.record_success()
+        self.health_prober.record_traffic(provider.name, True)
+        return result
+        
+    def _record_failure(self, provider: ModelProvider, timeout: bool = False):
+        """Feed a failed request to the breaker, passive health and latency stats."""
+        breaker = self.circuit_breakers.get(provider.name)
+        if timeout:
+            breaker.record_timeout()
+        else:
+            breaker.record_failure()
+        self.health_prober.record_traffic(provider.name, False)
+        self.latency_router.record_failure(provider.name)
     
     @with_timeout(10)  # Reduced timeout
-    async def _try_provider(self, provider: ModelProvider, messages: List[Dict], temperature: float) -> Optional[str]:
+    async def _try_provider(
+        self,
+        provider: ModelProvider,
+        messages: List[Dict],
+        temperature: float,
+        timing: Optional[Dict[str, float]] = None,
+        budget: Optional[GenerationBudget] = None
+    ) -> Optional[str]:
         """Try a single provider with faster timeout."""
         start_time = time.time()
+        timing = timing if timing is not None else {}
+        budget = budget_for(RequestPriority.MENTION, budget)
         
         try:
             if provider.url == "local":
-                result = await self._local_request(provider, messages, temperature)
+                result = await self._local_request(provider, messages, temperature, timing, budget)
             else:
-                result = await self._api_request(provider, messages, temperature)
+                result = await self._api_request(provider, messages, temperature, timing, budget)
             
             # Log performance
             duration = time.time() - start_time
@@ -272,57 +516,334 @@ class LLMFallbackSystem:
             perf_logger.log_error(e, {"provider": provider.name})
             raise
     
-    async def _local_request(self, provider: ModelProvider, messages: List[Dict], temperature: float) -> str:
-        """Make local Ollama request."""
+    async def _local_request(
+        self,
+        provider: ModelProvider,
+        messages: List[Dict],
+        temperature: float,
+        timing: Optional[Dict[str, float]] = None,
+        budget: Optional[GenerationBudget] = None
+    ) -> str:
+        """Make local Ollama request; the primary local provider follows the hot-swapper."""
+        if provider is not self.primary_local:
+            return await self._ollama_chat(provider, provider.model, messages, temperature, timing, budget)
+        
+        # Pinned for the whole request so a swap drains it before unloading the model
+        timing = timing if timing is not None else {}
+        with model_swapper.route() as model:
+            model = model or provider.model
+            start_time = time.monotonic()
+            try:
+                result = await self._ollama_chat(provider, model, messages, temperature, timing, budget)
+            except asyncio.CancelledError:
+                raise  # Lost the race: says nothing about the model
+            except Exception:
+                model_swapper.record_shadow("current", model, None, None, None)
+                raise
+            # Baseline for a shadow run (no-op unless shadowing)
+            model_swapper.record_shadow("current", model, time.monotonic() - start_time, timing.get('ttft'), result)
+            return result
+            
+    async def _shadow_request(self, model: str, messages: List[Dict], temperature: float, budget: GenerationBudget):
+        """Run a mirrored prompt on the shadow candidate at background priority and discard the reply."""
+        provider = ModelProvider(f"shadow_{model}", model, "local", {}, 99, 0)
+        timing: Dict[str, float] = {}
+        try:
+            # Give up rather than queue behind live traffic for long
+            await self.local_scheduler.acquire(RequestPriority.BACKGROUND, time.monotonic() + 30)
+        except asyncio.TimeoutError:
+            model_swapper.finish_shadow()
+            return
+        
+        # Mirror only into free memory: loading the candidate must never push out the live model
+        if not await self.residency.ensure_capacity(model, self._get_session(), evict=False):
+            logger.debug(f"Skipping shadow request: {model} does not fit in free local memory")
+            self.local_scheduler.release(RequestPriority.BACKGROUND)
+            model_swapper.finish_shadow()
+            return
+        
+        start_time = time.monotonic()
+        result = None
+        try:
+            result = await asyncio.wait_for(
+                self._ollama_chat(provider, model, messages, temperature, timing, budget, track_use=False, evict=False),
+                timeout=30
+            )
+        except Exception as e:
+            logger.debug(f"Shadow request to {model} failed: {e}")
+        finally:
+            self.local_scheduler.release(RequestPriority.BACKGROUND)
+            model_swapper.finish_shadow()
+        model_swapper.record_shadow("candidate", model, time.monotonic() - start_time, timing.get('ttft'), result)
+        
+    async def _ollama_chat(
+        self,
+        provider: ModelProvider,
+        model: str,
+        messages: List[Dict],
+        temperature: float,
+        timing: Optional[Dict[str, float]] = None,
+        budget: Optional[GenerationBudget] = None,
+        track_use: bool = True,
+        evict: bool = True
+    ) -> str:
+        """Chat with an Ollama model, streamed so the sentence budget can stop it early."""
         import ollama
         
         loop = asyncio.get_event_loop()
+        timing = timing if timing is not None else {}
+        budget = budget_for(RequestPriority.MENTION, budget)
+        abandoned = threading.Event()
         
-        def ollama_call():
-            response = ollama.chat(
-                model=provider.model,
+        def ollama_call(keep_alive: str):
+            start_time = time.monotonic()
+            limiter = SentenceLimiter(budget.max_sentences)
+            safety = StreamingSafetyFilter()
+            final = None
+            first_token = None
+            # Same num_ctx and a long keep_alive keep the runner resident, so the
+            # static system-prompt prefix is served from the KV cache; hot models
+            # are pinned with a longer keep_alive by the residency manager
+            stream = ollama.chat(
+                model=model,
                 messages=messages,
                 options={
                     'temperature': temperature,
-                    'num_predict': config.model.max_tokens
-                }
+                    # Half the context at most, so a raised budget still leaves room for the prompt
+                    'num_predict': budget.token_cap(
+                        config.model.max_tokens,
+                        min(provider.max_output_tokens, config.model.local_num_ctx // 2)
+                    ),
+                    'num_ctx': config.model.local_num_ctx,
+                    'stop': list(budget.stop)
+                },
+                keep_alive=keep_alive,
+                stream=True
             )
-            return response['message']['content'].strip()
+            try:
+                for chunk in stream:
+                    content = chunk.get('message', {}).get('content', '')
+                    if content and first_token is None:
+                        first_token = time.monotonic() - start_time
+                        timing.setdefault('ttft', first_token)
+                    safety.feed(content)
+                    # Closing the stream drops the connection, which stops generation server-side
+                    if limiter.feed(content) or abandoned.is_set() or not safety.safe:
+                        break
+                    if chunk.get('done'):
+                        final = chunk
+                        break
+            finally:
+                stream.close()
+            
+            self.generation_stats["streamed"] += 1
+            if final is not None:
+                breakdown = self.prompt_eval_stats.record(model, messages, final)
+                logger.debug(
+                    f"{provider.name}: prompt eval {breakdown['prompt_eval_ms']:.0f}ms "
+                    f"({breakdown['prompt_tokens_evaluated']} tokens), generation {breakdown['eval_ms']:.0f}ms"
+                )
+            elif first_token is not None:
+                # Closed before Ollama's final chunk, so only the first-token latency is known
+                self.prompt_eval_stats.record_partial(model, messages, first_token)
+            if not safety.safe:
+                self.generation_stats["unsafe_stopped"] += 1
+                return SAFE_OUTPUT_REFUSAL
+            if final is None and limiter.done:
+                self.generation_stats["early_stopped"] += 1
+            return limiter.text.strip()
         
-        return await loop.run_in_executor(None, ollama_call)
+        # A cold model may first need room under the local memory budget
+        async with self.residency.use(model, self._get_session(), track_use, evict) as keep_alive:
+            try:
+                return await loop.run_in_executor(None, ollama_call, keep_alive)
+            except asyncio.CancelledError:
+                # Lost the race or timed out: stop the worker thread from generating on
+                abandoned.set()
+                raise
+            
+    async def warm_local_model(self, model: str, rounds: int = 2, track_use: bool = True) -> Optional[float]:
+        """Load and exercise a local model off the request path; returns the last latency.
+        
+        Runs at background priority on the local scheduler so warming a swap
+        candidate (or a health check) never delays live voice or mention traffic.
+        """
+        provider = ModelProvider(f"warmup_{model}", model, "local", {}, 99, 0)
+        budget = GenerationBudget(max_tokens=8, max_sentences=1)
+        messages = [{"role": "user", "content": "Hi"}]
+        latency = None
+        
+        for _ in range(rounds):
+            await self.local_scheduler.acquire(RequestPriority.BACKGROUND)
+            try:
+                start_time = time.monotonic()
+                reply = await self._ollama_chat(provider, model, messages, 0.1, budget=budget, track_use=track_use)
+                latency = time.monotonic() - start_time
+            finally:
+                self.local_scheduler.release(RequestPriority.BACKGROUND)
+            if not reply:
+                return None
+        return latency
+        
+    async def manage_local_residency(self):
+        """Refresh resident local models, update keep_alive pins and pre-warm predicted models."""
+        if not self.primary_local:
+            return
+        session = self._get_session()
+        
+        try:
+            await self.residency.refresh(session, force=True)
+            if not self.residency.installed():
+                await self.residency.refresh_catalog(session)
+        except (aiohttp.ClientError, OSError) as e:
+            logger.debug(f"Local model residency refresh failed: {e}")
+            return
+        
+        # Re-issue keep_alive so pin changes apply to models that are already loaded
+        changes = self.residency.update_pins()
+        for model in changes["pinned"] + changes["unpinned"]:
+            if model in self.residency.loaded:
+                await self.residency.load(model, session)
+        
+        candidates = {p.model for p in self.providers if p.url == "local"}
+        if model_swapper.current_model in model_swapper.available_models:
+            candidates.add(model_swapper.available_models[model_swapper.current_model].name)
+        for model in self.residency.predicted_models(candidates & self.residency.installed()):
+            # Loading competes with live generations for the runner, so it waits its turn
+            await self.local_scheduler.acquire(RequestPriority.BACKGROUND)
+            try:
+                await self.residency.prewarm(model, session)
+            finally:
+                self.local_scheduler.release(RequestPriority.BACKGROUND)
+        
+        self.residency.decay_profile()
+        self.residency.save_profile()
+        
+    async def unload_local_model(self, model: str) -> bool:
+        """Evict a local model from memory now."""
+        return await self.residency.unload(model, self._get_session())
+        
+    async def pull_local_model(self, model: str) -> bool:
+        """Download a local model (admin action)."""
+        return await self.residency.pull(model, self._get_session())
+        
+    def pinned_local_models(self) -> set:
+        """Local models served by providers other than the hot-swapped primary."""
+        return {p.model for p in self.providers if p.url == "local" and p is not self.primary_local}
     
-    async def _api_request(self, provider: ModelProvider, messages: List[Dict], temperature: float) -> str:
-        """Make API request with connection reuse."""
-        # Reuse session for better performance
-        if not hasattr(self, '_session') or self._session.closed:
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Get the pooled session shared by requests and health probes."""
+        if self._session is None or self._session.closed:
             timeout = aiohttp.ClientTimeout(total=8, connect=2)
             connector = aiohttp.TCPConnector(limit=50, keepalive_timeout=30)
             self._session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+        return self._session
         
-        payload = self._build_payload(provider, messages, temperature)
+    async def _api_request(
+        self,
+        provider: ModelProvider,
+        messages: List[Dict],
+        temperature: float,
+        timing: Optional[Dict[str, float]] = None,
+        budget: Optional[GenerationBudget] = None
+    ) -> str:
+        """Make API request with connection reuse."""
+        session = self._get_session()
+        timing = timing if timing is not None else {}
+        budget = budget_for(RequestPriority.MENTION, budget)
+        payload = self._build_payload(provider, messages, temperature, budget)
+        start_time = time.monotonic()
         
-        async with self._session.post(
+        async with session.post(
             provider.url,
             headers=provider.headers,
             json=payload
         ) as response:
+            self.quota_manager.sync_from_headers(provider.name, response.headers)
             if response.status == 200:
+                if payload.get("stream"):
+                    return await self._read_stream(response, budget, timing, start_time)
+                
+                # Non-streaming: response headers are the closest proxy for first token
+                timing['ttft'] = time.monotonic() - start_time
                 data = await response.json()
-                return self._extract_response(provider, data)
+                text, truncated = truncate_sentences(self._extract_response(provider, data), budget.max_sentences)
+                if truncated:
+                    self.generation_stats["truncated"] += 1
+                return text
             else:
+                if response.status == 429:
+                    self.quota_manager.mark_throttled(
+                        provider.name, self._parse_retry_after(response.headers.get("Retry-After"))
+                    )
                 raise aiohttp.ClientResponseError(
                     request_info=response.request_info,
                     history=response.history,
                     status=response.status,
                     message=f"API error: {response.status}"
                 )
+                
+    def _parse_retry_after(self, value: Optional[str], default: float = 60.0) -> float:
+        """Parse a Retry-After header given in seconds."""
+        try:
+            return max(1.0, float(value)) if value else default
+        except ValueError:
+            return default
     
-    def _build_payload(self, provider: ModelProvider, messages: List[Dict], temperature: float) -> Dict:
+    async def _read_stream(
+        self,
+        response: aiohttp.ClientResponse,
+        budget: GenerationBudget,
+        timing: Dict[str, float],
+        start_time: float
+    ) -> str:
+        """Read an OpenAI-format SSE stream, stopping at the sentence budget or a prompt leak."""
+        limiter = SentenceLimiter(budget.max_sentences)
+        safety = StreamingSafetyFilter()
+        self.generation_stats["streamed"] += 1
+        
+        async for raw_line in response.content:
+            line = raw_line.decode('utf-8', errors='ignore').strip()
+            if not line.startswith('data:'):
+                continue  # Blank separators and keep-alive comments
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            
+            choices = json.loads(data).get('choices') or []
+            content = (choices[0].get('delta') or {}).get('content') if choices else None
+            if not content:
+                continue
+            if 'ttft' not in timing:
+                timing['ttft'] = time.monotonic() - start_time
+            safety.feed(content)
+            if not safety.safe:
+                self.generation_stats["unsafe_stopped"] += 1
+                response.close()
+                return SAFE_OUTPUT_REFUSAL
+            if limiter.feed(content):
+                # Dropping the connection stops generation (and billing) upstream
+                self.generation_stats["early_stopped"] += 1
+                response.close()
+                break
+        
+        return limiter.text.strip()
+        
+    def _build_payload(
+        self,
+        provider: ModelProvider,
+        messages: List[Dict],
+        temperature: float,
+        budget: Optional[GenerationBudget] = None
+    ) -> Dict:
         """Build request payload for provider."""
+        budget = budget_for(RequestPriority.MENTION, budget)
+        max_tokens = budget.token_cap(config.model.max_tokens, provider.max_output_tokens)
         if "anthropic" in provider.name:
             return {
                 "model": provider.model,
-                "max_tokens": config.model.max_tokens,
+                "max_tokens": max_tokens,
+                "stop_sequences": list(budget.stop),
                 "messages": [msg for msg in messages if msg['role'] != 'system']
             }
         elif "cohere" in provider.name:
@@ -330,23 +851,26 @@ class LLMFallbackSystem:
                 "message": messages[-1]['content'],
                 "model": provider.model,
                 "temperature": temperature,
-                "max_tokens": config.model.max_tokens
+                "max_tokens": max_tokens,
+                "stop_sequences": list(budget.stop)
             }
         elif "huggingface" in provider.name:
             return {
                 "inputs": messages[-1]['content'],
                 "parameters": {
                     "temperature": temperature,
-                    "max_length": config.model.max_tokens
+                    "max_length": max_tokens
                 }
             }
         else:
-            # Standard OpenAI format
+            # Standard OpenAI format, streamed so the sentence budget can stop it early
             return {
                 "model": provider.model,
-                "messages": messages,
+                "messages": merge_system_messages(messages),
                 "temperature": temperature,
-                "max_tokens": config.model.max_tokens
+                "max_tokens": max_tokens,
+                "stop": list(budget.stop)[:4],
+                "stream": True
             }
     
     def _extract_response(self, provider: ModelProvider, data: Dict) -> str:
@@ -363,14 +887,13 @@ class LLMFallbackSystem:
     
     def _emergency_fallback(self) -> str:
         """Emergency fallback response."""
-        fallbacks = [
-            "Arre yaar, all my AI models are acting up right now... 😅 Try again in a moment!",
-            "Sorry, having some technical issues. Give me a sec!",
-            "Hmm, all models are busy right now. That's unusual! Try again?",
-            "Technical difficulties! But I'm still here 💕"
-        ]
         import random
-        return random.choice(fallbacks)
+        return random.choice(EMERGENCY_RESPONSES)
+        
+    async def close(self):
+        """Close the pooled HTTP session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
     
     def get_status(self) -> Dict[str, Any]:
         """Get system status."""
@@ -384,10 +907,22 @@ class LLMFallbackSystem:
                     "used_today": p.used_today,
                     "daily_limit": p.daily_limit,
                     "avg_response_time": p.avg_response_time,
-                    "error_count": p.error_count
+                    "error_count": p.error_count,
+                    "quota": self.quota_manager.get(p.name).get_status(),
+                    "circuit_breaker": self.circuit_breakers.get(p.name).get_status(),
+                    "health_probe": self.health_prober.get_status(p.name)
                 }
                 for p in self.providers
-            ]
+            ],
+            "races": dict(self.race_stats),
+            "generation": dict(self.generation_stats),
+            "routing": self.latency_router.get_status(),
+            "local_prompt_eval": self.prompt_eval_stats.get_status(),
+            "scheduler": self.request_scheduler.get_status(),
+            "local_scheduler": self.local_scheduler.get_status(),
+            "local_residency": self.residency.get_status(),
+            "provider_schedulers": {name: s.get_status() for name, s in self.provider_schedulers.items()},
+            "request_packing": {name: p.get_status() for name, p in self.request_packers.items()}
         }
 
 # Global instance
@@ -0,0 +1,223 @@
+"""Load-test harness driving LLMFallbackSystem against the mock provider server.
+
+Generates open-loop (Poisson) traffic at a target RPS with a configurable
+priority mix and reports throughput, tail latency, hedge/failover counts and
+quota consumption::
+
+    python -m src.models.load_harness --rps 20 --duration 30 --start-mock
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+from ..utils.latency import LatencyHistogram
+from .mock_provider_server import MockProviderServer, MockProfile
+from .request_scheduler import RequestPriority
+
+DEFAULT_PRIORITY_MIX = {
+    RequestPriority.VOICE: 0.1,
+    RequestPriority.MENTION: 0.4,
+    RequestPriority.AMBIENT: 0.3,
+    RequestPriority.BACKGROUND: 0.2
+}
+
+PROMPTS = [
+    "Hey Priya, how was your day?",
+    "What movie should I watch tonight?",
+    "Tell me something fun about chai.",
+    "Summarize what we talked about yesterday in two sentences."
+]
+
+def mock_providers(base_url: str, include_local: bool = False) -> List[Any]:
+    """Providers covering every wire format, pointed at the mock server.
+    
+    The two OpenAI-format providers use different mock profiles, so hedging
+    and failover have a genuinely slow provider to route around.
+    """
+    # Imported lazily: OLLAMA_HOST must be set before the ollama client is created
+    from .llm_fallback import ModelProvider
+    
+    providers = [
+        ModelProvider(
+            "mock_openai_fast", "mock-fast", f"{base_url}/openai/v1/chat/completions",
+            {"Authorization": "Bearer mock"}, 5, 100000, rpm_limit=600
+        ),
+        ModelProvider(
+            "mock_openai_slow", "mock-slow", f"{base_url}/profiles/openai_slow/openai/v1/chat/completions",
+            {"Authorization": "Bearer mock"}, 6, 100000, rpm_limit=600
+        ),
+        ModelProvider(
+            "mock_anthropic", "mock-claude", f"{base_url}/anthropic/v1/messages",
+            {"x-api-key": "mock", "anthropic-version": "2023-06-01"}, 7, 100000, tpm_limit=200000
+        ),
+        ModelProvider(
+            "mock_cohere", "mock-command", f"{base_url}/cohere/v1/chat",
+            {"Authorization": "Bearer mock"}, 8, 100000
+        ),
+        ModelProvider(
+            "mock_huggingface", "mock-hf", f"{base_url}/huggingface/models/mock-hf",
+            {"Authorization": "Bearer mock"}, 9, 100000
+        )
+    ]
+    if include_local:
+        providers.append(ModelProvider("mock_ollama", "llama3.2", "local", {}, 1, 999999))
+    return providers
+
+def _quota_snapshot(system) -> Dict[str, Dict[str, int]]:
+    """Get request/token counters per provider."""
+    return {
+        name: {"requests": status["requests_today"], "tokens": status["tokens_today"]}
+        for name, status in system.quota_manager.get_status().items()
+    }
+
+async def run_load_test(
+    system,
+    rps: float,
+    duration: float,
+    priority_mix: Optional[Dict[RequestPriority, float]] = None,
+    seed: int = 42
+) -> Dict[str, Any]:
+    """Drive generate_response at rps for duration seconds and collect results."""
+    from .llm_fallback import EMERGENCY_RESPONSES
+    
+    mix = priority_mix or DEFAULT_PRIORITY_MIX
+    classes, weights = list(mix.keys()), list(mix.values())
+    rng = random.Random(seed)
+    fallbacks = set(EMERGENCY_RESPONSES)
+    
+    overall = LatencyHistogram()
+    by_class = {p: LatencyHistogram() for p in classes}
+    outcomes = {p: {"sent": 0, "ok": 0, "fallback": 0, "error": 0} for p in classes}
+    quota_before = _quota_snapshot(system)
+    races_before = dict(system.race_stats)
+    
+    async def one_request(priority: RequestPriority, prompt: str):
+        start_time = time.monotonic()
+        try:
+            response = await system.generate_response([{"role": "user", "content": prompt}], priority=priority)
+        except Exception:
+            outcomes[priority]["error"] += 1
+            return
+        latency = time.monotonic() - start_time
+        if response in fallbacks:
+            outcomes[priority]["fallback"] += 1
+            return
+        outcomes[priority]["ok"] += 1
+        overall.record(latency)
+        by_class[priority].record(latency)
+    
+    tasks = []
+    started_at = time.monotonic()
+    next_arrival = started_at
+    while next_arrival - started_at < duration:
+        await asyncio.sleep(max(0.0, next_arrival - time.monotonic()))
+        priority = rng.choices(classes, weights)[0]
+        outcomes[priority]["sent"] += 1
+        tasks.append(asyncio.create_task(one_request(priority, rng.choice(PROMPTS))))
+        next_arrival += rng.expovariate(rps)
+    
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started_at
+    
+    quota_after = _quota_snapshot(system)
+    completed = sum(o["ok"] for o in outcomes.values())
+    return {
+        "target_rps": rps,
+        "duration": round(elapsed, 2),
+        "sent": len(tasks),
+        "completed": completed,
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "latency": _percentiles(overall),
+        "classes": {
+            p.name.lower(): {**outcomes[p], "latency": _percentiles(by_class[p])}
+            for p in classes
+        },
+        "races": {key: system.race_stats[key] - races_before.get(key, 0) for key in system.race_stats},
+        "quota_consumed": {
+            name: {
+                "requests": counters["requests"] - quota_before.get(name, {}).get("requests", 0),
+                "tokens": counters["tokens"] - quota_before.get(name, {}).get("tokens", 0)
+            }
+            for name, counters in quota_after.items()
+        },
+        "circuit_breakers": system.circuit_breakers.get_status(),
+        "scheduler": system.request_scheduler.get_status()
+    }
+
+def _percentiles(histogram: LatencyHistogram) -> Dict[str, Optional[float]]:
+    """Get p50/p95/p99 in seconds."""
+    return {f"p{p}": histogram.percentile(p) for p in (50, 95, 99)}
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Human-readable summary of a load-test report."""
+    def ms(value: Optional[float]) -> str:
+        return f"{value * 1000:.0f}ms" if value is not None else "-"
+    
+    latency = report["latency"]
+    races = report["races"]
+    lines = [
+        f"Target {report['target_rps']} rps for {report['duration']}s: "
+        f"{report['completed']}/{report['sent']} completed, {report['throughput_rps']} rps",
+        f"Latency p50={ms(latency['p50'])} p95={ms(latency['p95'])} p99={ms(latency['p99'])}",
+        f"Races {races.get('races', 0)}: hedged {races.get('hedged', 0)}, primary wins {races.get('won_by_primary', 0)}, "
+        f"secondary wins {races.get('won_by_secondary', 0)}, failovers {races.get('failovers', 0)}, "
+        f"exhausted {races.get('exhausted', 0)}, timed out {races.get('timed_out', 0)}"
+    ]
+    for name, stats in report["classes"].items():
+        lines.append(
+            f"  {name:<10} sent={stats['sent']:<5} ok={stats['ok']:<5} fallback={stats['fallback']:<4} "
+            f"error={stats['error']:<4} p50={ms(stats['latency']['p50'])} p95={ms(stats['latency']['p95'])}"
+        )
+    lines.append("Quota consumed:")
+    for name, consumed in report["quota_consumed"].items():
+        lines.append(f"  {name:<18} requests={consumed['requests']:<6} tokens={consumed['tokens']}")
+    return "\n".join(lines)
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Load test LLMFallbackSystem against mock providers")
+    parser.add_argument("--rps", type=float, default=10.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mock-url", default="http://127.0.0.1:8089")
+    parser.add_argument("--start-mock", action="store_true", help="run the mock server in-process")
+    parser.add_argument("--with-local", action="store_true", help="include an Ollama provider served by the mock")
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.01)
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    return parser.parse_args(argv)
+
+async def _main(args: argparse.Namespace):
+    """Run the load test."""
+    if args.with_local:
+        os.environ["OLLAMA_HOST"] = args.mock_url
+    
+    server = None
+    if args.start_mock:
+        port = int(args.mock_url.rsplit(":", 1)[1].split("/")[0])
+        profile = MockProfile(ttft_median=args.ttft, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
+        server = MockProviderServer(args.seed, {fmt: profile for fmt in MockProviderServer.FORMATS})
+        await server.start(port=port)
+    
+    from .llm_fallback import LLMFallbackSystem
+    
+    quota_file = Path(tempfile.mkdtemp()) / "load_harness_quota.json"
+    system = LLMFallbackSystem(mock_providers(args.mock_url, args.with_local), quota_state_file=str(quota_file))
+    try:
+        report = await run_load_test(system, args.rps, args.duration, seed=args.seed)
+        if server:
+            report["mock_server"] = server.get_stats()
+        print(json.dumps(report, indent=2, default=str) if args.json else format_report(report))
+    finally:
+        await system.close()
+        if server:
+            await server.stop()
+
+if __name__ == "__main__":
+    asyncio.run(_main(_parse_args()))
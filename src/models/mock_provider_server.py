@@ -0,0 +1,512 @@
+"""Deterministic local stand-in for the LLM provider APIs.
+
+Speaks the wire formats ``LLMFallbackSystem`` builds and parses (OpenAI,
+Anthropic, Cohere, HuggingFace and Ollama) with seeded latency, error and
+429 behaviour, so routing, hedging and quota logic can be exercised without
+touching real APIs. Extra OpenAI-format profiles (``openai_slow`` by default)
+are served under ``/profiles/<name>/openai/...`` so several providers of one
+format can behave differently.
+
+Run standalone::
+
+    python -m src.models.mock_provider_server --port 8089 --seed 42
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from datetime import datetime, timezone
+from dataclasses import dataclass, asdict, replace
+from typing import Dict, List, Optional, Any, Tuple
+from aiohttp import web
+
+# Installed mock Ollama models and their memory footprint (bytes)
+OLLAMA_MODELS = {
+    "llama3.2": 2_000_000_000,
+    "llama3.1": 4_700_000_000,
+    "mistral": 4_100_000_000,
+    "codellama": 3_800_000_000,
+    "phi3": 2_200_000_000
+}
+DEFAULT_KEEP_ALIVE = 300.0  # Ollama's default of 5m
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+WORDS = [
+    "yaar", "acha", "chai", "today", "really", "fun", "think", "maybe", "game", "movie",
+    "music", "busy", "tired", "happy", "friend", "story", "weekend", "work", "later", "sure"
+]
+
+@dataclass
+class MockProfile:
+    """Behaviour of one simulated provider."""
+    ttft_median: float = 0.3  # Seconds to first token (lognormal median)
+    ttft_sigma: float = 0.5
+    prefill_per_token: float = 0.0  # Extra seconds per prompt token
+    tokens_per_second: float = 80.0
+    error_rate: float = 0.0  # Fraction of 500s
+    rate_limit_rate: float = 0.0  # Fraction of random 429s
+    rpm_limit: int = 0  # Hard requests-per-minute limit (0 = none)
+    retry_after: int = 5
+    min_tokens: int = 8
+    max_tokens: int = 60
+    load_time: float = 1.0  # Seconds to load a cold local model (Ollama only)
+
+@dataclass
+class MockStats:
+    """Counters per profile (a wire format or an extra named profile)."""
+    requests: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    streamed: int = 0
+    completion_tokens: int = 0
+    cold_loads: int = 0  # Ollama only
+    unloads: int = 0
+
+class MockProviderServer:
+    """aiohttp app serving every supported provider wire format."""
+    
+    FORMATS = ("openai", "anthropic", "cohere", "huggingface", "ollama")
+    SLOW_FACTOR = 4.0  # How much slower the default openai_slow profile is than openai
+    
+    def __init__(self, seed: int = 42, profiles: Optional[Dict[str, MockProfile]] = None):
+        self.seed = seed
+        self.profiles = {fmt: MockProfile() for fmt in self.FORMATS}
+        self.profiles.update(profiles or {})
+        if "openai_slow" not in self.profiles:
+            fast = self.profiles["openai"]
+            self.profiles["openai_slow"] = replace(
+                fast,
+                ttft_median=fast.ttft_median * self.SLOW_FACTOR,
+                tokens_per_second=fast.tokens_per_second / self.SLOW_FACTOR
+            )
+        self.stats = {name: MockStats() for name in self.profiles}
+        self._request_counter = 0
+        self._minute_windows: Dict[str, Tuple[int, int]] = {}  # profile -> (minute, count)
+        # Resident Ollama models -> expiry (time.time(), None = never); in-flight ones never expire
+        self.loaded: Dict[str, Optional[float]] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.app = self._build_app()
+        self._runner: Optional[web.AppRunner] = None
+        
+    def _build_app(self) -> web.Application:
+        """Register routes for each wire format."""
+        app = web.Application()
+        app.router.add_post("/openai/v1/chat/completions", self._openai_chat)
+        app.router.add_get("/openai/v1/models", self._list_models)
+        app.router.add_post("/profiles/{profile}/openai/v1/chat/completions", self._openai_chat)
+        app.router.add_get("/profiles/{profile}/openai/v1/models", self._list_models)
+        app.router.add_post("/anthropic/v1/messages", self._anthropic_messages)
+        app.router.add_get("/anthropic/v1/models", self._list_models)
+        app.router.add_post("/cohere/v1/chat", self._cohere_chat)
+        app.router.add_get("/cohere/v1/models", self._list_models)
+        app.router.add_post("/huggingface/models/{model:.+}", self._huggingface_generate)
+        app.router.add_get("/huggingface/status/{model:.+}", self._list_models)
+        # Ollama clients append /api/... to OLLAMA_HOST, so these live at the root
+        app.router.add_post("/api/chat", self._ollama_chat)
+        app.router.add_post("/api/generate", self._ollama_generate)
+        app.router.add_get("/api/tags", self._ollama_tags)
+        app.router.add_get("/api/ps", self._ollama_ps)
+        app.router.add_get("/mock/stats", self._mock_stats)
+        return app
+        
+    async def start(self, host: str = "127.0.0.1", port: int = 8089):
+        """Start serving in the current event loop."""
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        
+    async def stop(self):
+        """Stop serving."""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+    
+    # Simulation helpers
+    
+    def _rng(self) -> random.Random:
+        """Per-request RNG derived from the seed, so a run is reproducible."""
+        self._request_counter += 1
+        return random.Random(self.seed * 1_000_003 + self._request_counter)
+        
+    def _check_limits(self, fmt: str, rng: random.Random) -> Optional[web.Response]:
+        """Apply error, 429 and RPM behaviour; returns an error response or None."""
+        profile = self.profiles[fmt]
+        stats = self.stats[fmt]
+        stats.requests += 1
+        
+        minute = int(time.time() // 60)
+        window_minute, count = self._minute_windows.get(fmt, (minute, 0))
+        if window_minute != minute:
+            count = 0
+        count += 1
+        self._minute_windows[fmt] = (minute, count)
+        remaining = max(0, profile.rpm_limit - count) if profile.rpm_limit else 1000
+        
+        headers = {"x-ratelimit-remaining-requests": str(remaining)}
+        if (profile.rpm_limit and count > profile.rpm_limit) or rng.random() < profile.rate_limit_rate:
+            stats.rate_limited += 1
+            headers["Retry-After"] = str(profile.retry_after)
+            return web.json_response({"error": {"message": "Rate limit exceeded"}}, status=429, headers=headers)
+        if rng.random() < profile.error_rate:
+            stats.errors += 1
+            return web.json_response({"error": {"message": "Internal server error"}}, status=500, headers=headers)
+        return None
+        
+    def _timings(self, fmt: str, rng: random.Random, prompt_tokens: int, max_tokens: int) -> Tuple[float, List[str]]:
+        """Draw time-to-first-token and the completion tokens."""
+        profile = self.profiles[fmt]
+        ttft = profile.ttft_median * math.exp(profile.ttft_sigma * rng.gauss(0, 1))
+        ttft += prompt_tokens * profile.prefill_per_token
+        n_tokens = rng.randint(profile.min_tokens, max(profile.min_tokens, min(profile.max_tokens, max_tokens)))
+        self.stats[fmt].completion_tokens += n_tokens
+        return ttft, self._generate_tokens(rng, n_tokens)
+        
+    @staticmethod
+    def _generate_tokens(rng: random.Random, n_tokens: int) -> List[str]:
+        """Generate word tokens with sentence punctuation."""
+        tokens = []
+        for i in range(n_tokens):
+            word = rng.choice(WORDS)
+            if not tokens or tokens[-1].endswith("."):
+                word = word.capitalize()
+            if i == n_tokens - 1 or rng.random() < 0.12:
+                word += "."
+            tokens.append(word if not tokens else f" {word}")
+        return tokens
+        
+    @staticmethod
+    def _prompt_tokens(texts: List[str]) -> int:
+        """Estimate prompt tokens the same way the client does."""
+        return sum(len(t) // 4 + 4 for t in texts)
+        
+    @staticmethod
+    def _limit_headers(prompt_tokens: int) -> Dict[str, str]:
+        """Headers present on successful responses."""
+        return {"x-ratelimit-remaining-tokens": str(max(0, 100000 - prompt_tokens))}
+        
+    async def _stream_tokens(self, request: web.Request, fmt: str, tokens: List[str], ttft: float, encode, headers: Dict[str, str], content_type: str) -> web.StreamResponse:
+        """Stream tokens using the format-specific encoder."""
+        self.stats[fmt].streamed += 1
+        response = web.StreamResponse(headers={"Content-Type": content_type, **headers})
+        await response.prepare(request)
+        await asyncio.sleep(ttft)
+        delay = 1.0 / self.profiles[fmt].tokens_per_second
+        for index, token in enumerate(tokens):
+            await response.write(encode(token, index == len(tokens) - 1))
+            await asyncio.sleep(delay)
+        await response.write_eof()
+        return response
+        
+    async def _complete(self, fmt: str, ttft: float, tokens: List[str]):
+        """Sleep for the full non-streaming response time."""
+        await asyncio.sleep(ttft + len(tokens) / self.profiles[fmt].tokens_per_second)
+    
+    # Ollama residency
+    
+    @staticmethod
+    def _model_name(name: str) -> str:
+        """Drop the implicit ':latest' tag."""
+        return name[:-7] if name.endswith(":latest") else name
+        
+    def _expire_models(self):
+        """Unload idle models whose keep_alive has run out."""
+        now = time.time()
+        for model, expires in list(self.loaded.items()):
+            if expires is not None and expires <= now and not self.in_flight.get(model):
+                del self.loaded[model]
+                self.stats["ollama"].unloads += 1
+                
+    async def _acquire_model(self, model: str) -> float:
+        """Load model if needed (sleeping for the load) and mark it busy; returns load seconds."""
+        self._expire_models()
+        self.in_flight[model] = self.in_flight.get(model, 0) + 1
+        if model in self.loaded:
+            return 0.0
+        self.loaded[model] = None
+        self.stats["ollama"].cold_loads += 1
+        load_time = self.profiles["ollama"].load_time
+        try:
+            await asyncio.sleep(load_time)
+        except asyncio.CancelledError:
+            # Client went away mid-load; the model still finishes loading
+            self._release_model(model, None)
+            raise
+        return load_time
+        
+    def _release_model(self, model: str, keep_alive: Any):
+        """Request done: keep the model for keep_alive, or unload it at once for 0."""
+        self.in_flight[model] -= 1
+        seconds = parse_keep_alive(keep_alive)
+        if seconds == 0:
+            if not self.in_flight[model] and model in self.loaded:
+                del self.loaded[model]
+                self.stats["ollama"].unloads += 1
+        elif model in self.loaded:
+            self.loaded[model] = None if seconds is None else time.time() + seconds
+    
+    # Wire formats
+    
+    async def _openai_chat(self, request: web.Request) -> web.StreamResponse:
+        """OpenAI-compatible chat completions (Groq, Together, OpenRouter)."""
+        profile = request.match_info.get("profile", "openai")
+        if profile not in self.profiles:
+            return web.json_response({"error": {"message": f"Unknown mock profile: {profile}"}}, status=404)
+        body = await request.json()
+        rng = self._rng()
+        error = self._check_limits(profile, rng)
+        if error:
+            return error
+        
+        prompt_tokens = self._prompt_tokens([m.get("content", "") for m in body.get("messages", [])])
+        ttft, tokens = self._timings(profile, rng, prompt_tokens, body.get("max_tokens", 200))
+        headers = self._limit_headers(prompt_tokens)
+        
+        if body.get("stream"):
+            def encode(token: str, last: bool) -> bytes:
+                chunk = {"choices": [{"index": 0, "delta": {"content": token}, "finish_reason": "stop" if last else None}]}
+                data = f"data: {json.dumps(chunk)}\n\n"
+                return (data + "data: [DONE]\n\n").encode() if last else data.encode()
+            return await self._stream_tokens(request, profile, tokens, ttft, encode, headers, "text/event-stream")
+        
+        await self._complete(profile, ttft, tokens)
+        return web.json_response({
+            "id": f"mock-{self._request_counter}",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+        }, headers=headers)
+        
+    async def _anthropic_messages(self, request: web.Request) -> web.StreamResponse:
+        """Anthropic Messages API."""
+        body = await request.json()
+        rng = self._rng()
+        error = self._check_limits("anthropic", rng)
+        if error:
+            return error
+        
+        texts = [m.get("content", "") for m in body.get("messages", [])] + [body.get("system", "")]
+        prompt_tokens = self._prompt_tokens(texts)
+        ttft, tokens = self._timings("anthropic", rng, prompt_tokens, body.get("max_tokens", 200))
+        headers = self._limit_headers(prompt_tokens)
+        
+        if body.get("stream"):
+            def encode(token: str, last: bool) -> bytes:
+                delta = {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": token}}
+                data = f"event: content_block_delta\ndata: {json.dumps(delta)}\n\n"
+                if last:
+                    data += 'event: message_stop\ndata: {"type": "message_stop"}\n\n'
+                return data.encode()
+            return await self._stream_tokens(request, "anthropic", tokens, ttft, encode, headers, "text/event-stream")
+        
+        await self._complete("anthropic", ttft, tokens)
+        return web.json_response({
+            "id": f"msg_mock_{self._request_counter}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model"),
+            "content": [{"type": "text", "text": "".join(tokens)}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": prompt_tokens, "output_tokens": len(tokens)}
+        }, headers=headers)
+        
+    async def _cohere_chat(self, request: web.Request) -> web.StreamResponse:
+        """Cohere v1 chat."""
+        body = await request.json()
+        rng = self._rng()
+        error = self._check_limits("cohere", rng)
+        if error:
+            return error
+        
+        prompt_tokens = self._prompt_tokens([body.get("message", "")])
+        ttft, tokens = self._timings("cohere", rng, prompt_tokens, body.get("max_tokens", 200))
+        headers = self._limit_headers(prompt_tokens)
+        
+        if body.get("stream"):
+            def encode(token: str, last: bool) -> bytes:
+                data = json.dumps({"event_type": "text-generation", "text": token}) + "\n"
+                if last:
+                    data += json.dumps({"event_type": "stream-end", "finish_reason": "COMPLETE"}) + "\n"
+                return data.encode()
+            return await self._stream_tokens(request, "cohere", tokens, ttft, encode, headers, "application/x-ndjson")
+        
+        await self._complete("cohere", ttft, tokens)
+        return web.json_response({"text": "".join(tokens), "finish_reason": "COMPLETE"}, headers=headers)
+        
+    async def _huggingface_generate(self, request: web.Request) -> web.Response:
+        """HuggingFace inference API (no streaming)."""
+        body = await request.json()
+        rng = self._rng()
+        error = self._check_limits("huggingface", rng)
+        if error:
+            return error
+        
+        prompt = body.get("inputs", "")
+        max_tokens = body.get("parameters", {}).get("max_length", 200)
+        ttft, tokens = self._timings("huggingface", rng, self._prompt_tokens([prompt]), max_tokens)
+        await self._complete("huggingface", ttft, tokens)
+        return web.json_response([{"generated_text": "".join(tokens)}])
+        
+    async def _ollama_chat(self, request: web.Request) -> web.StreamResponse:
+        """Ollama /api/chat (streams NDJSON by default, like the real server)."""
+        body = await request.json()
+        rng = self._rng()
+        error = self._check_limits("ollama", rng)
+        if error:
+            return error
+        
+        prompt_tokens = self._prompt_tokens([m.get("content", "") for m in body.get("messages", [])])
+        options = body.get("options") or {}
+        ttft, tokens = self._timings("ollama", rng, prompt_tokens, options.get("num_predict", 200))
+        eval_duration = len(tokens) / self.profiles["ollama"].tokens_per_second
+        model = self._model_name(body.get("model", ""))
+        load_time = await self._acquire_model(model)
+        final = {
+            "model": body.get("model"),
+            "done": True,
+            "load_duration": int(load_time * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(ttft * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(eval_duration * 1e9),
+            "total_duration": int((load_time + ttft + eval_duration) * 1e9)
+        }
+        
+        try:
+            if body.get("stream", True):
+                def encode(token: str, last: bool) -> bytes:
+                    data = json.dumps({"model": body.get("model"), "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+                    if last:
+                        data += json.dumps({**final, "message": {"role": "assistant", "content": ""}}) + "\n"
+                    return data.encode()
+                return await self._stream_tokens(request, "ollama", tokens, ttft, encode, {}, "application/x-ndjson")
+            
+            await self._complete("ollama", ttft, tokens)
+            return web.json_response({**final, "message": {"role": "assistant", "content": "".join(tokens)}})
+        finally:
+            self._release_model(model, body.get("keep_alive"))
+        
+    async def _ollama_generate(self, request: web.Request) -> web.Response:
+        """Ollama /api/generate with an empty prompt: load a model, or unload it with keep_alive 0."""
+        body = await request.json()
+        if body.get("prompt"):
+            return web.json_response({"error": "mock /api/generate only loads and unloads models"}, status=400)
+        model = self._model_name(body.get("model", ""))
+        if model not in OLLAMA_MODELS:
+            return web.json_response({"error": f"model '{model}' not found"}, status=404)
+        
+        if parse_keep_alive(body.get("keep_alive")) == 0:
+            self._expire_models()
+            if model in self.loaded and not self.in_flight.get(model):
+                del self.loaded[model]
+                self.stats["ollama"].unloads += 1
+            return web.json_response({"model": body.get("model"), "response": "", "done": True, "done_reason": "unload"})
+        
+        await self._acquire_model(model)
+        self._release_model(model, body.get("keep_alive"))
+        return web.json_response({"model": body.get("model"), "response": "", "done": True, "done_reason": "load"})
+        
+    async def _ollama_tags(self, request: web.Request) -> web.Response:
+        """Ollama model listing (installed models)."""
+        return web.json_response({
+            "models": [{"name": f"{m}:latest", "size": size} for m, size in OLLAMA_MODELS.items()]
+        })
+        
+    async def _ollama_ps(self, request: web.Request) -> web.Response:
+        """Ollama resident models: those loaded by requests whose keep_alive has not run out."""
+        self._expire_models()
+        models = []
+        for model, expires in self.loaded.items():
+            size = OLLAMA_MODELS.get(model, 2_000_000_000)
+            models.append({
+                "name": f"{model}:latest",
+                "model": f"{model}:latest",
+                "size": size,
+                "size_vram": size,
+                "expires_at": datetime.fromtimestamp(expires, timezone.utc).isoformat() if expires is not None else None
+            })
+        return web.json_response({"models": models})
+        
+    async def _list_models(self, request: web.Request) -> web.Response:
+        """Generic model listing used by health probes."""
+        return web.json_response({"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+        
+    async def _mock_stats(self, request: web.Request) -> web.Response:
+        """Server-side counters per wire format."""
+        return web.json_response(self.get_stats())
+        
+    def get_stats(self) -> Dict[str, Any]:
+        """Get server-side counters per profile."""
+        return {name: asdict(stats) for name, stats in self.stats.items()}
+
+def parse_keep_alive(value: Any) -> Optional[float]:
+    """Seconds a model stays loaded after a request, read like Ollama does (None = forever)."""
+    if value is None:
+        return DEFAULT_KEEP_ALIVE
+    text = str(value).strip()
+    try:
+        seconds = float(text)
+    except ValueError:
+        parts = _DURATION.findall(text)
+        if not parts:
+            return DEFAULT_KEEP_ALIVE
+        seconds = sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+        if text.startswith("-"):
+            seconds = -seconds
+    return None if seconds < 0 else seconds
+
+def load_profiles(path: Optional[str], defaults: MockProfile) -> Dict[str, MockProfile]:
+    """Load per-format profiles from a JSON file ({"openai": {...}, "openai_slow": {...}, ...}) over defaults."""
+    profiles = {fmt: MockProfile(**asdict(defaults)) for fmt in MockProviderServer.FORMATS}
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            for fmt, overrides in json.load(f).items():
+                profiles[fmt] = MockProfile(**{**asdict(defaults), **overrides})
+    return profiles
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Deterministic mock LLM provider server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ttft", type=float, default=0.3, help="median time to first token (s)")
+    parser.add_argument("--ttft-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--rpm-limit", type=int, default=0)
+    parser.add_argument("--profile-file", help="JSON file with per-format profile overrides")
+    return parser.parse_args(argv)
+
+def profile_from_args(args: argparse.Namespace) -> MockProfile:
+    """Build the default profile from command line arguments."""
+    return MockProfile(
+        ttft_median=args.ttft,
+        ttft_sigma=args.ttft_sigma,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        rpm_limit=args.rpm_limit
+    )
+
+async def _serve(args: argparse.Namespace):
+    """Serve until interrupted."""
+    server = MockProviderServer(args.seed, load_profiles(args.profile_file, profile_from_args(args)))
+    await server.start(args.host, args.port)
+    print(f"Mock provider server listening on http://{args.host}:{args.port}")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await server.stop()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(_serve(_parse_args()))
+    except KeyboardInterrupt:
+        pass
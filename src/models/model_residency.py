@@ -0,0 +1,345 @@
+"""Memory-aware residency management for local Ollama models."""
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Iterable, AsyncIterator
+import aiohttp
+from ..utils.helpers import safe_json_load, safe_json_save
+from ..utils.logging import logger
+
+@dataclass
+class ResidentModel:
+    """A model Ollama currently holds in memory."""
+    name: str
+    size_mb: float
+    vram_mb: float = 0.0
+    expires_at: Optional[str] = None
+    last_used: float = 0.0
+
+class ModelResidencyManager:
+    """Decides which local models stay loaded.
+
+    Ollama's /api/ps is the source of truth for what is resident. The hottest
+    models (decayed request rate) that fit the memory budget are pinned with a
+    long keep_alive; loading anything else first evicts least-recently-used
+    unpinned models until it fits. An hour-of-day traffic profile predicts
+    which models to load before their traffic arrives.
+    """
+    
+    def __init__(
+        self,
+        memory_budget_mb: int = 8192,
+        max_pinned: int = 2,
+        default_keep_alive: str = "30m",
+        pinned_keep_alive: str = "24h",
+        heat_half_life: float = 3600.0,
+        refresh_interval: float = 30.0,
+        profile_file: str = "data/model_traffic_profile.json",
+        prewarm_min_share: float = 0.2,
+        prewarm_min_requests: float = 5.0
+    ):
+        self.memory_budget_mb = memory_budget_mb
+        self.max_pinned = max_pinned
+        self.default_keep_alive = default_keep_alive
+        self.pinned_keep_alive = pinned_keep_alive
+        self.heat_half_life = heat_half_life
+        self.refresh_interval = refresh_interval
+        self.prewarm_min_share = prewarm_min_share
+        self.prewarm_min_requests = prewarm_min_requests
+        self.ollama_host = self._normalize_host(os.getenv("OLLAMA_HOST", "http://localhost:11434"))
+        
+        self.loaded: Dict[str, ResidentModel] = {}
+        self.sizes: Dict[str, float] = {}  # Last known memory footprint per model (MB)
+        self.heat: Dict[str, float] = {}
+        self.heat_updated: Dict[str, float] = {}
+        self.in_use: Dict[str, int] = {}
+        self.pinned: set = set()
+        self.last_refresh = 0.0
+        self.stats = {"cold_loads": 0, "evictions": 0, "prewarms": 0, "pulls": 0}
+        
+        self.profile_file = Path(profile_file)
+        state = safe_json_load(self.profile_file, {})
+        # hour of day ("0".."23") -> model -> decayed request count
+        self.profile: Dict[str, Dict[str, float]] = state.get("hours", {})
+        self.profile_day: str = state.get("day", datetime.now().strftime("%Y-%m-%d"))
+        
+    @staticmethod
+    def _normalize_host(host: str) -> str:
+        """Ensure OLLAMA_HOST has a scheme."""
+        host = host.rstrip("/")
+        return host if host.startswith(("http://", "https://")) else f"http://{host}"
+        
+    @staticmethod
+    def _model_name(name: str) -> str:
+        """Drop the implicit ':latest' tag so names match provider config."""
+        return name[:-7] if name.endswith(":latest") else name
+        
+    def keep_alive_for(self, model: str) -> str:
+        """keep_alive to send with a request for model."""
+        return self.pinned_keep_alive if model in self.pinned else self.default_keep_alive
+        
+    def _heat(self, model: str, now: float) -> float:
+        """Get the decayed request rate for model."""
+        elapsed = now - self.heat_updated.get(model, now)
+        return self.heat.get(model, 0.0) * math.pow(0.5, elapsed / self.heat_half_life)
+        
+    def record_use(self, model: str):
+        """Count a request towards the model's heat and time-of-day profile."""
+        now = time.time()
+        self.heat[model] = self._heat(model, now) + 1.0
+        self.heat_updated[model] = now
+        hour = self.profile.setdefault(str(datetime.now().hour), {})
+        hour[model] = hour.get(model, 0.0) + 1.0
+        
+    @asynccontextmanager
+    async def use(
+        self, model: str, session: aiohttp.ClientSession, track_use: bool = True, evict: bool = True
+    ) -> AsyncIterator[str]:
+        """Track a local request; makes room for model first if it is not resident.
+
+        Yields the keep_alive to send with the request. track_use=False keeps
+        evaluation traffic out of heat and the time-of-day profile; evict=False
+        never unloads another model to make room.
+        """
+        if track_use:
+            self.record_use(model)
+        if model not in self.loaded:
+            self.stats["cold_loads"] += 1
+            await self.ensure_capacity(model, session, evict)
+        
+        self.in_use[model] = self.in_use.get(model, 0) + 1
+        try:
+            yield self.keep_alive_for(model)
+        finally:
+            self.in_use[model] -= 1
+            resident = self.loaded.get(model)
+            if resident is None:
+                # Ollama has it now; the next refresh fills in the real footprint
+                resident = self.loaded[model] = ResidentModel(model, self.sizes.get(model, 0.0))
+            resident.last_used = time.time()
+            
+    async def refresh(self, session: aiohttp.ClientSession, force: bool = False):
+        """Sync the resident set from /api/ps (rate-limited unless forced)."""
+        if not force and time.monotonic() - self.last_refresh < self.refresh_interval:
+            return
+        
+        async with session.get(f"{self.ollama_host}/api/ps") as response:
+            response.raise_for_status()
+            body = await response.json()
+        self.last_refresh = time.monotonic()
+        
+        loaded = {}
+        for entry in body.get("models", []):
+            name = self._model_name(entry.get("name", ""))
+            size_mb = (entry.get("size") or 0) / 2**20
+            previous = self.loaded.get(name)
+            loaded[name] = ResidentModel(
+                name=name,
+                size_mb=size_mb,
+                vram_mb=(entry.get("size_vram") or 0) / 2**20,
+                expires_at=entry.get("expires_at"),
+                last_used=previous.last_used if previous else time.time()
+            )
+            self.sizes[name] = size_mb
+        self.loaded = loaded
+        
+    async def refresh_catalog(self, session: aiohttp.ClientSession):
+        """Learn on-disk sizes of installed models (a lower bound on their footprint)."""
+        async with session.get(f"{self.ollama_host}/api/tags") as response:
+            response.raise_for_status()
+            body = await response.json()
+        for entry in body.get("models", []):
+            name = self._model_name(entry.get("name", ""))
+            self.sizes.setdefault(name, (entry.get("size") or 0) / 2**20)
+            
+    def installed(self) -> set:
+        """Models known to be installed locally (from the last catalog refresh)."""
+        return set(self.sizes)
+        
+    async def ensure_capacity(self, model: str, session: aiohttp.ClientSession, evict: bool = True) -> bool:
+        """Evict LRU unpinned models until model fits the memory budget (evict=False only checks)."""
+        try:
+            await self.refresh(session, force=True)
+        except (aiohttp.ClientError, OSError) as e:
+            logger.debug(f"Could not refresh resident models: {e}")
+            return False
+        if model in self.loaded:
+            return True
+        
+        needed = self.sizes.get(model, 0.0)
+        used = sum(m.size_mb for m in self.loaded.values())
+        if not evict:
+            return used + needed <= self.memory_budget_mb
+        candidates = sorted(
+            (m for m in self.loaded.values() if m.name not in self.pinned and not self.in_use.get(m.name)),
+            key=lambda m: m.last_used
+        )
+        for victim in candidates:
+            if used + needed <= self.memory_budget_mb:
+                break
+            if await self.unload(victim.name, session):
+                used -= victim.size_mb
+        
+        if used + needed > self.memory_budget_mb:
+            logger.warning(
+                f"Loading {model} ({needed:.0f}MB) exceeds the {self.memory_budget_mb}MB local model budget "
+                f"({used:.0f}MB held by pinned or busy models)"
+            )
+            return False
+        return True
+        
+    async def load(self, model: str, session: aiohttp.ClientSession, keep_alive: Optional[str] = None) -> bool:
+        """Load model (or reset its keep_alive) without generating anything."""
+        payload = {"model": model, "prompt": "", "stream": False, "keep_alive": keep_alive or self.keep_alive_for(model)}
+        try:
+            async with session.post(
+                f"{self.ollama_host}/api/generate", json=payload, timeout=aiohttp.ClientTimeout(total=120)
+            ) as response:
+                response.raise_for_status()
+                await response.read()
+        except (aiohttp.ClientError, OSError) as e:
+            logger.warning(f"Failed to load {model}: {e}")
+            return False
+        
+        if model not in self.loaded:
+            self.loaded[model] = ResidentModel(model, self.sizes.get(model, 0.0), last_used=time.time())
+        return True
+        
+    async def unload(self, model: str, session: aiohttp.ClientSession) -> bool:
+        """Evict model from memory now (keep_alive=0)."""
+        payload = {"model": model, "prompt": "", "stream": False, "keep_alive": 0}
+        try:
+            async with session.post(f"{self.ollama_host}/api/generate", json=payload) as response:
+                response.raise_for_status()
+                await response.read()
+        except (aiohttp.ClientError, OSError) as e:
+            logger.warning(f"Failed to unload {model}: {e}")
+            return False
+        
+        self.loaded.pop(model, None)
+        self.stats["evictions"] += 1
+        logger.info(f"Unloaded local model {model}")
+        return True
+        
+    async def pull(self, model: str, session: aiohttp.ClientSession) -> bool:
+        """Download a model; only ever called from admin paths, never from health checks."""
+        try:
+            async with session.post(
+                f"{self.ollama_host}/api/pull",
+                json={"name": model, "stream": False},
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=600)
+            ) as response:
+                response.raise_for_status()
+                body = await response.json()
+        except (aiohttp.ClientError, OSError) as e:
+            logger.error(f"Failed to pull model {model}: {e}")
+            return False
+        
+        if body.get("status") != "success":
+            logger.error(f"Pull of {model} did not complete: {body}")
+            return False
+        self.stats["pulls"] += 1
+        await self.refresh_catalog(session)
+        logger.info(f"Pulled model {model}")
+        return True
+        
+    def update_pins(self) -> Dict[str, List[str]]:
+        """Pin the hottest models that fit the budget; returns models whose pin changed."""
+        now = time.time()
+        pinned, used = set(), 0.0
+        for model in sorted(self.heat, key=lambda m: self._heat(m, now), reverse=True):
+            if len(pinned) >= self.max_pinned:
+                break
+            size = self.sizes.get(model, 0.0)
+            if used + size > self.memory_budget_mb:
+                continue
+            pinned.add(model)
+            used += size
+        
+        changes = {"pinned": sorted(pinned - self.pinned), "unpinned": sorted(self.pinned - pinned)}
+        self.pinned = pinned
+        return changes
+        
+    def predicted_models(self, candidates: Iterable[str], hour: Optional[int] = None) -> List[str]:
+        """Models the time-of-day profile expects to be used in the coming hour."""
+        hour = (datetime.now().hour + 1) % 24 if hour is None else hour
+        counts = self.profile.get(str(hour), {})
+        total = sum(counts.values())
+        if not total:
+            return []
+        
+        allowed = set(candidates)
+        return [
+            model for model, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)
+            if model in allowed and count >= self.prewarm_min_requests and count / total >= self.prewarm_min_share
+        ]
+        
+    async def prewarm(self, model: str, session: aiohttp.ClientSession) -> bool:
+        """Load a predicted model ahead of its traffic if it fits."""
+        if model in self.loaded or not await self.ensure_capacity(model, session):
+            return False
+        if await self.load(model, session):
+            self.stats["prewarms"] += 1
+            logger.info(f"Pre-warmed local model {model} for upcoming traffic")
+            return True
+        return False
+        
+    def decay_profile(self, factor: float = 0.8):
+        """Fade the time-of-day profile once per day so it tracks recent habits."""
+        today = datetime.now().strftime("%Y-%m-%d")
+        if today == self.profile_day:
+            return
+        days = max(1, (datetime.strptime(today, "%Y-%m-%d") - datetime.strptime(self.profile_day, "%Y-%m-%d")).days)
+        scale = factor ** days
+        self.profile = {
+            hour: {model: count * scale for model, count in counts.items() if count * scale >= 0.5}
+            for hour, counts in self.profile.items()
+        }
+        self.profile_day = today
+        
+    def save_profile(self):
+        """Persist the time-of-day profile."""
+        if not safe_json_save(self.profile_file, {"day": self.profile_day, "hours": self.profile}):
+            logger.error(f"Failed to persist model traffic profile to {self.profile_file}")
+            
+    def get_status(self) -> Dict[str, Any]:
+        """Get resident models, pins and residency counters."""
+        now = time.time()
+        return {
+            "memory_budget_mb": self.memory_budget_mb,
+            "resident_mb": round(sum(m.size_mb for m in self.loaded.values()), 1),
+            "loaded": {
+                name: {
+                    "size_mb": round(m.size_mb, 1),
+                    "vram_mb": round(m.vram_mb, 1),
+                    "expires_at": m.expires_at,
+                    "idle_s": round(now - m.last_used, 1),
+                    "in_use": self.in_use.get(name, 0),
+                    "pinned": name in self.pinned
+                }
+                for name, m in self.loaded.items()
+            },
+            "heat": {name: round(self._heat(name, now), 2) for name in self.heat},
+            "next_hour_prediction": self.predicted_models(self.heat),
+            "runner_rss_mb": self._runner_rss_mb(),
+            **self.stats
+        }
+        
+    @staticmethod
+    def _runner_rss_mb() -> Optional[float]:
+        """Total RSS of local Ollama processes, when psutil is available."""
+        try:
+            import psutil
+        except ImportError:
+            return None
+        
+        total = 0
+        for proc in psutil.process_iter(["name", "memory_info"]):
+            name = (proc.info.get("name") or "").lower()
+            if "ollama" in name and proc.info.get("memory_info"):
+                total += proc.info["memory_info"].rss
+        return round(total / 2**20, 1)
@@ -1,9 +1,13 @@
-"""Model hot-swapping with health checks and fallback."""
+"""Model hot-swapping with warm standby, request draining and health checks."""
 import asyncio
+import random
 import time
-from typing import Dict, List, Optional, Any
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Any, Deque, Iterator
 from dataclasses import dataclass
 from ..utils.logging import logger
+from ..utils.latency import LatencyHistogram, WindowedHistogram, rounded_percentile
 
 @dataclass
 class ModelInfo:
@@ -16,21 +20,67 @@ class ModelInfo:
     error_count: int = 0
     success_count: int = 0
 
-class ModelHotSwapper:
-    """Manages dynamic model switching with health checks."""
+class ShadowStats:
+    """Latency, throughput and failures for one side of a shadow comparison."""
     
     def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.latency = LatencyHistogram()
+        self.ttft = LatencyHistogram()
+        self.tokens = 0
+        self.generation_seconds = 0.0
+        
+    def record(self, seconds: Optional[float], ttft: Optional[float], text: Optional[str]):
+        """Record one request; an empty reply counts as a failure."""
+        self.requests += 1
+        if not text or seconds is None:
+            self.failures += 1
+            return
+        self.latency.record(seconds)
+        if ttft is not None:
+            self.ttft.record(ttft)
+        # Same chars/4 estimate the quota manager settles with
+        self.tokens += len(text) // 4
+        self.generation_seconds += max(0.0, seconds - (ttft or 0.0))
+        
+    def get_status(self) -> Dict[str, Any]:
+        """Get comparable summary figures."""
+        return {
+            "requests": self.requests,
+            "failure_rate": round(self.failures / self.requests, 3) if self.requests else None,
+            "latency_p50": rounded_percentile(self.latency, 50),
+            "latency_p95": rounded_percentile(self.latency, 95),
+            "ttft_p50": rounded_percentile(self.ttft, 50),
+            "tokens_per_second": round(self.tokens / self.generation_seconds, 1) if self.generation_seconds else None
+        }
+
+class ModelHotSwapper:
+    """Manages dynamic model switching with health checks.
+    
+    A swap preloads and warms the new model while the old one keeps serving,
+    cuts traffic over by flipping ``current_model``, then waits for requests
+    still pinned to the old model (see ``route``) before unloading it.
+    """
+    
+    def __init__(self, drain_timeout: float = 30.0, blip_window: float = 120.0):
         self.available_models: Dict[str, ModelInfo] = {}
         self.current_model = None
         self.fallback_models: List[str] = []
-        self.health_check_interval = 300  # 5 minutes
+        self.health_check_interval = 300  # 5 minutes (run by the task scheduler)
         self.switching_in_progress = False
+        self.drain_timeout = drain_timeout
+        self.blip_window = blip_window  # How long after cutover latency is attributed to the swap
+        self.in_flight: Dict[str, int] = {}
+        self.latency: Dict[str, WindowedHistogram] = {}
+        self.swap_history: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self._drained: Dict[str, asyncio.Event] = {}
+        self._blip: Optional[Dict[str, Any]] = None
+        self.shadow: Optional[Dict[str, Any]] = None  # Active canary: candidate model mirrored from live traffic
+        self.max_shadow_pending = 1  # Mirrored requests queued at once; extra samples are skipped
         
         # Initialize with default models
         self._initialize_models()
-        
-        # Start health check task
-        self._health_check_task = asyncio.create_task(self._health_check_loop())
     
     def _initialize_models(self):
         """Initialize available models."""
@@ -46,36 +96,243 @@ class ModelHotSwapper:
         self.current_model = "ollama_llama3.2"
         self.fallback_models = ["ollama_llama3.1", "ollama_mistral"]
     
+    @contextmanager
+    def route(self) -> Iterator[Optional[str]]:
+        """Pin a request to the active model for its whole lifetime.
+        
+        Yields the model id to call (None if no model is selected). A swapped-out
+        model is only unloaded once every request pinned to it has finished.
+        """
+        key = self.current_model
+        if key is None:
+            yield None
+            return
+        
+        self.in_flight[key] = self.in_flight.get(key, 0) + 1
+        start_time = time.monotonic()
+        succeeded = False
+        try:
+            yield self.available_models[key].name
+            succeeded = True
+        finally:
+            self.in_flight[key] -= 1
+            if succeeded:
+                self._record_latency(key, time.monotonic() - start_time)
+            if not self.in_flight[key] and key in self._drained:
+                self._drained[key].set()
+                
     async def switch_model(self, model_name: str, force: bool = False) -> bool:
-        """Switch to a different model."""
+        """Switch to a different model without dropping in-flight requests."""
         if not self._can_switch_model(model_name, force):
             return model_name == self.current_model
         
         self.switching_in_progress = True
+        started = time.monotonic()
+        record: Dict[str, Any] = {
+            "from": self.current_model,
+            "to": model_name,
+            "started_at": time.time(),
+            "forced": force,
+            "result": "failed"
+        }
         
         try:
             logger.info(f"Switching to model {model_name}...")
             
-            if not force and not await self._validate_new_model(model_name):
+            # Preload and warm in the background; the old model keeps serving meanwhile
+            if not force and not await self._prepare_model(model_name, record):
                 return False
             
+            # Atomic cutover: every request routed from here on uses the new model
             old_model = self.current_model
+            record["baseline"] = self._latency_summary(old_model)
             self.current_model = model_name
+            record["cutover_s"] = round(time.monotonic() - started, 3)
+            self._blip = {"record": record, "histogram": LatencyHistogram(), "until": time.monotonic() + self.blip_window}
             
-            if not force and not await self._test_model_switch():
-                logger.error(f"Model {model_name} failed test query, reverting...")
-                self.current_model = old_model
-                return False
+            # Drain requests still pinned to the old model, then free its memory
+            drain_start = time.monotonic()
+            record["drained"] = await self._drain(old_model)
+            record["drain_s"] = round(time.monotonic() - drain_start, 3)
+            if record["drained"]:
+                record["unloaded"] = await self._unload_model(old_model)
+            else:
+                logger.warning(
+                    f"{old_model} still has {self.in_flight.get(old_model, 0)} requests after "
+                    f"{self.drain_timeout}s; leaving it loaded"
+                )
+                record["unloaded"] = False
             
-            logger.info(f"Successfully switched from {old_model} to {model_name}")
+            record["result"] = "switched"
+            if self.shadow and self.shadow["candidate"] == model_name:
+                self.stop_shadow()
+            logger.info(
+                f"Successfully switched from {old_model} to {model_name} "
+                f"(cutover {record['cutover_s']}s, drain {record['drain_s']}s)"
+            )
             return True
             
         except Exception as e:
             logger.error(f"Model switch failed: {e}")
+            record["error"] = str(e)
             return False
         
         finally:
+            record["duration_s"] = round(time.monotonic() - started, 3)
+            self.swap_history.append(record)
             self.switching_in_progress = False
+            
+    async def _prepare_model(self, model_name: str, record: Dict[str, Any]) -> bool:
+        """Preload the new model and warm it off the request path."""
+        preload_start = time.monotonic()
+        if not await self._validate_new_model(model_name):
+            return False
+        record["preload_s"] = round(time.monotonic() - preload_start, 3)
+        
+        if self.available_models[model_name].provider != "ollama":
+            return True
+        
+        warm_start = time.monotonic()
+        warm_latency = await self._warm_model(model_name)
+        record["warm_s"] = round(time.monotonic() - warm_start, 3)
+        if warm_latency is None:
+            logger.error(f"Model {model_name} failed warmup, keeping {self.current_model}")
+            return False
+        record["warm_latency"] = round(warm_latency, 3)
+        return True
+        
+    async def _drain(self, model_name: str) -> bool:
+        """Wait until no request is pinned to model_name."""
+        if not self.in_flight.get(model_name):
+            return True
+        
+        event = self._drained.setdefault(model_name, asyncio.Event())
+        event.clear()
+        try:
+            await asyncio.wait_for(event.wait(), timeout=self.drain_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._drained.pop(model_name, None)
+            
+    async def _unload_model(self, model_name: str) -> bool:
+        """Unload a drained model unless another provider still serves it."""
+        model_info = self.available_models.get(model_name)
+        if not model_info or model_info.provider != "ollama":
+            return False
+        if model_info.name == self.available_models[self.current_model].name:
+            return False
+        
+        from .llm_fallback import llm_system
+        if model_info.name in llm_system.pinned_local_models():
+            logger.info(f"Keeping {model_info.name} loaded; other local providers still use it")
+            return False
+        
+        return await llm_system.unload_local_model(model_info.name)
+        
+    def start_shadow(self, model_name: str, sample_rate: float = 0.1) -> bool:
+        """Mirror a sample of live prompts to a candidate model for comparison."""
+        if model_name not in self.available_models or model_name == self.current_model:
+            logger.error(f"Cannot shadow {model_name}: unknown model or already current")
+            return False
+        if self.available_models[model_name].provider != "ollama":
+            logger.error(f"Shadow mode only supports local models, not {model_name}")
+            return False
+        
+        self.shadow = {
+            "candidate": model_name,
+            "current": self.current_model,
+            "sample_rate": max(0.0, min(1.0, sample_rate)),
+            "started_at": time.time(),
+            "pending": 0,
+            "skipped": 0,
+            "stats": {"current": ShadowStats(), "candidate": ShadowStats()}
+        }
+        logger.info(f"Shadowing {sample_rate:.0%} of live prompts to {model_name}")
+        return True
+        
+    def stop_shadow(self) -> Optional[Dict[str, Any]]:
+        """Stop shadow mode; returns the final comparison."""
+        report = self.get_shadow_status()
+        if self.shadow:
+            logger.info(f"Stopped shadowing {self.shadow['candidate']}")
+        self.shadow = None
+        return report
+        
+    def sample_shadow(self) -> Optional[str]:
+        """Decide whether to mirror this live prompt; returns the candidate model id if so."""
+        shadow = self.shadow
+        if not shadow or shadow["current"] != self.current_model or random.random() >= shadow["sample_rate"]:
+            return None
+        if shadow["pending"] >= self.max_shadow_pending:
+            # Never build a backlog on the local runner just for evaluation
+            shadow["skipped"] += 1
+            return None
+        shadow["pending"] += 1
+        return self.available_models[shadow["candidate"]].name
+        
+    def finish_shadow(self):
+        """Mark a mirrored request as done."""
+        if self.shadow:
+            self.shadow["pending"] = max(0, self.shadow["pending"] - 1)
+            
+    def record_shadow(self, role: str, model: str, seconds: Optional[float], ttft: Optional[float], text: Optional[str]):
+        """Record a current-model or candidate request while shadowing."""
+        shadow = self.shadow
+        if not shadow or self.available_models[shadow[role]].name != model:
+            return
+        shadow["stats"][role].record(seconds, ttft, text)
+        
+    def get_shadow_status(self) -> Optional[Dict[str, Any]]:
+        """Get the side-by-side comparison for the active shadow run."""
+        shadow = self.shadow
+        if not shadow:
+            return None
+        return {
+            "candidate": shadow["candidate"],
+            "current": shadow["current"],
+            "sample_rate": shadow["sample_rate"],
+            "running_for_s": round(time.time() - shadow["started_at"], 1),
+            "skipped": shadow["skipped"],
+            "comparison": {role: stats.get_status() for role, stats in shadow["stats"].items()}
+        }
+        
+    def _record_latency(self, model_name: str, seconds: float):
+        """Record a routed request's latency and attribute it to a recent swap."""
+        if model_name not in self.latency:
+            self.latency[model_name] = WindowedHistogram()
+        self.latency[model_name].record(seconds)
+        
+        blip = self._blip
+        if not blip or blip["record"]["to"] != model_name:
+            return
+        if time.monotonic() > blip["until"]:
+            self._blip = None
+            return
+        blip["histogram"].record(seconds)
+        record = blip["record"]
+        record["after"] = self._summarize(blip["histogram"])
+        baseline_p95 = (record.get("baseline") or {}).get("p95")
+        if baseline_p95 is not None:
+            record["latency_blip_p95"] = round(record["after"]["p95"] - baseline_p95, 3)
+            
+    def _latency_summary(self, model_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Get recent routed-request latency for a model."""
+        if model_name not in self.latency:
+            return None
+        return self._summarize(self.latency[model_name].snapshot())
+        
+    @staticmethod
+    def _summarize(histogram: LatencyHistogram) -> Optional[Dict[str, Any]]:
+        """Get sample count and p50/p95 (seconds) from a histogram."""
+        if not histogram.total:
+            return None
+        return {
+            "samples": histogram.total,
+            "p50": round(histogram.percentile(50), 3),
+            "p95": round(histogram.percentile(95), 3)
+        }
     
     def _can_switch_model(self, model_name: str, force: bool) -> bool:
         """Check if model switch is allowed."""
@@ -100,12 +357,12 @@ class ModelHotSwapper:
             logger.error(f"Model {model_name} failed health check")
         return health_ok
     
-    async def _check_model_health(self, model_name: str) -> bool:
-        """Check if model is healthy."""
+    async def _check_model_health(self, model_name: str, load: bool = True) -> bool:
+        """Check if model is healthy; with load=False only check it is installed."""
         model_info = self.available_models[model_name]
         try:
             start_time = time.time()
-            health_ok = await self._check_ollama_model(model_info.name) if model_info.provider == "ollama" else True
+            health_ok = await self._check_ollama_model(model_info.name, load) if model_info.provider == "ollama" else True
             response_time = time.time() - start_time
             self._update_model_status(model_info, health_ok, response_time)
             return health_ok
@@ -132,13 +389,21 @@ class ModelHotSwapper:
         model_info.error_count += 1
         model_info.last_check = time.time()
     
-    async def _check_ollama_model(self, model_name: str) -> bool:
+    async def _check_ollama_model(self, model_name: str, load: bool = True) -> bool:
         """Check Ollama model health."""
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._check_ollama_sync, model_name)
+        if not await loop.run_in_executor(None, self._check_ollama_sync, model_name):
+            return False
+        if not load:
+            # Chatting would load the model and evict whatever the residency manager keeps warm
+            return True
+        
+        # Loads go through the local scheduler and residency manager like live traffic
+        from .llm_fallback import llm_system
+        return await llm_system.warm_local_model(model_name, rounds=1, track_use=False) is not None
     
     def _check_ollama_sync(self, model_name: str) -> bool:
-        """Synchronous Ollama health check."""
+        """Synchronous check that an Ollama model is installed."""
         try:
             import ollama
             
@@ -146,40 +411,24 @@ class ModelHotSwapper:
             model_names = [model['name'].split(':')[0] for model in models['models']]
             
             if model_name not in model_names:
-                logger.warning(f"Ollama model {model_name} not found, attempting to pull...")
-                try:
-                    ollama.pull(model_name)
-                    logger.info(f"Successfully pulled model {model_name}")
-                except Exception as e:
-                    logger.error(f"Failed to pull model {model_name}: {e}")
-                    return False
-            
-            response = ollama.chat(
-                model=model_name,
-                messages=[{"role": "user", "content": "Hello"}],
-                options={"num_predict": 10}
-            )
-            
-            return bool(response and response.get('message', {}).get('content'))
+                # Pulls are multi-GB downloads; they only happen via the admin pull command
+                logger.warning(f"Ollama model {model_name} is not installed; pull it with !pull_model {model_name}")
+                return False
+            return True
             
         except Exception as e:
             logger.error(f"Ollama health check failed: {e}")
             return False
     
-    async def _test_model_switch(self) -> bool:
-        """Test model switch with simple query."""
+    async def _warm_model(self, model_name: str) -> Optional[float]:
+        """Run warmup queries against the new model itself; returns the last latency."""
         try:
             from ..models.llm_fallback import llm_system
-            
-            # Force use current model for test
-            test_messages = [{"role": "user", "content": "Test"}]
-            response = await llm_system.generate_response(test_messages, temperature=0.1)
-            
-            return bool(response and len(response.strip()) > 0)
+            return await llm_system.warm_local_model(self.available_models[model_name].name)
             
         except Exception as e:
-            logger.error(f"Model test failed: {e}")
-            return False
+            logger.error(f"Model warmup failed: {e}")
+            return None
     
     async def auto_fallback(self) -> bool:
         """Automatically fallback to healthy model."""
@@ -202,15 +451,12 @@ class ModelHotSwapper:
         logger.error("All fallback models failed")
         return False
     
-    async def _health_check_loop(self):
-        """Background health check loop."""
-        while True:
-            try:
-                await asyncio.sleep(self.health_check_interval)
-                await self._check_current_model()
-                await self._check_fallback_models()
-            except Exception as e:
-                logger.error(f"Health check loop error: {e}")
+    async def run_health_checks(self):
+        """Check current and fallback models (scheduled by the task scheduler)."""
+        if self.switching_in_progress:
+            return
+        await self._check_current_model()
+        await self._check_fallback_models()
     
     async def _check_current_model(self):
         """Check current model health and fallback if needed."""
@@ -231,13 +477,16 @@ class ModelHotSwapper:
         """Check fallback models periodically."""
         for model_name in self.fallback_models:
             if model_name != self.current_model:
-                await self._check_model_health(model_name)
+                await self._check_model_health(model_name, load=False)
     
     def get_model_status(self) -> Dict[str, Any]:
         """Get status of all models."""
         return {
             "current_model": self.current_model,
             "switching_in_progress": self.switching_in_progress,
+            "in_flight": {name: count for name, count in self.in_flight.items() if count},
+            "swap_history": list(self.swap_history),
+            "shadow": self.get_shadow_status(),
             "models": {
                 name: {
                     "name": info.name,
@@ -247,7 +496,8 @@ class ModelHotSwapper:
                     "response_time": info.response_time,
                     "error_count": info.error_count,
                     "success_count": info.success_count,
-                    "success_rate": info.success_count / max(1, info.success_count + info.error_count)
+                    "success_rate": info.success_count / max(1, info.success_count + info.error_count),
+                    "latency": self._latency_summary(name)
                 }
                 for name, info in self.available_models.items()
             }
@@ -0,0 +1,95 @@
+"""Prompt-prefix layout helpers and local prompt-eval accounting."""
+from typing import Dict, List, Any
+from .quota import estimate_tokens
+
+def merge_system_messages(messages: List[Dict]) -> List[Dict]:
+    """Merge consecutive system messages for APIs that expect a single one.
+
+    Prompts are sent as a stable prefix message plus a variable suffix message
+    so local runtimes can reuse the KV cache for the prefix; cloud APIs get
+    the same text as one message.
+    """
+    merged: List[Dict] = []
+    for msg in messages:
+        if msg.get('role') == 'system' and merged and merged[-1].get('role') == 'system':
+            merged[-1] = {'role': 'system', 'content': f"{merged[-1]['content']}\n\n{msg['content']}"}
+        else:
+            merged.append(msg)
+    return merged
+
+class PromptEvalStats:
+    """Per-model prompt-eval vs generation timings reported by Ollama.
+
+    Ollama only reports prompt tokens it actually evaluated, so a drop in
+    evaluated tokens against the estimated prompt size shows prefix reuse.
+    Streams closed early never get those timings and are counted apart.
+    """
+    
+    def __init__(self):
+        self.models: Dict[str, Dict[str, float]] = {}
+        self.last: Dict[str, Dict[str, Any]] = {}
+        self.partial: Dict[str, Dict[str, float]] = {}
+        
+    def record(self, model: str, messages: List[Dict], response: Dict[str, Any]) -> Dict[str, Any]:
+        """Record timings from an Ollama chat response; returns this request's breakdown."""
+        timings = {
+            "load_ms": (response.get('load_duration') or 0) / 1e6,
+            "prompt_eval_ms": (response.get('prompt_eval_duration') or 0) / 1e6,
+            "eval_ms": (response.get('eval_duration') or 0) / 1e6,
+            "prompt_tokens_evaluated": response.get('prompt_eval_count') or 0,
+            "prompt_tokens_estimated": estimate_tokens(messages),
+            "completion_tokens": response.get('eval_count') or 0
+        }
+        
+        totals = self.models.setdefault(model, {
+            "requests": 0, "load_ms": 0.0, "prompt_eval_ms": 0.0, "eval_ms": 0.0,
+            "prompt_tokens_evaluated": 0, "prompt_tokens_estimated": 0, "completion_tokens": 0
+        })
+        totals["requests"] += 1
+        for key, value in timings.items():
+            totals[key] += value
+        
+        self.last[model] = timings
+        return timings
+        
+    def record_partial(self, model: str, messages: List[Dict], ttft: float) -> Dict[str, Any]:
+        """Record a stream closed before the final chunk; TTFT stands in for load plus prompt eval."""
+        prefix = messages[:1] if messages and messages[0].get('role') == 'system' else []
+        timings = {
+            "ttft_ms": ttft * 1000,
+            "prompt_tokens_estimated": estimate_tokens(messages),
+            "prefix_tokens_estimated": estimate_tokens(prefix)
+        }
+        
+        totals = self.partial.setdefault(model, {
+            "requests": 0, "ttft_ms": 0.0, "prompt_tokens_estimated": 0, "prefix_tokens_estimated": 0
+        })
+        totals["requests"] += 1
+        for key, value in timings.items():
+            totals[key] += value
+        return timings
+        
+    def get_status(self) -> Dict[str, Any]:
+        """Get average timings and estimated prefix reuse per model."""
+        status = {}
+        for model, totals in self.models.items():
+            requests = max(1, totals["requests"])
+            estimated = max(1, totals["prompt_tokens_estimated"])
+            status[model] = {
+                "requests": totals["requests"],
+                "avg_load_ms": round(totals["load_ms"] / requests, 1),
+                "avg_prompt_eval_ms": round(totals["prompt_eval_ms"] / requests, 1),
+                "avg_eval_ms": round(totals["eval_ms"] / requests, 1),
+                "avg_prompt_tokens_evaluated": round(totals["prompt_tokens_evaluated"] / requests, 1),
+                "prefix_reuse_ratio": round(max(0.0, 1 - totals["prompt_tokens_evaluated"] / estimated), 3),
+                "last": self.last.get(model)
+            }
+        for model, totals in self.partial.items():
+            requests = max(1, totals["requests"])
+            status.setdefault(model, {"requests": 0})["partial"] = {
+                "requests": totals["requests"],
+                "avg_ttft_ms": round(totals["ttft_ms"] / requests, 1),
+                "avg_prompt_tokens_estimated": round(totals["prompt_tokens_estimated"] / requests, 1),
+                "avg_prefix_tokens_estimated": round(totals["prefix_tokens_estimated"] / requests, 1)
+            }
+        return status
@@ -0,0 +1,320 @@
+"""Per-provider quota accounting with token buckets and daily windows."""
+import math
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Mapping
+from ..utils.logging import logger
+from ..utils.helpers import safe_json_load, safe_json_save
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8
+    ZoneInfo = None
+
+def estimate_tokens(messages: List[Dict]) -> int:
+    """Cheap token estimate (~4 chars per token plus per-message overhead)."""
+    return sum(len(str(msg.get('content', ''))) // 4 + 4 for msg in messages)
+
+class TokenBucket:
+    """Continuously refilling token bucket."""
+    
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        
+    def _refill(self, now: float):
+        """Add tokens accrued since the last refill."""
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+            self.last_refill = now
+            
+    def available(self, now: Optional[float] = None) -> float:
+        """Get currently available tokens."""
+        now = now if now is not None else time.monotonic()
+        self._refill(now)
+        return 0.0 if now < self.blocked_until else self.tokens
+        
+    def can_consume(self, amount: float, now: Optional[float] = None) -> bool:
+        """Check if amount can be consumed without going into debt."""
+        return self.available(now) >= amount
+        
+    def consume(self, amount: float, now: Optional[float] = None):
+        """Consume tokens (may go negative when actual usage exceeds the estimate)."""
+        self._refill(now if now is not None else time.monotonic())
+        self.tokens -= amount
+        
+    def clamp(self, remaining: float):
+        """Clamp to the remaining allowance reported by the upstream API."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, remaining)
+        
+    def block(self, seconds: float):
+        """Empty the bucket and refuse consumption for a while (e.g. after a 429)."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+class ProviderQuota:
+    """Quota state for a single provider."""
+    
+    def __init__(
+        self,
+        name: str,
+        daily_requests: int,
+        daily_tokens: int = 0,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        tz_name: str = "UTC"
+    ):
+        self.name = name
+        self.daily_requests = daily_requests
+        self.daily_tokens = daily_tokens
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.tz_name = tz_name
+        self.tz = self._resolve_timezone(tz_name)
+        
+        self.request_bucket = TokenBucket(requests_per_minute, requests_per_minute / 60) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60) if tokens_per_minute else None
+        
+        self.window_key = self._current_window_key()
+        self.requests_today = 0
+        self.tokens_today = 0
+        self.throttle_count = 0
+        self.throttled_until = 0.0
+        
+    @staticmethod
+    def _resolve_timezone(tz_name: str):
+        """Resolve timezone name, falling back to UTC."""
+        if ZoneInfo is not None and tz_name.upper() != "UTC":
+            try:
+                return ZoneInfo(tz_name)
+            except Exception:
+                logger.warning(f"Unknown quota timezone {tz_name}, using UTC")
+        return timezone.utc
+        
+    def _current_window_key(self) -> str:
+        """Get the provider-local date identifying the current daily window."""
+        return datetime.now(self.tz).date().isoformat()
+        
+    def roll_window(self) -> bool:
+        """Reset daily counters when the provider's day has changed."""
+        key = self._current_window_key()
+        if key == self.window_key:
+            return False
+        
+        logger.info(
+            f"Quota window reset for {self.name}: {self.requests_today} requests, "
+            f"{self.tokens_today} tokens used on {self.window_key}"
+        )
+        self.window_key = key
+        self.requests_today = 0
+        self.tokens_today = 0
+        return True
+        
+    def _reserve_margin(self, limit: int, reserve_ratio: float) -> int:
+        """Requests/tokens held back so we stop before the upstream 429."""
+        return max(1, math.ceil(limit * reserve_ratio))
+        
+    def has_headroom(self, estimated_tokens: int = 0, reserve_ratio: float = 0.02) -> bool:
+        """Check if a request of the given size fits inside every limit."""
+        self.roll_window()
+        now = time.monotonic()
+        
+        if now < self.throttled_until:
+            return False
+        if self.daily_requests and self.requests_today + self._reserve_margin(self.daily_requests, reserve_ratio) > self.daily_requests:
+            return False
+        if self.daily_tokens and self.tokens_today + estimated_tokens + self._reserve_margin(self.daily_tokens, reserve_ratio) > self.daily_tokens:
+            return False
+        if self.request_bucket and not self.request_bucket.can_consume(1, now):
+            return False
+        if self.token_bucket and not self.token_bucket.can_consume(min(estimated_tokens, self.token_bucket.capacity), now):
+            return False
+        
+        return True
+        
+    def reserve(self, estimated_tokens: int):
+        """Account for a dispatched request before its outcome is known."""
+        self.roll_window()
+        now = time.monotonic()
+        self.requests_today += 1
+        self.tokens_today += estimated_tokens
+        if self.request_bucket:
+            self.request_bucket.consume(1, now)
+        if self.token_bucket:
+            self.token_bucket.consume(estimated_tokens, now)
+            
+    def settle(self, completion_tokens: int):
+        """Add completion tokens once the response is known."""
+        self.tokens_today += completion_tokens
+        if self.token_bucket:
+            self.token_bucket.consume(completion_tokens)
+            
+    def remaining_ratio(self) -> float:
+        """Fraction of the tightest daily limit still unused."""
+        self.roll_window()
+        ratios = [1.0]
+        if self.daily_requests:
+            ratios.append(1 - self.requests_today / self.daily_requests)
+        if self.daily_tokens:
+            ratios.append(1 - self.tokens_today / self.daily_tokens)
+        return max(0.0, min(ratios))
+        
+    def mark_throttled(self, retry_after: float):
+        """Stop routing to the provider after an upstream 429."""
+        self.throttle_count += 1
+        self.throttled_until = max(self.throttled_until, time.monotonic() + retry_after)
+        for bucket in (self.request_bucket, self.token_bucket):
+            if bucket:
+                bucket.block(retry_after)
+                
+    def sync_from_headers(self, headers: Mapping[str, str]):
+        """Clamp buckets to the remaining allowance reported in rate-limit headers."""
+        remaining_requests = _parse_int(headers.get("x-ratelimit-remaining-requests"))
+        remaining_tokens = _parse_int(headers.get("x-ratelimit-remaining-tokens"))
+        
+        if remaining_requests is not None and self.request_bucket:
+            self.request_bucket.clamp(remaining_requests)
+        if remaining_tokens is not None and self.token_bucket:
+            self.token_bucket.clamp(remaining_tokens)
+            
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize persisted counters."""
+        return {
+            "window_key": self.window_key,
+            "timezone": self.tz_name,
+            "requests_today": self.requests_today,
+            "tokens_today": self.tokens_today
+        }
+        
+    def restore(self, data: Dict[str, Any]):
+        """Restore counters if they belong to the current window."""
+        if data.get("window_key") == self._current_window_key():
+            self.requests_today = int(data.get("requests_today", 0))
+            self.tokens_today = int(data.get("tokens_today", 0))
+            
+    def get_status(self) -> Dict[str, Any]:
+        """Get quota status."""
+        self.roll_window()
+        now = time.monotonic()
+        return {
+            "window": self.window_key,
+            "timezone": self.tz_name,
+            "requests_today": self.requests_today,
+            "daily_requests": self.daily_requests,
+            "tokens_today": self.tokens_today,
+            "daily_tokens": self.daily_tokens,
+            "rpm_available": round(self.request_bucket.available(now), 2) if self.request_bucket else None,
+            "tpm_available": round(self.token_bucket.available(now), 2) if self.token_bucket else None,
+            "throttle_count": self.throttle_count
+        }
+
+def _parse_int(value: Optional[str]) -> Optional[int]:
+    """Parse an integer header value."""
+    try:
+        return int(float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+class QuotaManager:
+    """Tracks and persists quota usage for all providers."""
+    
+    def __init__(self, state_file: str = "data/provider_quota.json", persist_interval: float = 30.0):
+        self.state_file = Path(state_file)
+        self.persist_interval = persist_interval
+        self.reserve_ratio = 0.02
+        self.quotas: Dict[str, ProviderQuota] = {}
+        self._persisted_state = safe_json_load(self.state_file, {})
+        self._last_persist = 0.0
+        
+    def register(
+        self,
+        name: str,
+        daily_requests: int,
+        daily_tokens: int = 0,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        tz_name: str = "UTC"
+    ) -> ProviderQuota:
+        """Register a provider and restore its persisted counters."""
+        quota = ProviderQuota(name, daily_requests, daily_tokens, requests_per_minute, tokens_per_minute, tz_name)
+        if name in self._persisted_state:
+            quota.restore(self._persisted_state[name])
+        self.quotas[name] = quota
+        return quota
+        
+    def get(self, name: str) -> Optional[ProviderQuota]:
+        """Get quota state for provider."""
+        return self.quotas.get(name)
+        
+    def has_headroom(self, name: str, estimated_tokens: int = 0) -> bool:
+        """Check if provider can take another request without hitting a limit."""
+        quota = self.quotas.get(name)
+        return quota.has_headroom(estimated_tokens, self.reserve_ratio) if quota else True
+        
+    def reserve(self, name: str, estimated_tokens: int) -> int:
+        """Record a dispatched request; returns the provider's request count for today."""
+        quota = self.quotas.get(name)
+        if not quota:
+            return 0
+        quota.reserve(estimated_tokens)
+        self.maybe_persist()
+        return quota.requests_today
+        
+    def remaining_ratio(self, name: str) -> float:
+        """Get the unused fraction of provider's daily quota."""
+        quota = self.quotas.get(name)
+        return quota.remaining_ratio() if quota else 1.0
+        
+    def settle(self, name: str, completion_tokens: int):
+        """Record completion tokens for a finished request."""
+        quota = self.quotas.get(name)
+        if quota:
+            quota.settle(completion_tokens)
+            
+    def mark_throttled(self, name: str, retry_after: float):
+        """Record an upstream 429 for provider."""
+        quota = self.quotas.get(name)
+        if quota:
+            quota.mark_throttled(retry_after)
+            logger.warning(f"Provider {name} throttled upstream, pausing for {retry_after:.0f}s")
+            
+    def sync_from_headers(self, name: str, headers: Mapping[str, str]):
+        """Update provider buckets from upstream rate-limit headers."""
+        quota = self.quotas.get(name)
+        if quota:
+            quota.sync_from_headers(headers)
+            
+    def requests_today(self, name: str) -> int:
+        """Get today's request count for provider."""
+        quota = self.quotas.get(name)
+        if not quota:
+            return 0
+        quota.roll_window()
+        return quota.requests_today
+        
+    def maybe_persist(self):
+        """Persist state if the persist interval has elapsed."""
+        if time.monotonic() - self._last_persist >= self.persist_interval:
+            self.persist()
+            
+    def persist(self) -> bool:
+        """Write quota counters to disk."""
+        self._last_persist = time.monotonic()
+        state = {name: quota.to_dict() for name, quota in self.quotas.items()}
+        self._persisted_state = state
+        if not safe_json_save(self.state_file, state):
+            logger.error(f"Failed to persist provider quota state to {self.state_file}")
+            return False
+        return True
+        
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        """Get quota status for all providers."""
+        return {name: quota.get_status() for name, quota in self.quotas.items()}
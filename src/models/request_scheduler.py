@@ -0,0 +1,215 @@
+"""Priority-aware admission control for LLM requests."""
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Dict, List, Optional, Any, Tuple
+
+class RequestPriority(IntEnum):
+    """Request classes; lower value is served first."""
+    VOICE = 0
+    MENTION = 1
+    AMBIENT = 2
+    BACKGROUND = 3
+
+# Default queueing budget per class (seconds), used when the caller gives no deadline
+DEFAULT_DEADLINES: Dict[RequestPriority, Optional[float]] = {
+    RequestPriority.VOICE: 3.0,
+    RequestPriority.MENTION: 10.0,
+    RequestPriority.AMBIENT: 20.0,
+    RequestPriority.BACKGROUND: None
+}
+
+def resolve_deadline(priority: RequestPriority, deadline: Optional[float] = None) -> Optional[float]:
+    """Get an absolute monotonic deadline, falling back to the class default."""
+    if deadline is not None:
+        return deadline
+    budget = DEFAULT_DEADLINES.get(priority)
+    return time.monotonic() + budget if budget is not None else None
+
+class PriorityRequestScheduler:
+    """Admits requests by priority class, earliest deadline first within a class.
+
+    ``max_concurrent`` bounds total in-flight requests; ``class_caps`` bounds how
+    many of those a single class may hold, so background work can never occupy
+    every slot. Waiters whose deadline passes while queued are dropped with
+    ``asyncio.TimeoutError`` instead of being served late.
+    """
+    
+    def __init__(self, name: str, max_concurrent: int, class_caps: Optional[Dict[RequestPriority, int]] = None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.class_caps = {p: max_concurrent for p in RequestPriority}
+        self.class_caps.update(class_caps or {})
+        
+        self._heap: List[Tuple[int, float, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.active = 0
+        self.active_by_class: Dict[RequestPriority, int] = {p: 0 for p in RequestPriority}
+        self.queued_by_class: Dict[RequestPriority, int] = {p: 0 for p in RequestPriority}
+        
+        # Metrics
+        self.max_queue_depth = 0
+        self.dispatched: Dict[RequestPriority, int] = {p: 0 for p in RequestPriority}
+        self.expired: Dict[RequestPriority, int] = {p: 0 for p in RequestPriority}
+        self.total_wait: Dict[RequestPriority, float] = {p: 0.0 for p in RequestPriority}
+        
+    def _can_run(self, priority: RequestPriority) -> bool:
+        """Check global and per-class capacity."""
+        return self.active < self.max_concurrent and self.active_by_class[priority] < self.class_caps[priority]
+        
+    def _grant(self, priority: RequestPriority):
+        """Account for an admitted request."""
+        self.active += 1
+        self.active_by_class[priority] += 1
+        self.dispatched[priority] += 1
+        
+    async def acquire(self, priority: RequestPriority = RequestPriority.MENTION, deadline: Optional[float] = None):
+        """Wait for a slot; raises asyncio.TimeoutError if deadline passes while queued."""
+        if not self._heap and self._can_run(priority):
+            self._grant(priority)
+            return
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        enqueued_at = time.monotonic()
+        heapq.heappush(self._heap, (int(priority), deadline if deadline is not None else float("inf"), next(self._seq), future))
+        self.queued_by_class[priority] += 1
+        self.max_queue_depth = max(self.max_queue_depth, sum(self.queued_by_class.values()))
+        self._dispatch()
+        
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if not future.done():
+                # Still queued; the stale heap entry is skipped on dispatch
+                future.cancel()
+                self.queued_by_class[priority] -= 1
+                self.expired[priority] += 1
+            elif not future.cancelled() and future.exception() is None:
+                # Slot was granted just as we gave up - hand it back
+                self.release(priority)
+            raise
+        finally:
+            self.total_wait[priority] += time.monotonic() - enqueued_at
+            
+    def release(self, priority: RequestPriority = RequestPriority.MENTION):
+        """Release a slot and admit waiting requests."""
+        self.active = max(0, self.active - 1)
+        self.active_by_class[priority] = max(0, self.active_by_class[priority] - 1)
+        self._dispatch()
+        
+    def _dispatch(self):
+        """Admit queued requests in (class, deadline) order while capacity allows."""
+        deferred = []
+        now = time.monotonic()
+        
+        while self._heap and self.active < self.max_concurrent:
+            entry = heapq.heappop(self._heap)
+            priority_value, deadline, _, future = entry
+            priority = RequestPriority(priority_value)
+            
+            if future.done():
+                # Waiter already gave up
+                continue
+            if deadline < now:
+                self.queued_by_class[priority] -= 1
+                self.expired[priority] += 1
+                future.set_exception(asyncio.TimeoutError())
+                continue
+            if not self._can_run(priority):
+                # Class is at its cap; let lower classes use the spare capacity
+                deferred.append(entry)
+                continue
+            
+            self.queued_by_class[priority] -= 1
+            self._grant(priority)
+            future.set_result(True)
+        
+        for entry in deferred:
+            heapq.heappush(self._heap, entry)
+            
+    @asynccontextmanager
+    async def slot(self, priority: RequestPriority = RequestPriority.MENTION, deadline: Optional[float] = None):
+        """Hold a slot for the duration of the block."""
+        await self.acquire(priority, deadline)
+        try:
+            yield
+        finally:
+            self.release(priority)
+            
+    def get_status(self) -> Dict[str, Any]:
+        """Get queue depth and admission metrics."""
+        return {
+            "name": self.name,
+            "max_concurrent": self.max_concurrent,
+            "active": self.active,
+            "queue_depth": sum(self.queued_by_class.values()),
+            "max_queue_depth": self.max_queue_depth,
+            "classes": {
+                p.name.lower(): {
+                    "cap": self.class_caps[p],
+                    "active": self.active_by_class[p],
+                    "queued": self.queued_by_class[p],
+                    "dispatched": self.dispatched[p],
+                    "expired": self.expired[p],
+                    "avg_wait": round(self.total_wait[p] / max(1, self.dispatched[p] + self.expired[p]), 3)
+                }
+                for p in RequestPriority
+            }
+        }
+
+class RequestPacker:
+    """Holds requests for a short window so they reach a batching server together.
+
+    Continuous-batching servers admit new sequences between decode steps; a
+    burst that arrives together shares one prefill pass instead of stalling
+    in-flight generations several times. A group is released when the window
+    expires or ``max_batch`` requests have joined it.
+    """
+    
+    def __init__(self, window_ms: int, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._event: Optional[asyncio.Event] = None
+        self._members = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.packed_requests = 0
+        
+    def _release(self):
+        """Release the current group."""
+        if self._event is None:
+            return
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self.batches += 1
+        self.packed_requests += self._members
+        self._event.set()
+        self._event = None
+        self._members = 0
+        
+    async def wait_turn(self):
+        """Join the current group and wait for it to be released."""
+        if self.window <= 0:
+            return
+        if self._event is None:
+            self._event = asyncio.Event()
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._release)
+        event = self._event
+        self._members += 1
+        if self._members >= self.max_batch:
+            self._release()
+        await event.wait()
+        
+    def get_status(self) -> Dict[str, Any]:
+        """Get packing statistics."""
+        return {
+            "window_ms": int(self.window * 1000),
+            "batches": self.batches,
+            "avg_batch_size": round(self.packed_requests / max(1, self.batches), 2)
+        }
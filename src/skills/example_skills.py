@@ -2,6 +2,7 @@
 import asyncio
 from typing import List
 from .skill_manager import BaseSkill, SkillContext
+from .skill_cache import CachePolicy
 
 class SummarizeSkill(BaseSkill):
     """Summarize text or conversation history."""
@@ -22,6 +23,11 @@ class SummarizeSkill(BaseSkill):
     def requires_memory(self) -> bool:
         return True
     
+    @property
+    def cache_policy(self) -> CachePolicy:
+        # Same answer until the user's memories change
+        return CachePolicy(ttl=120)
+    
     async def execute(self, context: SkillContext) -> str:
         # Get recent memories for context
         memories = await context.memory_system.retrieve_memory(
@@ -47,9 +53,10 @@ class SummarizeSkill(BaseSkill):
         
         # Use LLM to generate summary
         from ..models.llm_fallback import llm_system
+        from ..models.request_scheduler import RequestPriority
         messages = [{"role": "user", "content": summary_prompt}]
         
-        summary = await llm_system.generate_response(messages)
+        summary = await llm_system.generate_response(messages, priority=RequestPriority.BACKGROUND)
         return f"📝 **Summary**: {summary}"
 
 class CodeReviewSkill(BaseSkill):
@@ -99,9 +106,10 @@ class CodeReviewSkill(BaseSkill):
         """
         
         from ..models.llm_fallback import llm_system
+        from ..models.generation_budget import GENERATION_BUDGETS
         messages = [{"role": "user", "content": review_prompt}]
         
-        review = await llm_system.generate_response(messages)
+        review = await llm_system.generate_response(messages, budget=GENERATION_BUDGETS["long_form"])
         return f"🔍 **Code Review**:\n{review}"
 
 class StudyModeSkill(BaseSkill):
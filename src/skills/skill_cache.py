@@ -0,0 +1,105 @@
+"""Declarative result caching for skills."""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, Hashable, Optional, Set, Tuple
+
+def default_cache_key(context: Any) -> Hashable:
+    """Same user, same place, same message (ignoring case and spacing)."""
+    return context.user_id, context.server_id, " ".join(context.message.lower().split())
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """How long a skill's results stay valid and what makes two requests the same."""
+    ttl: float = 60.0
+    key: Callable[[Any], Hashable] = default_cache_key
+    invalidate_on_memory_write: bool = True  # Drop the user's results when their memories change
+
+class SkillResultCache:
+    """Bounded LRU of skill results keyed by (skill, policy key)."""
+    
+    def __init__(self, max_entries: int = 5_000):
+        self.max_entries = max_entries
+        # (skill, key) -> (expires, user_id or None when memory writes do not invalidate, result)
+        self.entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Optional[str], str]]" = OrderedDict()
+        self.by_user: Dict[str, Set[Tuple[str, Hashable]]] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        # Bumped on memory writes so a run that overlapped one is not cached
+        self.epoch = 0
+        self.generations: Dict[str, int] = {}
+        
+    def _count(self, skill_name: str, outcome: str, n: int = 1):
+        """Bump a per-skill counter."""
+        counters = self.stats.setdefault(skill_name, {"hits": 0, "misses": 0, "invalidations": 0})
+        counters[outcome] += n
+        
+    def _drop(self, cache_key: Tuple[str, Hashable]):
+        """Remove one entry and its user index reference."""
+        _, user_id, _ = self.entries.pop(cache_key)
+        if user_id is not None:
+            keys = self.by_user.get(user_id)
+            if keys is not None:
+                keys.discard(cache_key)
+                if not keys:
+                    del self.by_user[user_id]
+                    
+    def get(self, skill_name: str, policy: CachePolicy, context: Any) -> Optional[str]:
+        """Cached result, or None on a miss."""
+        cache_key = (skill_name, policy.key(context))
+        entry = self.entries.get(cache_key)
+        if entry is not None:
+            if time.monotonic() < entry[0]:
+                self.entries.move_to_end(cache_key)
+                self._count(skill_name, "hits")
+                return entry[2]
+            self._drop(cache_key)
+        self._count(skill_name, "misses")
+        return None
+        
+    def token(self, user_id: str) -> Tuple[int, int]:
+        """Snapshot to take before running a skill and pass to put()."""
+        return self.epoch, self.generations.get(user_id, 0)
+        
+    def put(self, skill_name: str, policy: CachePolicy, context: Any, result: str, token: Tuple[int, int]):
+        """Store a result unless the user's memories changed since token was taken."""
+        if policy.invalidate_on_memory_write and token != self.token(context.user_id):
+            return
+        cache_key = (skill_name, policy.key(context))
+        if cache_key in self.entries:
+            self._drop(cache_key)
+        user_id = context.user_id if policy.invalidate_on_memory_write else None
+        self.entries[cache_key] = (time.monotonic() + policy.ttl, user_id, result)
+        if user_id is not None:
+            self.by_user.setdefault(user_id, set()).add(cache_key)
+        while len(self.entries) > self.max_entries:
+            self._drop(next(iter(self.entries)))
+            
+    def invalidate_user(self, user_id: Optional[str]):
+        """Memory write listener: drop a user's results (everyone's for None)."""
+        if user_id is None:
+            self.epoch += 1
+            keys = [key for key, entry in self.entries.items() if entry[1] is not None]
+        else:
+            self.generations[user_id] = self.generations.get(user_id, 0) + 1
+            if len(self.generations) > self.max_entries:
+                # Bound the table; the epoch bump keeps in-flight tokens stale
+                self.generations.clear()
+                self.epoch += 1
+            keys = list(self.by_user.get(user_id, ()))
+        for cache_key in keys:
+            self._drop(cache_key)
+            self._count(cache_key[0], "invalidations")
+            
+    def invalidate_skill(self, skill_name: str):
+        """Drop every result of a skill (e.g. after it is reloaded)."""
+        keys = [key for key in self.entries if key[0] == skill_name]
+        for cache_key in keys:
+            self._drop(cache_key)
+        if keys:
+            self._count(skill_name, "invalidations", len(keys))
+            
+    def get_status(self, skill_name: str) -> Dict[str, Any]:
+        """Hit rate and invalidations for one skill."""
+        counters = self.stats.get(skill_name, {"hits": 0, "misses": 0, "invalidations": 0})
+        total = counters["hits"] + counters["misses"]
+        return {**counters, "hit_rate": round(counters["hits"] / total, 3) if total else 0.0}
@@ -0,0 +1,167 @@
+"""Isolated skill execution with timeouts, concurrency caps and latency stats."""
+import asyncio
+import dataclasses
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from enum import Enum
+from typing import Dict, Any, Set
+from ..utils.latency import LatencyHistogram, rounded_percentile
+from ..utils.logging import logger
+
+class ExecutionMode(Enum):
+    INLINE = "inline"    # execute() on the event loop
+    THREAD = "thread"    # run() in a worker thread
+    PROCESS = "process"  # run() in a worker process
+
+class SkillStats:
+    """Call outcomes and latency for one skill."""
+    
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.active = 0
+        self.latency = LatencyHistogram()
+        self.error_latency = LatencyHistogram()
+        
+    def to_dict(self) -> Dict[str, Any]:
+        """Counters and latency percentiles."""
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "active": self.active,
+            "p50": rounded_percentile(self.latency, 50),
+            "p95": rounded_percentile(self.latency, 95),
+            "p99": rounded_percentile(self.latency, 99),
+            "error_p50": rounded_percentile(self.error_latency, 50)
+        }
+
+class SkillExecutor:
+    """Runs skills in their declared mode under a per-skill timeout and concurrency cap.
+    
+    The timeout covers waiting for a slot as well as the run itself. Pool
+    workers cannot be interrupted, so a timed-out THREAD or PROCESS job keeps
+    its slot until it really returns; a runaway skill starves only itself.
+    """
+    
+    def __init__(self, thread_workers: int = 4, process_workers: int = 2):
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self._pools: Dict[ExecutionMode, Executor] = {}
+        self.slots: Dict[str, asyncio.Semaphore] = {}
+        self.running: Dict[str, Set[asyncio.Future]] = {}
+        self.stats: Dict[str, SkillStats] = {}
+        
+    def _pool(self, mode: ExecutionMode) -> Executor:
+        """Worker pool for a mode, created on first use."""
+        pool = self._pools.get(mode)
+        if pool is None:
+            if mode is ExecutionMode.THREAD:
+                pool = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="skill")
+            else:
+                pool = ProcessPoolExecutor(max_workers=self.process_workers)
+            self._pools[mode] = pool
+        return pool
+        
+    def _slot(self, skill: Any) -> asyncio.Semaphore:
+        """Concurrency slot for a skill."""
+        slot = self.slots.get(skill.name)
+        if slot is None:
+            slot = self.slots[skill.name] = asyncio.Semaphore(max(1, skill.max_concurrency))
+        return slot
+        
+    def _submit(self, skill: Any, context: Any, done) -> asyncio.Future:
+        """Start the skill; done() runs once the work has really finished."""
+        loop = asyncio.get_running_loop()
+        mode = ExecutionMode(skill.execution_mode)
+        
+        if mode is ExecutionMode.INLINE:
+            work = loop.create_task(skill.execute(context))
+            work.add_done_callback(lambda _: done())
+            return work
+        
+        if mode is ExecutionMode.PROCESS:
+            # Live handles (memory system, clients) cannot cross a process boundary
+            context = dataclasses.replace(context, memory_system=None)
+        job = self._pool(mode).submit(skill.run, context)
+        job.add_done_callback(lambda _: loop.call_soon_threadsafe(done))
+        return asyncio.wrap_future(job, loop=loop)
+        
+    async def run(self, skill: Any, context: Any) -> str:
+        """Run a skill; raises asyncio.TimeoutError past its timeout."""
+        name = skill.name
+        stats = self.stats.setdefault(name, SkillStats())
+        slot = self._slot(skill)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        stats.calls += 1
+        
+        try:
+            await asyncio.wait_for(slot.acquire(), timeout=skill.timeout)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            raise
+        
+        running = self.running.setdefault(name, set())
+        work = None
+        
+        def done():
+            stats.active -= 1
+            slot.release()
+            running.discard(work)
+        
+        stats.active += 1
+        try:
+            work = self._submit(skill, context, done)
+        except Exception:
+            done()
+            stats.errors += 1
+            raise
+        running.add(work)
+        
+        try:
+            # Cancels the work on timeout or when the caller is cancelled
+            result = await asyncio.wait_for(work, timeout=max(0.0, start + skill.timeout - loop.time()))
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            logger.warning(f"Skill {name} timed out after {skill.timeout}s")
+            raise
+        except asyncio.CancelledError:
+            stats.cancelled += 1
+            raise
+        except Exception:
+            stats.errors += 1
+            stats.error_latency.record(loop.time() - start)
+            raise
+        
+        stats.latency.record(loop.time() - start)
+        return result
+        
+    def cancel(self, skill_name: str) -> int:
+        """Cancel in-flight runs of a skill; returns how many were signalled."""
+        running = list(self.running.get(skill_name, ()))
+        for work in running:
+            work.cancel()
+        return len(running)
+        
+    def get_status(self, skill: Any) -> Dict[str, Any]:
+        """Execution settings and stats for a skill (loaded or not)."""
+        stats = self.stats.get(skill.name) or SkillStats()
+        return {
+            "mode": ExecutionMode(skill.execution_mode).value,
+            "timeout": skill.timeout,
+            "max_concurrency": skill.max_concurrency,
+            **stats.to_dict()
+        }
+        
+    def shutdown(self):
+        """Stop the worker pools without waiting for running jobs."""
+        # Cancelling drops queued jobs (shutdown(cancel_futures=) needs 3.9)
+        for running in self.running.values():
+            for work in list(running):
+                work.cancel()
+        for pool in self._pools.values():
+            pool.shutdown(wait=False)
+        self._pools.clear()
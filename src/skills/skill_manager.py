@@ -1,12 +1,20 @@
 """Dynamic skill loading and execution system."""
 import asyncio
+import hashlib
 import importlib
+import importlib.util
 import inspect
-from typing import Dict, Any, List, Optional, Callable
+import os
+import sys
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from pathlib import Path
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from ..utils.logging import logger
+from ..utils.helpers import safe_json_load, safe_json_save
+from .trigger_index import TriggerIndex
+from .skill_executor import SkillExecutor, ExecutionMode
+from .skill_cache import CachePolicy, SkillResultCache
 
 @dataclass
 class SkillContext:
@@ -39,118 +47,380 @@ class BaseSkill(ABC):
         """Keywords that trigger this skill."""
         return []
     
+    @property
+    def priority(self) -> int:
+        """Higher priority skills win when several triggers match."""
+        return 0
+        
     @property
     def requires_memory(self) -> bool:
         """Whether skill needs memory access."""
         return False
     
+    @property
+    def execution_mode(self) -> ExecutionMode:
+        """Where the skill runs; THREAD and PROCESS skills implement run()."""
+        return ExecutionMode.INLINE
+        
+    @property
+    def timeout(self) -> float:
+        """Seconds before a run is abandoned."""
+        return 30.0
+        
+    @property
+    def max_concurrency(self) -> int:
+        """Concurrent runs allowed before callers queue."""
+        return 4
+        
+    @property
+    def cache_policy(self) -> Optional[CachePolicy]:
+        """Result caching for repeated requests; None runs the skill every time."""
+        return None
+        
     @abstractmethod
     async def execute(self, context: SkillContext) -> str:
         """Execute the skill."""
         pass
+        
+    def run(self, context: SkillContext) -> str:
+        """Blocking work for THREAD and PROCESS skills (called instead of execute).
+        
+        PROCESS skills get a context without memory_system, and the skill
+        object is pickled to the worker, so keep its state picklable.
+        """
+        raise NotImplementedError(f"{self.name} does not implement run()")
     
     def should_trigger(self, message: str) -> bool:
-        """Check if skill should be triggered."""
+        """Check if skill should be triggered.
+        
+        SkillManager matches triggers through its TriggerIndex; it only calls
+        this for skills that override it with custom logic.
+        """
         message_lower = message.lower()
         return any(trigger in message_lower for trigger in self.triggers)
 
+@dataclass
+class SkillStub:
+    """Manifest entry standing in for a skill whose module is not imported yet."""
+    name: str
+    description: str
+    triggers: List[str]
+    priority: int
+    requires_memory: bool
+    file: str
+    class_name: str
+    custom_trigger: bool = False
+    execution_mode: str = ExecutionMode.INLINE.value
+    timeout: float = 30.0
+    max_concurrency: int = 4
+
+# Modules in the skills directory that hold no skills
+_INTERNAL_MODULES = {"skill_manager", "trigger_index", "skill_executor", "skill_watcher", "skill_cache"}
+
+MANIFEST_VERSION = 2
+
 class SkillManager:
-    """Manages dynamic skill loading and execution."""
+    """Manages dynamic skill loading and execution.
+    
+    Skill metadata is cached in a manifest keyed by file mtime/size (and a
+    content hash when those change). At startup only changed files are
+    imported; every other skill is a SkillStub until it first triggers.
+    """
     
-    def __init__(self, skills_dir: str = "src/skills"):
+    def __init__(self, skills_dir: str = "src/skills", manifest_file: str = "data/skill_manifest.json"):
         self.skills_dir = Path(skills_dir)
-        self.skills: Dict[str, BaseSkill] = {}
+        self.manifest_file = Path(manifest_file)
+        self.manifest: Dict[str, Any] = {"version": MANIFEST_VERSION, "files": {}}
+        self.skills: Dict[str, Any] = {}  # BaseSkill, or SkillStub until first use
         self.skill_modules = {}
+        self.trigger_index = TriggerIndex()
+        self.custom_triggers: List[str] = []  # Skills overriding should_trigger
+        self.executor = SkillExecutor()
+        self.result_cache = SkillResultCache()
+        self._load_lock: Optional[asyncio.Lock] = None
         
     async def load_skills(self) -> None:
-        """Dynamically load all skills."""
+        """Register all skills, importing only files the manifest does not cover."""
         if not self.skills_dir.exists():
             self.skills_dir.mkdir(parents=True)
             logger.info(f"Created skills directory: {self.skills_dir}")
             return
         
-        skill_files = list(self.skills_dir.glob("*.py"))
+        cached = safe_json_load(self.manifest_file, {})
+        if cached.get("version") != MANIFEST_VERSION:
+            cached = {"files": {}}
+        self.manifest = {"version": MANIFEST_VERSION, "files": {}}
+        imported = 0
+        
+        skill_files = sorted(self.skills_dir.glob("*.py"))
         
         for skill_file in skill_files:
-            if skill_file.name.startswith("__"):
+            if not self.is_skill_file(skill_file):
                 continue
             
-            try:
-                await self._load_skill_file(skill_file)
-            except Exception as e:
-                logger.error(f"Failed to load skill {skill_file.name}: {e}")
+            entry = self._cached_entry(skill_file, cached["files"].get(skill_file.name))
+            if entry is None:
+                try:
+                    await self._load_skill_file(skill_file, reindex=False)
+                    imported += 1
+                except Exception as e:
+                    logger.error(f"Failed to load skill {skill_file.name}: {e}")
+                continue
+            
+            for meta in entry["skills"]:
+                if meta["name"] not in self.skills:
+                    self.skills[meta["name"]] = SkillStub(file=skill_file.name, **meta)
+            self.manifest["files"][skill_file.name] = entry
         
-        await asyncio.sleep(0)  # Ensure async behavior
-        logger.info(f"Loaded {len(self.skills)} skills: {list(self.skills.keys())}")
+        # Custom should_trigger logic needs the real object
+        for name, skill in list(self.skills.items()):
+            if isinstance(skill, SkillStub) and skill.custom_trigger:
+                await self._resolve_skill(name)
+        
+        if self.manifest["files"] != cached["files"]:
+            self._save_manifest()
+        
+        self._rebuild_trigger_index()
+        logger.info(f"Loaded {len(self.skills)} skills ({imported} files imported): {list(self.skills.keys())}")
+        
+    def is_skill_file(self, skill_file: Path) -> bool:
+        """Whether a file in the skills directory holds skills."""
+        return (skill_file.suffix == ".py" and not skill_file.name.startswith("__")
+                and skill_file.stem not in _INTERNAL_MODULES)
     
-    async def _load_skill_file(self, skill_file: Path) -> None:
-        """Load a single skill file."""
-        module_name = f"skills.{skill_file.stem}"
+    def _cached_entry(self, skill_file: Path, entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Manifest entry for a file if it still describes it, else None."""
+        if not entry:
+            return None
+        stat = skill_file.stat()
+        if entry.get("mtime_ns") == stat.st_mtime_ns and entry.get("size") == stat.st_size:
+            return entry
+        # Touched but unchanged (checkout, copy): keep the entry, refresh the stamp
+        if entry.get("sha1") == hashlib.sha1(skill_file.read_bytes()).hexdigest():
+            return {**entry, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        return None
+        
+    def _module_name(self, skill_file: Path) -> str:
+        """Import name; files in this package import as part of it so relative imports work."""
+        if skill_file.parent.resolve() == Path(__file__).parent.resolve():
+            return f"{__package__}.{skill_file.stem}"
+        return f"skills.{skill_file.stem}"
         
+    @staticmethod
+    def _exec_module(module_name: str, skill_file: Path) -> Tuple[Any, os.stat_result, bytes]:
+        """Compile and run a fresh copy of a skill module (called in a worker thread)."""
+        stat = skill_file.stat()
+        source = skill_file.read_bytes()
+        spec = importlib.util.spec_from_file_location(module_name, skill_file)
+        module = importlib.util.module_from_spec(spec)
+        previous = sys.modules.get(module_name)
+        sys.modules[module_name] = module  # Dataclasses and pickling look modules up here
         try:
-            spec = importlib.util.spec_from_file_location(module_name, skill_file)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-            
-            for name, obj in inspect.getmembers(module):
-                if (inspect.isclass(obj) and issubclass(obj, BaseSkill) and obj != BaseSkill):
-                    skill_instance = obj()
-                    self.skills[skill_instance.name] = skill_instance
-                    self.skill_modules[skill_instance.name] = module
-                    logger.info(f"Loaded skill: {skill_instance.name}")
+            exec(compile(source, str(skill_file), "exec"), module.__dict__)
+        except BaseException:
+            if previous is None:
+                del sys.modules[module_name]
+            else:
+                sys.modules[module_name] = previous
+            raise
+        return module, stat, source
+        
+    async def _load_skill_file(self, skill_file: Path, reindex: bool = True) -> Dict[str, Any]:
+        """Import a skill file and swap its skills in; returns its manifest entry.
+        
+        The module is compiled off the event loop and the skill objects are
+        built before anything is replaced, so a file that fails to import
+        leaves the previously loaded version serving.
+        """
+        loop = asyncio.get_running_loop()
+        module_name = self._module_name(skill_file)
+        module, stat, source = await loop.run_in_executor(None, self._exec_module, module_name, skill_file)
+        
+        instances = []
+        metas = []
+        for name, obj in inspect.getmembers(module):
+            if (inspect.isclass(obj) and issubclass(obj, BaseSkill) and obj != BaseSkill
+                    and obj.__module__ == module.__name__):
+                skill_instance = obj()
+                instances.append(skill_instance)
+                metas.append({
+                    "name": skill_instance.name,
+                    "description": skill_instance.description,
+                    "triggers": list(skill_instance.triggers),
+                    "priority": skill_instance.priority,
+                    "requires_memory": skill_instance.requires_memory,
+                    "class_name": name,
+                    "custom_trigger": obj.should_trigger is not BaseSkill.should_trigger,
+                    "execution_mode": ExecutionMode(skill_instance.execution_mode).value,
+                    "timeout": skill_instance.timeout,
+                    "max_concurrency": skill_instance.max_concurrency
+                })
+        
+        entry = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha1": hashlib.sha1(source).hexdigest(),
+            "skills": metas
+        }
+        self._swap_file(skill_file.name, instances, entry, module, reindex)
+        for skill_instance in instances:
+            logger.info(f"Loaded skill: {skill_instance.name}")
+        return entry
+        
+    def _swap_file(self, filename: str, instances: List[BaseSkill], entry: Optional[Dict[str, Any]],
+                   module: Any = None, reindex: bool = True):
+        """Replace the skills that came from one file (entry None removes the file).
+        
+        Runs without awaiting, so find_matching_skills sees either the old
+        skills and index or the new ones, never a mix.
+        """
+        old_names = {meta["name"] for meta in self.manifest["files"].get(filename, {}).get("skills", [])}
+        new = {skill.name: skill for skill in instances}
+        
+        # Keep load order stable so ties between equal priorities do not shift
+        skills = {}
+        for name, skill in self.skills.items():
+            if name in new:
+                skills[name] = new.pop(name)
+            elif name not in old_names:
+                skills[name] = skill
+        skills.update(new)
+        
+        for name in old_names:
+            self.skill_modules.pop(name, None)
+        for skill in instances:
+            self.skill_modules[skill.name] = module
+            self.executor.slots.pop(skill.name, None)  # Pick up a new max_concurrency
+        for name in old_names | {skill.name for skill in instances}:
+            self.result_cache.invalidate_skill(name)
+        
+        if entry is None:
+            self.manifest["files"].pop(filename, None)
+        else:
+            self.manifest["files"][filename] = entry
+        self.skills = skills
+        if reindex:
+            self._rebuild_trigger_index()
             
-            await asyncio.sleep(0)  # Ensure async behavior
-                    
-        except Exception as e:
-            logger.error(f"Error loading skill file {skill_file}: {e}")
+    def _lock(self) -> asyncio.Lock:
+        """Lock serializing imports (created lazily inside the running loop)."""
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        return self._load_lock
+        
+    async def _resolve_skill(self, skill_name: str) -> Optional[BaseSkill]:
+        """The skill object, importing its module on first use."""
+        skill = self.skills.get(skill_name)
+        if not isinstance(skill, SkillStub):
+            return skill
+        
+        async with self._lock():
+            skill = self.skills.get(skill_name)
+            if isinstance(skill, SkillStub):
+                try:
+                    await self._load_skill_file(self.skills_dir / skill.file)
+                except Exception as e:
+                    logger.error(f"Failed to load skill {skill_name} from {skill.file}: {e}")
+                    return None
+                self._save_manifest()
+        
+        resolved = self.skills.get(skill_name)
+        return None if isinstance(resolved, SkillStub) else resolved
+        
+    def _save_manifest(self):
+        """Persist skill metadata for the next startup."""
+        if not safe_json_save(self.manifest_file, self.manifest):
+            logger.error(f"Failed to save skill manifest to {self.manifest_file}")
     
+    async def reload_file(self, filename: str, force: bool = False) -> bool:
+        """Re-import one skill file; on failure the loaded version keeps serving."""
+        skill_file = self.skills_dir / filename
+        async with self._lock():
+            entry = self.manifest["files"].get(filename)
+            loaded = entry and not any(isinstance(self.skills.get(meta["name"]), SkillStub) for meta in entry["skills"])
+            if not force and loaded and self._cached_entry(skill_file, entry) is not None:
+                return True  # Saved without changes
+            
+            try:
+                await self._load_skill_file(skill_file)
+            except Exception as e:
+                logger.error(f"Failed to reload {filename}, keeping the loaded version: {e}")
+                return False
+            self._save_manifest()
+        
+        logger.info(f"Reloaded skill file: {filename}")
+        return True
+        
+    def remove_file(self, filename: str) -> bool:
+        """Unregister the skills of a deleted file."""
+        if filename not in self.manifest["files"]:
+            return False
+        self._swap_file(filename, [], None)
+        self._save_manifest()
+        logger.info(f"Removed skills from {filename}")
+        return True
+        
     async def reload_skill(self, skill_name: str) -> bool:
         """Reload a specific skill."""
-        if skill_name not in self.skill_modules:
+        skill = self.skills.get(skill_name)
+        if skill is None:
             return False
+        if isinstance(skill, SkillStub):
+            filename = skill.file
+        else:
+            filename = next((name for name, entry in self.manifest["files"].items()
+                             if any(meta["name"] == skill_name for meta in entry["skills"])), None)
+            if filename is None:
+                return False
         
-        try:
-            module = self.skill_modules[skill_name]
-            importlib.reload(module)
-            
-            for name, obj in inspect.getmembers(module):
-                if (inspect.isclass(obj) and issubclass(obj, BaseSkill) and obj != BaseSkill):
-                    skill_instance = obj()
-                    if skill_instance.name == skill_name:
-                        self.skills[skill_name] = skill_instance
-                        logger.info(f"Reloaded skill: {skill_name}")
-                        await asyncio.sleep(0)  # Ensure async behavior
-                        return True
-            
-            return False
-            
-        except Exception as e:
-            logger.error(f"Failed to reload skill {skill_name}: {e}")
-            return False
+        return await self.reload_file(filename, force=True) and skill_name in self.skills
     
     async def execute_skill(self, skill_name: str, context: SkillContext) -> Optional[str]:
         """Execute a specific skill."""
         if skill_name not in self.skills:
             return None
         
-        skill = self.skills[skill_name]
+        skill = await self._resolve_skill(skill_name)
+        if skill is None:
+            return f"Sorry, the {skill_name} skill is unavailable right now."
+        
+        policy = skill.cache_policy
+        if policy is not None:
+            cached = self.result_cache.get(skill_name, policy, context)
+            if cached is not None:
+                return cached
+            token = self.result_cache.token(context.user_id)
         
         try:
-            result = await skill.execute(context)
+            result = await self.executor.run(skill, context)
             logger.info(f"Executed skill {skill_name} for user {context.user_id}")
+            if policy is not None and result is not None:
+                self.result_cache.put(skill_name, policy, context, result, token)
             return result
+        
+        except asyncio.TimeoutError:
+            return f"Sorry, the {skill_name} skill took too long. Try again in a bit!"
             
         except Exception as e:
             logger.error(f"Skill {skill_name} execution failed: {e}")
             return f"Sorry, the {skill_name} skill encountered an error."
     
+    def _rebuild_trigger_index(self):
+        """Recompile the trigger index after skills are loaded or reloaded."""
+        self.trigger_index = TriggerIndex.build(self.skills)
+        self.custom_triggers = [
+            name for name, skill in self.skills.items()
+            if not isinstance(skill, SkillStub) and type(skill).should_trigger is not BaseSkill.should_trigger
+        ]
+        logger.debug(f"Indexed {self.trigger_index.trigger_count} skill triggers")
+        
     async def find_matching_skills(self, message: str) -> List[str]:
-        """Find skills that match the message."""
-        matching_skills = []
+        """Find skills that match the message, highest priority first."""
+        matching_skills = self.trigger_index.match(message)
         
-        for skill_name, skill in self.skills.items():
-            if skill.should_trigger(message):
-                matching_skills.append(skill_name)
+        custom = [name for name in self.custom_triggers if name not in matching_skills and self.skills[name].should_trigger(message)]
+        if custom:
+            matching_skills = sorted(matching_skills + custom, key=self.trigger_index.order.__getitem__)
         
         await asyncio.sleep(0)  # Ensure async behavior
         return matching_skills
@@ -161,7 +431,10 @@ class SkillManager:
             name: {
                 'description': skill.description,
                 'triggers': skill.triggers,
-                'requires_memory': skill.requires_memory
+                'priority': skill.priority,
+                'requires_memory': skill.requires_memory,
+                'execution': self.executor.get_status(skill),
+                'cache': self.result_cache.get_status(name)
             }
             for name, skill in self.skills.items()
         }
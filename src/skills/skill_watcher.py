@@ -0,0 +1,183 @@
+"""Hot reload of skill files on change (inotify, with a polling fallback)."""
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Dict, Any, Optional, Set, Tuple
+from ..utils.logging import logger
+from .skill_manager import SkillManager, skill_manager
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_DELETE = 0x200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+def _load_libc() -> Optional[ctypes.CDLL]:
+    """libc with inotify, or None off Linux."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1  # Raises AttributeError when missing (old or non-glibc libc)
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class SkillWatcher:
+    """Watches the skills directory and hot-reloads changed skill files.
+    
+    Editors save in several steps, so events are debounced and each burst
+    reloads every touched file once through SkillManager.reload_file, which
+    imports off the event loop and swaps skills and index in one step.
+    """
+    
+    def __init__(self, manager: SkillManager, debounce: float = 0.5, poll_interval: float = 2.0):
+        self.manager = manager
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.backend: Optional[str] = None  # "inotify" or "polling" once started
+        self._fd: Optional[int] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._pending: Set[str] = set()
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self.stats = {"events": 0, "reloads": 0, "failures": 0, "removals": 0}
+        
+    async def start(self):
+        """Start watching (no-op if already started)."""
+        if self.backend:
+            return
+        loop = asyncio.get_running_loop()
+        if self._start_inotify(loop):
+            self.backend = "inotify"
+        else:
+            self._snapshot = self._scan()
+            self._poll_task = loop.create_task(self._poll())
+            self.backend = "polling"
+        logger.info(f"Watching {self.manager.skills_dir} for skill changes ({self.backend})")
+        
+    def _start_inotify(self, loop: asyncio.AbstractEventLoop) -> bool:
+        """Register an inotify watch on the event loop; False to fall back to polling."""
+        libc = _load_libc()
+        if libc is None:
+            return False
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning(f"inotify unavailable ({os.strerror(ctypes.get_errno())}), polling skills instead")
+            return False
+        
+        mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+        try:
+            if libc.inotify_add_watch(fd, os.fsencode(str(self.manager.skills_dir)), mask) < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+            loop.add_reader(fd, self._on_inotify)
+        except (OSError, NotImplementedError) as e:
+            os.close(fd)
+            logger.warning(f"Could not watch {self.manager.skills_dir} with inotify ({e}), polling instead")
+            return False
+        
+        self._fd = fd
+        return True
+        
+    def _on_inotify(self):
+        """Read queued inotify events (called by the event loop)."""
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if name:
+                self._queue(name)
+                
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """(mtime_ns, size) of every skill file."""
+        snapshot = {}
+        for path in self.manager.skills_dir.glob("*.py"):
+            if not self.manager.is_skill_file(path):
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[path.name] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+        
+    async def _poll(self):
+        """Polling fallback: diff directory snapshots."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            snapshot = self._scan()
+            for name in set(snapshot) | set(self._snapshot):
+                if snapshot.get(name) != self._snapshot.get(name):
+                    self._queue(name)
+            self._snapshot = snapshot
+            
+    def _queue(self, name: str):
+        """Note a changed file and restart the debounce timer."""
+        if not self.manager.is_skill_file(Path(name)):
+            return
+        self.stats["events"] += 1
+        self._pending.add(name)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.debounce, self._debounced)
+        
+    def _debounced(self):
+        """Quiet period over: reload what changed."""
+        self._timer = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+            
+    async def _flush(self):
+        """Reload or remove pending files until a new burst starts."""
+        while self._pending and self._timer is None:
+            names = sorted(self._pending)
+            self._pending.clear()
+            for name in names:
+                if (self.manager.skills_dir / name).exists():
+                    ok = await self.manager.reload_file(name)
+                    self.stats["reloads" if ok else "failures"] += 1
+                elif self.manager.remove_file(name):
+                    self.stats["removals"] += 1
+                    
+    async def stop(self):
+        """Stop watching."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        for task in (self._poll_task, self._flush_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._poll_task = self._flush_task = None
+        self.backend = None
+        await asyncio.sleep(0)  # Ensure async behavior
+        
+    def get_status(self) -> Dict[str, Any]:
+        """Get watcher backend and reload counters."""
+        return {
+            "backend": self.backend,
+            "debounce": self.debounce,
+            "pending": sorted(self._pending),
+            **self.stats
+        }
+
+# Global instance
+skill_watcher = SkillWatcher(skill_manager)
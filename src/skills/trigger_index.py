@@ -0,0 +1,64 @@
+"""Compiled trigger index for matching messages to skills."""
+import re
+from typing import Any, Dict, List, Tuple
+
+# Words and single punctuation characters, so "```" and "c++" are triggers like
+# any other and still match when glued to other punctuation ("f()```", "c++,")
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+class TriggerIndex:
+    """Token trie over every skill trigger.
+    
+    Triggers match whole tokens (word-boundary semantics) with any whitespace
+    between their words. A message is tokenized once and each token starts at
+    most one walk down the trie, so matching cost depends on message length
+    and trigger word count, not on how many skills are loaded.
+    """
+    
+    def __init__(self):
+        self.root: Dict[Any, Any] = {}
+        self.order: Dict[str, Tuple[int, int]] = {}  # skill -> (-priority, load position)
+        self.trigger_count = 0
+        
+    @classmethod
+    def build(cls, skills: Dict[str, Any]) -> "TriggerIndex":
+        """Index every trigger of every skill (in load order)."""
+        index = cls()
+        for position, (name, skill) in enumerate(skills.items()):
+            index.order[name] = (-skill.priority, position)
+            for trigger in skill.triggers:
+                index.add(trigger, name)
+        return index
+        
+    def add(self, trigger: str, skill_name: str):
+        """Add one trigger phrase for a skill."""
+        tokens = _TOKEN.findall(trigger.lower())
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        # None never collides with a token key; it holds the skills ending here
+        node.setdefault(None, []).append(skill_name)
+        self.trigger_count += 1
+        
+    def match(self, message: str) -> List[str]:
+        """Skills with a trigger in the message, highest priority first."""
+        tokens = _TOKEN.findall(message.lower())
+        root = self.root
+        found = set()
+        for start, token in enumerate(tokens):
+            node = root.get(token)
+            position = start + 1
+            while node is not None:
+                skills = node.get(None)
+                if skills:
+                    found.update(skills)
+                if position == len(tokens):
+                    break
+                node = node.get(tokens[position])
+                position += 1
+        
+        if not found:
+            return []
+        return sorted(found, key=self.order.__getitem__)
@@ -0,0 +1,93 @@
+"""Latency histograms shared by routing, model swapping and skill execution."""
+import time
+from typing import Dict, Optional
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of latencies in milliseconds.
+
+    Values below ``sub_buckets`` ms get exact buckets; above that each power of
+    two is split into ``sub_buckets`` linear buckets, so relative error stays
+    around ``1 / sub_buckets`` at any magnitude with a handful of sparse counters.
+    """
+    
+    def __init__(self, sub_buckets: int = 16):
+        self.sub_buckets = sub_buckets
+        self.sub_bits = sub_buckets.bit_length() - 1
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        
+    def _index(self, ms: int) -> int:
+        """Map a millisecond value to its bucket index."""
+        if ms < self.sub_buckets:
+            return ms
+        shift = ms.bit_length() - 1 - self.sub_bits
+        return self.sub_buckets * (shift + 1) + (ms >> shift) - self.sub_buckets
+        
+    def _value(self, index: int) -> float:
+        """Get the midpoint (ms) of a bucket."""
+        if index < self.sub_buckets:
+            return float(index)
+        shift = index // self.sub_buckets - 1
+        base = (index % self.sub_buckets + self.sub_buckets) << shift
+        return base + ((1 << shift) - 1) / 2
+        
+    def record(self, seconds: float):
+        """Record a latency sample."""
+        index = self._index(max(0, int(seconds * 1000)))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        
+    def merge(self, other: "LatencyHistogram"):
+        """Add another histogram's counts into this one."""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        
+    def percentile(self, p: float) -> Optional[float]:
+        """Get the p-th percentile (0-100) in seconds."""
+        if not self.total:
+            return None
+        target = max(1, int(self.total * p / 100 + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return self._value(index) / 1000
+        return None
+
+class WindowedHistogram:
+    """Two rotating histograms so percentiles reflect roughly the last one to two windows."""
+    
+    def __init__(self, window_seconds: float = 300.0):
+        self.window_seconds = window_seconds
+        self.current = LatencyHistogram()
+        self.previous = LatencyHistogram()
+        self.window_start = time.monotonic()
+        
+    def _rotate(self):
+        """Rotate windows when the current one has expired."""
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        if elapsed < self.window_seconds:
+            return
+        # After a long idle period both windows are stale
+        self.previous = self.current if elapsed < 2 * self.window_seconds else LatencyHistogram()
+        self.current = LatencyHistogram()
+        self.window_start = now
+        
+    def record(self, seconds: float):
+        """Record a sample."""
+        self._rotate()
+        self.current.record(seconds)
+        
+    def snapshot(self) -> LatencyHistogram:
+        """Get a merged view of both windows."""
+        self._rotate()
+        merged = LatencyHistogram()
+        merged.merge(self.previous)
+        merged.merge(self.current)
+        return merged
+
+def rounded_percentile(histogram: LatencyHistogram, p: float) -> Optional[float]:
+    """Get a rounded percentile, or None without samples."""
+    return round(histogram.percentile(p), 3) if histogram.total else None
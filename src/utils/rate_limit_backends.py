@@ -0,0 +1,426 @@
+"""Rate limit state backends: in-process GCRA and a shared Redis store."""
+import math
+import time
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Any
+from ..utils.logging import logger
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError, NoScriptError
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Decisions returned by backends
+ALLOW = "ok"
+BURST = "burst"  # Admitted from the burst allowance (counts as a violation)
+USER_LIMITED = "user"
+SERVER_LIMITED = "server"
+
+@dataclass(frozen=True)
+class GCRARule:
+    """Emission interval and tolerances for one limit, in seconds."""
+    interval: float
+    tolerance: float
+    burst_tolerance: float
+    
+    @classmethod
+    def for_limit(cls, requests: int, window: float, burst: int = 0) -> "GCRARule":
+        """`requests` back-to-back fit within the window; burst adds a further allowance."""
+        interval = window / requests
+        tolerance = window - interval
+        return cls(interval, tolerance, tolerance + burst * interval)
+
+class GCRA:
+    """Generic cell rate algorithm over many keys.
+    
+    Each key stores a single float: its theoretical arrival time (TAT). A request
+    at ``now`` conforms if ``max(TAT, now) - now <= tolerance`` and advances TAT
+    by one emission interval, so checks are O(1) with no per-request history.
+    A key whose TAT has passed is indistinguishable from a new key (its bucket
+    is full), so a timing wheel drops it at that point; ``max_keys`` bounds
+    memory even when many keys are active at once.
+    """
+    
+    def __init__(self, resolution: float = 1.0, wheel_size: int = 512, max_keys: int = 200_000):
+        self.resolution = resolution
+        self.wheel_size = wheel_size
+        self.max_keys = max_keys
+        self.tat: Dict[str, float] = {}
+        self.wheel: List[List[str]] = [[] for _ in range(wheel_size)]
+        self._tick: Optional[int] = None
+        self.evicted = 0
+        
+    def excess(self, key: str, tolerance: float, now: float) -> float:
+        """Seconds the next request is early by; <= 0 means it conforms."""
+        return self.tat.get(key, now) - now - tolerance
+        
+    def next_tat(self, key: str, interval: float, now: float) -> float:
+        """TAT after admitting a request now."""
+        return max(self.tat.get(key, now), now) + interval
+        
+    def commit(self, key: str, tat: float):
+        """Store a key's new TAT, scheduling its expiry if it is new."""
+        if key not in self.tat:
+            self._schedule(key, tat)
+            if len(self.tat) >= self.max_keys:
+                self._evict_overflow()
+        self.tat[key] = tat
+        
+    def pending(self, key: str, interval: float, now: float) -> int:
+        """Requests still counted against key (how far TAT runs ahead of now)."""
+        ahead = self.tat.get(key, now) - now
+        return max(0, math.ceil(ahead / interval - 1e-9)) if ahead > 0 else 0
+        
+    def reset(self, key: str):
+        """Forget a key (its wheel entry is skipped lazily)."""
+        self.tat.pop(key, None)
+        
+    def _schedule(self, key: str, when: float):
+        """Put key in the wheel slot for when."""
+        self.wheel[int(when / self.resolution) % self.wheel_size].append(key)
+        
+    def advance(self, now: float) -> int:
+        """Expire keys whose TAT has passed; returns how many were dropped."""
+        target = int(now / self.resolution)
+        if self._tick is None:
+            self._tick = target
+            return 0
+        
+        dropped = 0
+        # After a long idle period every slot is visited exactly once
+        for tick in range(self._tick + 1, min(target, self._tick + self.wheel_size) + 1):
+            index = tick % self.wheel_size
+            keys, self.wheel[index] = self.wheel[index], []
+            for key in keys:
+                tat = self.tat.get(key)
+                if tat is None:
+                    continue
+                if tat <= now:
+                    del self.tat[key]
+                    dropped += 1
+                else:
+                    # Still limited (TAT moved on, or a later wheel round): reschedule once
+                    self._schedule(key, tat)
+        self._tick = max(self._tick, target)
+        return dropped
+        
+    def _evict_overflow(self):
+        """Drop the keys closest to a full bucket until back under 90% of max_keys."""
+        limit = int(self.max_keys * 0.9)
+        start = self._tick if self._tick is not None else 0
+        for offset in range(self.wheel_size):
+            if len(self.tat) <= limit:
+                return
+            index = (start + offset) % self.wheel_size
+            keys, self.wheel[index] = self.wheel[index], []
+            for key in keys:
+                if len(self.tat) > limit and self.tat.pop(key, None) is not None:
+                    self.evicted += 1
+                elif key in self.tat:
+                    self.wheel[index].append(key)
+                    
+    def __len__(self) -> int:
+        return len(self.tat)
+
+class RateLimitBackend(ABC):
+    """Where limiter state lives."""
+    
+    @abstractmethod
+    async def acquire(
+        self,
+        user_key: str,
+        user_rule: GCRARule,
+        server_key: Optional[str] = None,
+        server_rule: Optional[GCRARule] = None
+    ) -> str:
+        """Check and record one request against both limits atomically."""
+        pass
+        
+    @abstractmethod
+    async def reset(self, user_key: str):
+        """Forget a user's limit state."""
+        pass
+        
+    def cleanup(self) -> int:
+        """Drop expired local state; returns how many keys were dropped."""
+        return 0
+        
+    async def close(self):
+        """Release connections."""
+        pass
+        
+    @abstractmethod
+    def get_status(self) -> Dict[str, Any]:
+        """Get backend counters."""
+        pass
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """Per-process limits; each bot process enforces them independently."""
+    
+    def __init__(self, max_keys: int = 200_000):
+        self.users = GCRA(max_keys=max_keys)
+        self.servers = GCRA(max_keys=max_keys)
+        
+    def decide(
+        self,
+        user_key: str,
+        user_rule: GCRARule,
+        server_key: Optional[str],
+        server_rule: Optional[GCRARule],
+        now: float
+    ) -> str:
+        """Synchronous acquire at an explicit time."""
+        self.users.advance(now)
+        decision = ALLOW
+        if self.users.excess(user_key, user_rule.tolerance, now) > 0:
+            if self.users.excess(user_key, user_rule.burst_tolerance, now) > 0:
+                return USER_LIMITED
+            decision = BURST
+        
+        # Both limits move together or not at all
+        if server_key and server_rule:
+            self.servers.advance(now)
+            if self.servers.excess(server_key, server_rule.tolerance, now) > 0:
+                return SERVER_LIMITED
+            self.servers.commit(server_key, self.servers.next_tat(server_key, server_rule.interval, now))
+        
+        self.users.commit(user_key, self.users.next_tat(user_key, user_rule.interval, now))
+        return decision
+        
+    async def acquire(
+        self,
+        user_key: str,
+        user_rule: GCRARule,
+        server_key: Optional[str] = None,
+        server_rule: Optional[GCRARule] = None
+    ) -> str:
+        """Check and record one request against both limits atomically."""
+        return self.decide(user_key, user_rule, server_key, server_rule, time.time())
+        
+    async def reset(self, user_key: str):
+        """Forget a user's limit state."""
+        self.users.reset(user_key)
+        
+    def pending(self, user_key: str, user_rule: GCRARule) -> int:
+        """Requests still counted against a user."""
+        return self.users.pending(user_key, user_rule.interval, time.time())
+        
+    def cleanup(self) -> int:
+        """Drop keys whose buckets have refilled."""
+        now = time.time()
+        return self.users.advance(now) + self.servers.advance(now)
+        
+    def get_status(self) -> Dict[str, Any]:
+        """Get backend counters."""
+        return {
+            "backend": "memory",
+            "active_users": len(self.users),
+            "active_servers": len(self.servers),
+            "evicted_keys": self.users.evicted + self.servers.evicted
+        }
+
+# Same decision logic as MemoryRateLimitBackend.decide, on Redis server time so
+# every shard shares one clock. KEYS: user [, server]. ARGV: user interval,
+# tolerance, burst tolerance, server interval, server tolerance.
+GCRA_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local user_tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local excess = user_tat - now
+local decision = 'ok'
+if excess > tonumber(ARGV[2]) then
+    if excess > tonumber(ARGV[3]) then return 'user' end
+    decision = 'burst'
+end
+if #KEYS > 1 then
+    local server_tat = math.max(tonumber(redis.call('GET', KEYS[2]) or now), now)
+    if server_tat - now > tonumber(ARGV[5]) then return 'server' end
+    server_tat = server_tat + tonumber(ARGV[4])
+    redis.call('SET', KEYS[2], string.format('%.6f', server_tat), 'PX', math.ceil((server_tat - now) * 1000))
+end
+user_tat = user_tat + tonumber(ARGV[1])
+redis.call('SET', KEYS[1], string.format('%.6f', user_tat), 'PX', math.ceil((user_tat - now) * 1000))
+return decision
+"""
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """Limits shared by every bot process through Redis.
+    
+    Each decision is one EVALSHA of GCRA_SCRIPT, so it is atomic across
+    shards. Calls arriving within ``batch_window_ms`` are sent as one pipeline
+    to save round-trips. If Redis is unreachable the backend falls back to
+    ``fallback`` (per-process limits) and retries after ``retry_interval``.
+    """
+    
+    def __init__(
+        self,
+        url: str,
+        fallback: MemoryRateLimitBackend,
+        key_prefix: str = "priya:rl:",
+        batch_window_ms: int = 2,
+        max_batch: int = 64,
+        timeout: float = 0.25,
+        retry_interval: float = 30
+    ):
+        self.url = url
+        self.fallback = fallback
+        self.key_prefix = key_prefix
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.script_sha = hashlib.sha1(GCRA_SCRIPT.encode()).hexdigest()
+        self.client = None
+        self.pending: List[Tuple[List[str], List[Any], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self.down_until = 0.0
+        self.stats = {"requests": 0, "round_trips": 0, "fallback_decisions": 0, "failures": 0}
+        
+    def _get_client(self):
+        """Create the client on first use (needs a running event loop)."""
+        if self.client is None:
+            self.client = aioredis.from_url(
+                self.url,
+                socket_timeout=self.timeout,
+                socket_connect_timeout=self.timeout
+            )
+        return self.client
+        
+    async def acquire(
+        self,
+        user_key: str,
+        user_rule: GCRARule,
+        server_key: Optional[str] = None,
+        server_rule: Optional[GCRARule] = None
+    ) -> str:
+        """Check and record one request against both limits atomically."""
+        if time.time() < self.down_until:
+            self.stats["fallback_decisions"] += 1
+            return self.fallback.decide(user_key, user_rule, server_key, server_rule, time.time())
+        
+        keys = [f"{self.key_prefix}u:{user_key}"]
+        args = [user_rule.interval, user_rule.tolerance, user_rule.burst_tolerance, 0, 0]
+        if server_key and server_rule:
+            keys.append(f"{self.key_prefix}s:{server_key}")
+            args[3:] = [server_rule.interval, server_rule.tolerance]
+        
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((keys, args, future))
+        self.stats["requests"] += 1
+        self._schedule_flush()
+        
+        try:
+            decision = await future
+        except Exception as e:
+            self._mark_down(e)
+            self.stats["fallback_decisions"] += 1
+            return self.fallback.decide(user_key, user_rule, server_key, server_rule, time.time())
+        return decision.decode() if isinstance(decision, bytes) else decision
+        
+    def _schedule_flush(self):
+        """Flush now if the batch is full or batching is off, else after the window."""
+        if len(self.pending) >= self.max_batch or self.batch_window <= 0:
+            if self._flush_handle:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+            asyncio.create_task(self._flush())
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.batch_window, lambda: asyncio.create_task(self._flush()))
+            
+    async def _flush(self):
+        """Send all pending decisions in one pipeline."""
+        self._flush_handle = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        
+        try:
+            results = await asyncio.wait_for(self._execute(batch), timeout=self.timeout * 2)
+            if isinstance(results[0], NoScriptError):
+                # Redis restarted or flushed its script cache
+                await self._get_client().script_load(GCRA_SCRIPT)
+                results = await asyncio.wait_for(self._execute(batch), timeout=self.timeout * 2)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        if self.down_until:
+            logger.info("Rate limit store reachable again; using shared limits")
+            self.down_until = 0.0
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+                
+    async def _execute(self, batch: List[Tuple[List[str], List[Any], asyncio.Future]]) -> List[Any]:
+        """One round-trip for the whole batch."""
+        self.stats["round_trips"] += 1
+        async with self._get_client().pipeline(transaction=False) as pipe:
+            for keys, args, _ in batch:
+                pipe.evalsha(self.script_sha, len(keys), *keys, *args)
+            return await pipe.execute(raise_on_error=False)
+            
+    def _mark_down(self, error: Exception):
+        """Switch to local limits until the retry interval passes."""
+        if time.time() >= self.down_until:
+            self.stats["failures"] += 1
+            logger.warning(f"Rate limit store unreachable ({error}); using local limits for {self.retry_interval}s")
+        self.down_until = time.time() + self.retry_interval
+        
+    async def reset(self, user_key: str):
+        """Forget a user's limit state."""
+        await self.fallback.reset(user_key)
+        try:
+            await self._get_client().delete(f"{self.key_prefix}u:{user_key}")
+        except (RedisError, OSError) as e:
+            logger.warning(f"Failed to reset shared rate limit for {user_key}: {e}")
+            
+    def cleanup(self) -> int:
+        """Redis expires keys itself; only the local fallback needs cleaning."""
+        return self.fallback.cleanup()
+        
+    async def close(self):
+        """Release connections."""
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+            
+    def get_status(self) -> Dict[str, Any]:
+        """Get backend counters."""
+        return {
+            "backend": "redis",
+            "available": time.time() >= self.down_until,
+            "batch_window_ms": self.batch_window * 1000,
+            **self.stats,
+            "fallback": self.fallback.get_status()
+        }
+
+def create_backend(settings: Any, fallback: MemoryRateLimitBackend) -> RateLimitBackend:
+    """Build the configured backend; Redis only when a URL is set and redis is installed."""
+    if not settings.redis_url:
+        return fallback
+    if not REDIS_AVAILABLE:
+        logger.warning("RATE_LIMIT_REDIS_URL set but redis is not installed - using per-process limits")
+        return fallback
+    
+    logger.info("Using shared Redis rate limits")
+    return RedisRateLimitBackend(
+        settings.redis_url,
+        fallback,
+        key_prefix=settings.key_prefix,
+        batch_window_ms=settings.batch_window_ms,
+        timeout=settings.timeout_ms / 1000,
+        retry_interval=settings.retry_interval
+    )
@@ -1,10 +1,18 @@
 """Advanced rate limiting with anti-spam detection."""
 import time
-import asyncio
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, field
-from collections import defaultdict, deque
+import heapq
+from typing import Dict, List, Optional, Tuple, Any
+from dataclasses import dataclass
+from collections import OrderedDict
+from ..config.settings import config
 from ..utils.logging import logger
+from .rate_limit_backends import (
+    ALLOW, BURST, SERVER_LIMITED, GCRARule, RateLimitBackend,
+    MemoryRateLimitBackend, create_backend
+)
+
+# Burst violations are forgotten after this long without an allowed request
+VIOLATION_IDLE_RESET = 3600
 
 @dataclass
 class RateLimit:
@@ -13,60 +21,157 @@ class RateLimit:
     window: int  # seconds
     burst: int = 0  # burst allowance
 
-@dataclass
-class UserLimitState:
-    """User rate limit state."""
-    requests: deque = field(default_factory=deque)
-    last_request: float = 0
-    violations: int = 0
-    blocked_until: float = 0
-    spam_score: float = 0
+def message_sketch(message: str, k: int = 8, max_chars: int = 512) -> bytes:
+    """Bottom-k MinHash of a message's word bigrams, one byte per hash.
+    
+    Only the first ``max_chars`` are fingerprinted, so the cost and the stored
+    size (k bytes) do not grow with message length. Messages with fewer than
+    k bigrams are too short to sample; they get an 8-byte hash of the whole
+    normalized text instead, so only exact repeats of them match.
+    """
+    words = message[:max_chars].lower().split()
+    # map/zip keep the per-word work in C
+    shingles = set(map(hash, zip(words, words[1:])))
+    if len(shingles) < k:
+        return (hash(" ".join(words)) & 0xFFFFFFFFFFFFFFFF).to_bytes(8, "little")
+    return bytes(h & 0xFF for h in heapq.nsmallest(k, shingles))
+
+def sketch_similarity(a: bytes, b: bytes) -> float:
+    """Estimated Jaccard similarity: shared share of two bottom-k sketches.
+    
+    Keeping one byte per hash adds ~k/256 chance of a spurious match per
+    element, well below the duplicate threshold.
+    """
+    if a == b:
+        return 1.0
+    return len(set(a).intersection(b)) / max(len(a), len(b), 1)
+
+class SpamState:
+    """Fixed-size ring of a user's recent message times and sketches."""
+    __slots__ = ("times", "sketches", "head", "count", "short_streak")
+    
+    def __init__(self, size: int):
+        self.times = [0.0] * size
+        self.sketches: List[bytes] = [b""] * size
+        self.head = 0  # Next slot to write
+        self.count = 0
+        self.short_streak = 0  # Consecutive short messages, newest backwards
+        
+    def push(self, timestamp: float, sketch: bytes):
+        """Overwrite the oldest entry."""
+        self.times[self.head] = timestamp
+        self.sketches[self.head] = sketch
+        self.head = (self.head + 1) % len(self.times)
+        self.count = min(self.count + 1, len(self.times))
+        
+    def newest(self) -> float:
+        """Timestamp of the latest message."""
+        return self.times[(self.head - 1) % len(self.times)] if self.count else 0.0
 
 class AntiSpamDetector:
-    """Detects spam patterns."""
+    """Detects spam patterns.
     
-    def __init__(self):
-        self.message_history: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
-        self.spam_patterns = [
-            lambda msgs: len(msgs) > 5 and len({msg[0] for msg in msgs[-5:]}) == 1,  # Repeated messages
-            lambda msgs: len(msgs) > 3 and all(len(msg[0]) < 10 for msg in msgs[-3:]),  # Short spam
-            lambda msgs: len(msgs) > 10 and (msgs[-1][1] - msgs[-10][1]) < 30,  # High frequency
-        ]
+    Per user only the last ``history`` message times and MinHash sketches are
+    kept, so each check is a constant amount of work over a bounded ring and
+    users are capped at ``max_users`` (least recently active dropped first).
+    """
     
-    def check_spam(self, user_id: str, message: str) -> float:
+    def __init__(
+        self,
+        window: float = 300,
+        history: int = 10,
+        max_users: int = 50_000,
+        duplicate_similarity: float = 0.6
+    ):
+        self.window = window
+        self.history = history
+        self.max_users = max_users
+        self.duplicate_similarity = duplicate_similarity
+        self.users: "OrderedDict[str, SpamState]" = OrderedDict()
+        
+    def check_spam(self, user_id: str, message: str, now: Optional[float] = None) -> float:
         """Check spam score (0.0 = not spam, 1.0 = definitely spam)."""
-        now = time.time()
+        now = time.time() if now is None else now
+        state = self._state(user_id)
+        sketch = message_sketch(message)
         
-        # Clean old messages (last 5 minutes)
-        self.message_history[user_id] = [
-            (msg, timestamp) for msg, timestamp in self.message_history[user_id]
-            if now - timestamp < 300
-        ]
+        # One pass over the ring, newest first, stopping at the window edge
+        recent = 0
+        duplicates = 0
+        tenth_previous = None
+        window_start = now - self.window
+        for offset in range(1, state.count + 1):
+            index = (state.head - offset) % self.history
+            timestamp = state.times[index]
+            if timestamp <= window_start:
+                break
+            recent += 1
+            if offset == 9:
+                tenth_previous = timestamp
+            if sketch_similarity(sketch, state.sketches[index]) >= self.duplicate_similarity:
+                duplicates += 1
         
-        # Add current message
-        self.message_history[user_id].append((message, now))
+        if len(message) < 10:
+            state.short_streak = state.short_streak + 1 if recent else 1
+        else:
+            state.short_streak = 0
+        state.push(now, sketch)
+        total = recent + 1  # Messages in the window including this one
         
         # Check patterns
         spam_score = 0.0
-        messages = self.message_history[user_id]
-        
-        for pattern in self.spam_patterns:
-            if pattern(messages):
-                spam_score += 0.3
+        if total > 5 and duplicates >= 4:  # Repeated (near-duplicate) messages
+            spam_score += 0.3
+        if total > 3 and min(state.short_streak, total) >= 3:  # Short spam
+            spam_score += 0.3
+        if total > 10 and tenth_previous is not None and now - tenth_previous < 30:  # High frequency
+            spam_score += 0.3
         
         # Additional checks
         if len(message) < 3:  # Very short messages
             spam_score += 0.2
         
-        if message.isupper() and len(message) > 10:  # ALL CAPS
+        if len(message) > 10 and message.isupper():  # ALL CAPS
             spam_score += 0.2
         
         return min(spam_score, 1.0)
+        
+    def _state(self, user_id: str) -> SpamState:
+        """Get (or create) a user's ring, marking them most recently active."""
+        state = self.users.get(user_id)
+        if state is None:
+            state = self.users[user_id] = SpamState(self.history)
+            if len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+        else:
+            self.users.move_to_end(user_id)
+        return state
+        
+    def cleanup(self, now: Optional[float] = None) -> int:
+        """Drop users with no messages inside the window."""
+        window_start = (time.time() if now is None else now) - self.window
+        dropped = 0
+        # Least recently active first; stop at the first user still in the window
+        while self.users:
+            user_id, state = next(iter(self.users.items()))
+            if state.newest() > window_start:
+                break
+            del self.users[user_id]
+            dropped += 1
+        return dropped
 
 class AdvancedRateLimiter:
-    """Advanced rate limiting with anti-spam."""
+    """Advanced rate limiting with anti-spam.
+    
+    User and server limits are GCRA: ``requests`` per ``window`` with up to
+    ``burst`` extra requests admitted as violations; repeated violations
+    block the user progressively, and a user's violation count only resets
+    after VIOLATION_IDLE_RESET seconds without an allowed request. Limit
+    state lives in a backend (this process, or Redis shared by all shards);
+    violations, blocks and overrides stay per-process.
+    """
     
-    def __init__(self):
+    def __init__(self, max_keys: int = 200_000, settings: Optional[Any] = None):
         self.user_limits = {
             "default": RateLimit(requests=10, window=60, burst=3),
             "premium": RateLimit(requests=30, window=60, burst=5),
@@ -78,13 +183,14 @@ class AdvancedRateLimiter:
             "large": RateLimit(requests=300, window=60)
         }
         
-        self.user_states: Dict[str, UserLimitState] = defaultdict(UserLimitState)
-        self.server_states: Dict[str, UserLimitState] = defaultdict(UserLimitState)
+        self._rules: Dict[Tuple[int, int, int], GCRARule] = {}
+        self.local = MemoryRateLimitBackend(max_keys)
+        self.backend: RateLimitBackend = create_backend(settings, self.local) if settings else self.local
+        # Only offenders get entries here; both expire lazily
+        self.violations: Dict[str, Tuple[int, float]] = {}  # user_id -> (count, expiry)
+        self.blocked_until: Dict[str, float] = {}
         self.admin_overrides: Dict[str, float] = {}  # user_id -> expiry_time
         self.spam_detector = AntiSpamDetector()
-        
-        # Start cleanup task
-        self._cleanup_task = asyncio.create_task(self._cleanup_task())
     
     async def check_rate_limit(
         self, 
@@ -110,129 +216,141 @@ class AdvancedRateLimiter:
                 logger.warning(f"Spam detected from user {user_id}: score {spam_score}")
                 return False, f"Message flagged as spam (score: {spam_score:.2f})"
         
-        # Check user rate limit
-        user_allowed, user_reason = self._check_user_limit(user_id, user_tier, now)
-        if not user_allowed:
-            return False, user_reason
+        blocked_reason = self._check_blocked(user_id, now)
+        if blocked_reason:
+            return False, blocked_reason
         
-        # Check server rate limit
-        if server_id:
-            server_allowed, server_reason = self._check_server_limit(server_id, now)
-            if not server_allowed:
-                return False, server_reason
+        limit = self.user_limits.get(user_tier, self.user_limits["default"])
+        server_rule = self._server_rule() if server_id else None
+        decision = await self.backend.acquire(user_id, self._rule(limit), server_id, server_rule)
+        return self._resolve(user_id, limit, decision, now)
         
-        # Record successful request
-        self._record_request(user_id, server_id, now)
+    def check(
+        self,
+        user_id: str,
+        server_id: Optional[str] = None,
+        user_tier: str = "default",
+        now: Optional[float] = None
+    ) -> Tuple[bool, Optional[str]]:
+        """Check and record a request against this process's limits in O(1)."""
+        now = time.time() if now is None else now
+        blocked_reason = self._check_blocked(user_id, now)
+        if blocked_reason:
+            return False, blocked_reason
         
-        await asyncio.sleep(0)  # Ensure async behavior
-        return True, None
-    
-    def _check_user_limit(self, user_id: str, tier: str, now: float) -> Tuple[bool, Optional[str]]:
-        """Check user-specific rate limit."""
-        state = self.user_states[user_id]
-        limit = self.user_limits.get(tier, self.user_limits["default"])
-        
-        # Check if user is blocked
-        if now < state.blocked_until:
-            remaining = int(state.blocked_until - now)
-            return False, f"Rate limited. Try again in {remaining} seconds."
-        
-        # Clean old requests
-        while state.requests and now - state.requests[0] > limit.window:
-            state.requests.popleft()
-        
-        # Check limit
-        if len(state.requests) >= limit.requests:
-            # Check burst allowance
-            if limit.burst > 0 and len(state.requests) < limit.requests + limit.burst:
-                # Allow burst but increase violation count
-                state.violations += 1
-                if state.violations > 3:
-                    state.blocked_until = now + (60 * state.violations)  # Progressive blocking
-                    return False, f"Burst limit exceeded. Blocked for {60 * state.violations} seconds."
-            else:
-                return False, f"Rate limit exceeded. Max {limit.requests} requests per {limit.window} seconds."
+        limit = self.user_limits.get(user_tier, self.user_limits["default"])
+        server_rule = self._server_rule() if server_id else None
+        decision = self.local.decide(user_id, self._rule(limit), server_id, server_rule, now)
+        return self._resolve(user_id, limit, decision, now)
         
-        return True, None
-    
-    def _check_server_limit(self, server_id: str, now: float) -> Tuple[bool, Optional[str]]:
-        """Check server-wide rate limit."""
-        state = self.server_states[server_id]
-        limit = self.server_limits["default"]  # Could be configurable per server
+    def _rule(self, limit: RateLimit) -> GCRARule:
+        """GCRA parameters for a limit (cached, checks are on the hot path)."""
+        key = (limit.requests, limit.window, limit.burst)
+        rule = self._rules.get(key)
+        if rule is None:
+            rule = self._rules[key] = GCRARule.for_limit(*key)
+        return rule
         
-        # Clean old requests
-        while state.requests and now - state.requests[0] > limit.window:
-            state.requests.popleft()
+    def _server_rule(self) -> GCRARule:
+        """GCRA parameters for the server-wide limit."""
+        return self._rule(self.server_limits["default"])  # Could be configurable per server
         
-        # Check limit
-        if len(state.requests) >= limit.requests:
-            return False, "Server rate limit exceeded. Try again later."
+    def _check_blocked(self, user_id: str, now: float) -> Optional[str]:
+        """Reason the user is blocked, if they are."""
+        blocked_until = self.blocked_until.get(user_id)
+        if blocked_until is None:
+            return None
+        if now < blocked_until:
+            remaining = int(blocked_until - now)
+            return f"Rate limited. Try again in {remaining} seconds."
+        del self.blocked_until[user_id]
+        return None
         
-        return True, None
-    
-    def _record_request(self, user_id: str, server_id: Optional[str], now: float):
-        """Record successful request."""
-        self.user_states[user_id].requests.append(now)
-        self.user_states[user_id].last_request = now
+    def _resolve(self, user_id: str, limit: RateLimit, decision: str, now: float) -> Tuple[bool, Optional[str]]:
+        """Turn a backend decision into the user-facing result."""
+        if decision == ALLOW:
+            violation = self.violations.get(user_id)
+            if violation is not None and now < violation[1]:
+                # Still active, so the count keeps (only offenders have entries)
+                self.violations[user_id] = (violation[0], now + VIOLATION_IDLE_RESET)
+            return True, None
         
-        if server_id:
-            self.server_states[server_id].requests.append(now)
+        if decision == BURST:
+            # Allow burst but increase violation count
+            count, expiry = self.violations.get(user_id, (0, 0.0))
+            violations = count + 1 if now < expiry else 1
+            self.violations[user_id] = (violations, now + VIOLATION_IDLE_RESET)
+            if violations > 3:
+                self.blocked_until[user_id] = now + (60 * violations)  # Progressive blocking
+                return False, f"Burst limit exceeded. Blocked for {60 * violations} seconds."
+            return True, None
+        
+        if decision == SERVER_LIMITED:
+            return False, "Server rate limit exceeded. Try again later."
+        
+        return False, f"Rate limit exceeded. Max {limit.requests} requests per {limit.window} seconds."
     
     def add_admin_override(self, user_id: str, duration: int = 3600):
         """Add admin override for user."""
         self.admin_overrides[user_id] = time.time() + duration
         logger.info(f"Admin override added for user {user_id} for {duration} seconds")
     
-    def reset_user_limits(self, user_id: str):
+    async def reset_user_limits(self, user_id: str):
         """Reset limits for user."""
-        if user_id in self.user_states:
-            del self.user_states[user_id]
+        await self.backend.reset(user_id)
+        self.violations.pop(user_id, None)
+        self.blocked_until.pop(user_id, None)
         logger.info(f"Rate limits reset for user {user_id}")
     
-    def get_user_status(self, user_id: str) -> Dict[str, any]:
-        """Get user rate limit status."""
-        state = self.user_states.get(user_id)
-        if not state:
-            return {"requests": 0, "violations": 0, "blocked": False}
-        
+    def get_user_status(self, user_id: str, user_tier: str = "default") -> Dict[str, Any]:
+        """Get user rate limit status (request count from this process's state)."""
         now = time.time()
+        limit = self.user_limits.get(user_tier, self.user_limits["default"])
+        blocked_until = self.blocked_until.get(user_id, 0)
+        count, expiry = self.violations.get(user_id, (0, 0.0))
         return {
-            "requests": len(state.requests),
-            "violations": state.violations,
-            "blocked": now < state.blocked_until,
-            "blocked_until": state.blocked_until if now < state.blocked_until else None,
-            "last_request": state.last_request
+            "requests": self.local.pending(user_id, self._rule(limit)),
+            "violations": count if now < expiry else 0,
+            "blocked": now < blocked_until,
+            "blocked_until": blocked_until if now < blocked_until else None
         }
     
-    async def _cleanup_task(self):
-        """Cleanup old state data."""
-        while True:
-            try:
-                await asyncio.sleep(300)  # Every 5 minutes
-                now = time.time()
-                
-                # Clean user states
-                to_remove = []
-                for user_id, state in self.user_states.items():
-                    if now - state.last_request > 3600:  # 1 hour inactive
-                        to_remove.append(user_id)
-                
-                for user_id in to_remove:
-                    del self.user_states[user_id]
-                
-                # Clean admin overrides
-                expired_overrides = [
-                    user_id for user_id, expiry in self.admin_overrides.items()
-                    if now > expiry
-                ]
-                for user_id in expired_overrides:
-                    del self.admin_overrides[user_id]
-                
-                if to_remove or expired_overrides:
-                    logger.info(f"Cleaned up {len(to_remove)} user states and {len(expired_overrides)} admin overrides")
-                    
-            except Exception as e:
-                logger.error(f"Rate limiter cleanup error: {e}")
+    def cleanup(self) -> Dict[str, int]:
+        """Expire idle keys, stale violations and overrides (also done lazily on checks)."""
+        now = time.time()
+        dropped = self.backend.cleanup()
+        spam_users = self.spam_detector.cleanup(now)
+        
+        stale = [user_id for user_id, (_, expiry) in self.violations.items() if now >= expiry]
+        for user_id in stale:
+            del self.violations[user_id]
+        for user_id in [u for u, until in self.blocked_until.items() if now >= until]:
+            del self.blocked_until[user_id]
+        
+        # Clean admin overrides
+        expired_overrides = [
+            user_id for user_id, expiry in self.admin_overrides.items()
+            if now > expiry
+        ]
+        for user_id in expired_overrides:
+            del self.admin_overrides[user_id]
+        
+        return {
+            "keys_expired": dropped,
+            "spam_users_expired": spam_users,
+            "violations_cleared": len(stale),
+            "overrides_expired": len(expired_overrides)
+        }
+        
+    def get_status(self) -> Dict[str, Any]:
+        """Get limiter size counters."""
+        return {
+            **self.backend.get_status(),
+            "spam_tracked_users": len(self.spam_detector.users),
+            "violators": len(self.violations),
+            "blocked": len(self.blocked_until),
+            "admin_overrides": len(self.admin_overrides)
+        }
 
 # Global instance
-rate_limiter = AdvancedRateLimiter()
\ No newline at end of file
+rate_limiter = AdvancedRateLimiter(settings=config.rate_limit)
\ No newline at end of file
@@ -231,7 +231,55 @@ class BackgroundTaskScheduler:
             description="Clean up rate limiter state"
         )
         
+        # Provider health probes (each provider keeps its own jittered schedule)
+        self.add_interval_task(
+            "provider_health_probes",
+            self._provider_health_probe_task,
+            seconds=30,
+            description="Probe due LLM providers via cheap metadata endpoints"
+        )
+        
+        # Local model residency (pins, LRU eviction, time-of-day pre-warm)
+        self.add_interval_task(
+            "local_model_residency",
+            self._local_model_residency_task,
+            seconds=60,
+            description="Manage which local models stay loaded"
+        )
+        
+        # Local model health (may fall back to another model)
+        self.add_interval_task(
+            "model_health_checks",
+            self._model_health_check_task,
+            seconds=300,  # Every 5 minutes
+            description="Check current and fallback local models"
+        )
+        
         await asyncio.sleep(0)  # Ensure async behavior
+        
+    async def _local_model_residency_task(self):
+        """Local model residency task."""
+        try:
+            from ..models.llm_fallback import llm_system
+            await llm_system.manage_local_residency()
+        except Exception as e:
+            logger.error(f"Local model residency management failed: {e}")
+            
+    async def _model_health_check_task(self):
+        """Local model health check task."""
+        try:
+            from ..models.model_swapper import model_swapper
+            await model_swapper.run_health_checks()
+        except Exception as e:
+            logger.error(f"Model health checks failed: {e}")
+            
+    async def _provider_health_probe_task(self):
+        """Provider health probe task."""
+        try:
+            from ..models.llm_fallback import llm_system
+            await llm_system.health_check()
+        except Exception as e:
+            logger.error(f"Provider health probes failed: {e}")
     
     async def _memory_cleanup_task(self):
         """Memory cleanup task."""
@@ -289,8 +337,8 @@ class BackgroundTaskScheduler:
         """Rate limiter cleanup task."""
         try:
             from ..utils.rate_limiter import rate_limiter
-            # Cleanup is handled internally by rate_limiter
-            logger.debug("Rate limiter cleanup check completed")
+            result = rate_limiter.cleanup()
+            logger.debug(f"Rate limiter cleanup completed: {result}")
             await asyncio.sleep(0)  # Ensure async behavior
         except Exception as e:
             logger.error(f"Rate limiter cleanup failed: {e}")
@@ -1,7 +1,7 @@
 """Structured tool execution engine with safety validation."""
 import json
 import asyncio
-from typing import Dict, Any, List, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, Set, Iterator
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
 import jsonschema
@@ -36,6 +36,11 @@ class BaseTool(ABC):
         """JSON schema for tool parameters."""
         pass
     
+    @property
+    def timeout(self) -> float:
+        """Seconds before a call is abandoned."""
+        return 10.0
+        
     @abstractmethod
     async def execute(self, **kwargs) -> ToolResult:
         """Execute the tool."""
@@ -51,7 +56,7 @@ class ToolRegistry:
     def register(self, tool: BaseTool):
         """Register a tool."""
         self.tools[tool.name] = tool
-        self.execution_stats[tool.name] = {"calls": 0, "errors": 0, "avg_time": 0.0}
+        self.execution_stats[tool.name] = {"calls": 0, "errors": 0, "timeouts": 0, "avg_time": 0.0}
         logger.info(f"Registered tool: {tool.name}")
     
     def get_tool_schemas(self) -> Dict[str, Dict[str, Any]]:
@@ -81,7 +86,7 @@ class ToolRegistry:
         # Execute tool
         start_time = asyncio.get_event_loop().time()
         try:
-            result = await tool.execute(**parameters)
+            result = await asyncio.wait_for(tool.execute(**parameters), timeout=tool.timeout)
             execution_time = asyncio.get_event_loop().time() - start_time
             result.execution_time = execution_time
             
@@ -94,17 +99,49 @@ class ToolRegistry:
             
             return result
             
+        except asyncio.TimeoutError:
+            execution_time = asyncio.get_event_loop().time() - start_time
+            self.execution_stats[tool_name]["errors"] += 1
+            self.execution_stats[tool_name]["timeouts"] += 1
+            logger.warning(f"Tool {tool_name} timed out after {tool.timeout}s")
+            return ToolResult(success=False, error=f"Timed out after {tool.timeout}s", execution_time=execution_time)
+        
         except Exception as e:
             execution_time = asyncio.get_event_loop().time() - start_time
             self.execution_stats[tool_name]["errors"] += 1
             logger.error(f"Tool {tool_name} execution failed: {e}")
             return ToolResult(success=False, error=str(e), execution_time=execution_time)
 
+def _refs(value: Any) -> Iterator[str]:
+    """Ids referenced by {"$ref": id} placeholders anywhere in a parameter value."""
+    if isinstance(value, dict):
+        if set(value) == {"$ref"}:
+            yield str(value["$ref"])
+            return
+        for item in value.values():
+            yield from _refs(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _refs(item)
+
+def _substitute(value: Any, outputs: Dict[str, Any]) -> Any:
+    """Replace {"$ref": id} placeholders with the referenced call's result data."""
+    if isinstance(value, dict):
+        if set(value) == {"$ref"}:
+            return outputs[str(value["$ref"])]
+        return {key: _substitute(item, outputs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_substitute(item, outputs) for item in value]
+    return value
+
 class ToolExecutionEngine:
     """Main tool execution engine."""
     
-    def __init__(self):
+    def __init__(self, max_parallel: int = 4):
         self.registry = ToolRegistry()
+        self.max_parallel = max_parallel
+        self._slots: Optional[asyncio.Semaphore] = None  # Created inside the running loop
+        self.timing = {"turns": 0, "calls": 0, "wall_time": 0.0, "tool_time": 0.0}
         self._register_default_tools()
     
     def _register_default_tools(self):
@@ -115,14 +152,105 @@ class ToolExecutionEngine:
         self.registry.register(MemorySearchTool())
     
     async def process_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[ToolResult]:
-        """Process multiple tool calls."""
-        results = []
-        for call in tool_calls:
-            tool_name = call.get("name")
-            parameters = call.get("parameters", {})
-            result = await self.registry.execute_tool(tool_name, parameters)
-            results.append(result)
+        """Process tool calls concurrently, in dependency order; results follow call order.
+        
+        A call may have an "id" and a "depends_on" list of ids; only explicit
+        ids can be referenced. A parameter value {"$ref": id} is replaced with
+        that call's result data and implies the dependency. Calls whose
+        dependencies fail, are unknown or form a cycle fail without running,
+        as do calls sharing an id.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_parallel)
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        
+        # Calls without an id are only named (by position) in error messages
+        explicit = [call.get("id") is not None for call in tool_calls]
+        ids = [str(call["id"]) if explicit[index] else f"#{index}" for index, call in enumerate(tool_calls)]
+        positions: Dict[str, int] = {}
+        deps: List[Set[int]] = []
+        errors: Dict[int, str] = {}
+        duplicates = set()
+        for index, call_id in enumerate(ids):
+            if not explicit[index]:
+                continue
+            if call_id in positions:
+                duplicates.add(call_id)
+            positions.setdefault(call_id, index)
+        for index, call_id in enumerate(ids):
+            if explicit[index] and call_id in duplicates:
+                # Which call a reference means would be ambiguous, so none of them run
+                errors[index] = f"Duplicate call id: {call_id}"
+        
+        for index, call in enumerate(tool_calls):
+            depends_on = call.get("depends_on", [])
+            if not isinstance(depends_on, list):
+                # A string would otherwise be read as one id per character
+                errors[index] = "depends_on must be a list of ids"
+                depends_on = []
+            names = {str(name) for name in depends_on}
+            names.update(_refs(call.get("parameters", {})))
+            unknown = sorted(name for name in names if name not in positions)
+            if unknown:
+                errors.setdefault(index, f"Unknown dependency: {', '.join(unknown)}")
+            deps.append({positions[name] for name in names if name in positions})
+        
+        # Kahn's algorithm; whatever is never freed sits on a cycle
+        waiting = [len(d) for d in deps]
+        ready = [index for index, count in enumerate(waiting) if count == 0]
+        for index in ready:
+            for other, other_deps in enumerate(deps):
+                if index in other_deps:
+                    waiting[other] -= 1
+                    if waiting[other] == 0:
+                        ready.append(other)
+        for index, count in enumerate(waiting):
+            if count:
+                errors.setdefault(index, "Dependency cycle")
+        
+        tasks: Dict[int, asyncio.Task] = {}
+        
+        async def run(index: int) -> ToolResult:
+            if index in errors:
+                return ToolResult(success=False, error=errors[index])
+            outputs = {}
+            for dep in deps[index]:
+                result = await tasks[dep]
+                if not result.success:
+                    return ToolResult(success=False, error=f"Dependency '{ids[dep]}' failed: {result.error}")
+                outputs[ids[dep]] = result.data
+            
+            call = tool_calls[index]
+            parameters = _substitute(call.get("parameters", {}), outputs)
+            # Take a slot only once dependencies are done, so waiting calls cannot starve the pool
+            async with self._slots:
+                return await self.registry.execute_tool(call.get("name"), parameters)
+        
+        for index in range(len(tool_calls)):
+            tasks[index] = asyncio.ensure_future(run(index))
+        results = list(await asyncio.gather(*tasks.values()))
+        
+        self.timing["turns"] += 1
+        self.timing["calls"] += len(results)
+        self.timing["wall_time"] += loop.time() - start_time
+        self.timing["tool_time"] += sum(result.execution_time for result in results)
         return results
+        
+    def get_timing(self) -> Dict[str, Any]:
+        """Aggregated turn timing: wall clock against the serial sum of tool times."""
+        turns = self.timing["turns"]
+        wall_time = self.timing["wall_time"]
+        return {
+            "turns": turns,
+            "calls": self.timing["calls"],
+            "wall_time": round(wall_time, 3),
+            "tool_time": round(self.timing["tool_time"], 3),
+            "avg_wall_time": round(wall_time / turns, 3) if turns else 0.0,
+            "avg_tool_time": round(self.timing["tool_time"] / turns, 3) if turns else 0.0,
+            "parallel_speedup": round(self.timing["tool_time"] / wall_time, 2) if wall_time else 0.0,
+            "tools": self.registry.execution_stats
+        }
     
     def get_tools_prompt(self) -> str:
         """Get tools description for LLM prompt."""
@@ -135,6 +263,7 @@ class ToolExecutionEngine:
             tools_desc += f"- {name}: {schema['description']}\n"
         
         tools_desc += "\nTo use tools, respond with JSON: {\"tool_calls\": [{\"name\": \"tool_name\", \"parameters\": {...}}]}"
+        tools_desc += "\nCalls run in parallel. To use one call's result in another, give it an \"id\" and pass {\"$ref\": \"id\"} as a parameter value."
         return tools_desc
 
 # Default Tools
@@ -16,7 +16,14 @@ class VoiceEngine(Protocol):
 class LLMProvider(Protocol):
     """Protocol for LLM providers."""
     
-    async def generate_response(self, messages: List[Dict], temperature: float = 0.95) -> str:
+    async def generate_response(
+        self,
+        messages: List[Dict],
+        temperature: float = 0.95,
+        priority: int = 1,
+        deadline: Optional[float] = None,
+        budget: Optional[Any] = None
+    ) -> str:
         """Generate response from messages."""
         ...
     
@@ -0,0 +1,99 @@
+"""Content-hash keyed cache for security verdicts on repeated message text."""
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+_MISSING = object()
+
+class VerdictCache:
+    """Bounded LRU of check results keyed by (check, BLAKE2b of the text).
+    
+    Raids and copy-paste spam repeat the same payload; a repeat costs one
+    hash of the text and one dict lookup per check instead of re-running it.
+    Callers hash a message once with digest() and pass that to every check.
+    Keys are 16-byte digests, but sanitize, screen and rag verdicts hold the
+    sanitized text, so the cache is also bounded by the total characters of
+    text it holds (max_chars).
+    """
+    
+    def __init__(self, max_entries: int = 10_000, ttl: float = 600, max_chars: int = 2_000_000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self.chars = 0
+        self.entries: "OrderedDict[Tuple[str, bytes], Tuple[float, Any]]" = OrderedDict()
+        self.stats: Dict[str, Dict[str, int]] = {}
+        
+    def digest(self, text: str) -> bytes:
+        """Content hash identifying a text across checks."""
+        return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        
+    @staticmethod
+    def _chars(verdict: Any) -> int:
+        """Characters of text held by a verdict (a string, or strings inside a tuple)."""
+        if isinstance(verdict, str):
+            return len(verdict)
+        if isinstance(verdict, tuple):
+            return sum(len(item) for item in verdict if isinstance(item, str))
+        return 0
+        
+    def _pop(self, key: Tuple[str, bytes]):
+        """Remove one entry and its size."""
+        _, verdict = self.entries.pop(key)
+        self.chars -= self._chars(verdict)
+        
+    def _count(self, check: str, outcome: str):
+        """Bump a per-check counter."""
+        counters = self.stats.setdefault(check, {"hits": 0, "misses": 0})
+        counters[outcome] += 1
+        
+    def get(self, check: str, digest: bytes, default: Any = None) -> Any:
+        """Cached verdict, or default on a miss or expired entry."""
+        key = (check, digest)
+        entry = self.entries.get(key, _MISSING)
+        if entry is not _MISSING:
+            expires, verdict = entry
+            if time.monotonic() < expires:
+                self.entries.move_to_end(key)
+                self._count(check, "hits")
+                return verdict
+            self._pop(key)
+        self._count(check, "misses")
+        return default
+        
+    def put(self, check: str, digest: bytes, verdict: Any):
+        """Store a verdict, evicting least recently used entries when full."""
+        key = (check, digest)
+        size = self._chars(verdict)
+        if size > self.max_chars:
+            return
+        if key in self.entries:
+            self._pop(key)
+        self.entries[key] = (time.monotonic() + self.ttl, verdict)
+        self.chars += size
+        while len(self.entries) > self.max_entries or self.chars > self.max_chars:
+            self._pop(next(iter(self.entries)))
+            
+    def clear(self):
+        """Drop every verdict (e.g. after the rules change)."""
+        self.entries.clear()
+        self.chars = 0
+        
+    def get_status(self) -> Dict[str, Any]:
+        """Get size and per-check hit rates."""
+        checks = {}
+        for check, counters in self.stats.items():
+            total = counters["hits"] + counters["misses"]
+            checks[check] = {**counters, "hit_rate": round(counters["hits"] / total, 3) if total else 0.0}
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "chars": self.chars,
+            "max_chars": self.max_chars,
+            "ttl": self.ttl,
+            "checks": checks
+        }
+
+# Global instance
+verdict_cache = VerdictCache()
@@ -0,0 +1,113 @@
+"""Redis rate limit backend against an in-process fake Redis (fakeredis runs the Lua script)."""
+import asyncio
+import time
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # fakeredis needs lupa for EVAL/EVALSHA
+
+from src.utils.rate_limit_backends import (
+    ALLOW, BURST, USER_LIMITED, SERVER_LIMITED, GCRA_SCRIPT,
+    GCRARule, MemoryRateLimitBackend, RedisRateLimitBackend
+)
+
+USER_RULE = GCRARule.for_limit(3, 60, burst=1)
+SERVER_RULE = GCRARule.for_limit(4, 60)
+
+def make_backend(server: "fakeredis.FakeServer", **kwargs) -> RedisRateLimitBackend:
+    """Backend wired to a fake server instead of a real connection."""
+    backend = RedisRateLimitBackend("redis://fake", MemoryRateLimitBackend(), **kwargs)
+    backend.client = fakeredis.aioredis.FakeRedis(server=server)
+    return backend
+
+def test_script_matches_memory_backend():
+    async def run():
+        backend = make_backend(fakeredis.FakeServer())
+        shared = [await backend.acquire("alice", USER_RULE) for _ in range(5)]
+        memory = MemoryRateLimitBackend()
+        now = time.time()
+        local = [memory.decide("alice", USER_RULE, None, None, now) for _ in range(5)]
+        ttl = await backend.client.pttl("priya:rl:u:alice")
+        return shared, local, ttl
+    
+    shared, local, ttl = asyncio.run(run())
+    assert shared == local == [ALLOW, ALLOW, ALLOW, BURST, USER_LIMITED]
+    # Keys expire once the bucket has refilled: four intervals of 20s ahead
+    assert 0 < ttl <= 80_000
+
+def test_server_limit_does_not_charge_the_user():
+    async def run():
+        backend = make_backend(fakeredis.FakeServer())
+        decisions = [await backend.acquire(f"user{i}", USER_RULE, "guild", SERVER_RULE) for i in range(5)]
+        rejected_user_tat = await backend.client.get("priya:rl:u:user4")
+        return decisions, rejected_user_tat
+    
+    decisions, rejected_user_tat = asyncio.run(run())
+    assert decisions == [ALLOW] * 4 + [SERVER_LIMITED]
+    assert rejected_user_tat is None
+
+def test_concurrent_decisions_share_one_round_trip():
+    async def run():
+        backend = make_backend(fakeredis.FakeServer(), batch_window_ms=5)
+        await backend.client.script_load(GCRA_SCRIPT)
+        decisions = await asyncio.gather(*(backend.acquire(f"user{i}", USER_RULE) for i in range(10)))
+        return decisions, backend.stats
+    
+    decisions, stats = asyncio.run(run())
+    assert decisions == [ALLOW] * 10
+    assert stats["requests"] == 10
+    assert stats["round_trips"] == 1
+
+def test_full_batch_flushes_without_waiting():
+    async def run():
+        backend = make_backend(fakeredis.FakeServer(), batch_window_ms=10_000, max_batch=4)
+        await backend.client.script_load(GCRA_SCRIPT)
+        decisions = await asyncio.wait_for(
+            asyncio.gather(*(backend.acquire(f"user{i}", USER_RULE) for i in range(4))),
+            timeout=1
+        )
+        return decisions, backend.stats
+    
+    decisions, stats = asyncio.run(run())
+    assert decisions == [ALLOW] * 4
+    assert stats["round_trips"] == 1
+
+def test_script_is_reloaded_after_noscript():
+    async def run():
+        backend = make_backend(fakeredis.FakeServer())
+        # Nothing loaded yet: the first batch hits NOSCRIPT, loads the script and retries
+        first = await backend.acquire("alice", USER_RULE)
+        trips_after_first = backend.stats["round_trips"]
+        await backend.client.script_flush()
+        second = await backend.acquire("alice", USER_RULE)
+        return first, trips_after_first, second, backend.stats
+    
+    first, trips_after_first, second, stats = asyncio.run(run())
+    assert (first, second) == (ALLOW, ALLOW)
+    assert trips_after_first == 2
+    assert stats["round_trips"] == 4
+    assert stats["fallback_decisions"] == 0
+
+def test_falls_back_to_local_limits_when_unreachable():
+    async def run():
+        server = fakeredis.FakeServer()
+        server.connected = False
+        backend = make_backend(server, retry_interval=30)
+        down = [await backend.acquire("alice", USER_RULE) for _ in range(5)]
+        trips_while_down = backend.stats["round_trips"]
+        status = backend.get_status()
+        
+        server.connected = True
+        backend.down_until = 0.0  # Retry interval elapsed
+        recovered = await backend.acquire("bob", USER_RULE)
+        return down, trips_while_down, status, recovered, backend.get_status()
+    
+    down, trips_while_down, status, recovered, final = asyncio.run(run())
+    assert down == [ALLOW, ALLOW, ALLOW, BURST, USER_LIMITED]
+    # Only the first decision tried Redis; the rest went straight to the fallback
+    assert trips_while_down == 1
+    assert status["available"] is False
+    assert status["failures"] == 1
+    assert status["fallback_decisions"] == 5
+    assert recovered == ALLOW
+    assert final["available"] is True
@@ -0,0 +1,49 @@
+"""sanitize_input against the original (pre-fast-path) sanitizer on inputs past the raw cap."""
+import re
+import pytest
+
+bleach = pytest.importorskip("bleach")
+pytest.importorskip("pydantic")
+
+from src.config.settings import config
+from src.utils.security import SecurityHardening
+from src.utils.verdict_cache import VerdictCache
+
+MAX_LENGTH = 50  # Raw cap is 4x this
+
+def baseline_sanitize(sanitizer: SecurityHardening, text: str) -> str:
+    """The sanitizer before stages were skipped and raw input was capped."""
+    sanitized = bleach.clean(text, tags=sanitizer.allowed_tags, attributes=sanitizer.allowed_attributes, strip=True)
+    sanitized = re.sub(r'\s+', ' ', sanitized).strip()
+    sanitized = ''.join(char for char in sanitized if ord(char) >= 32 or char in '\n\t')
+    if len(sanitized) > MAX_LENGTH:
+        sanitized = sanitized[:MAX_LENGTH] + "... [truncated]"
+    return sanitized
+
+@pytest.fixture
+def sanitizer(monkeypatch) -> SecurityHardening:
+    monkeypatch.setattr(config.security, "max_input_length", MAX_LENGTH)
+    sanitizer = SecurityHardening()
+    sanitizer.verdict_cache = VerdictCache()
+    return sanitizer
+
+PAST_CAP = {
+    "plain": "hello world " * 40,
+    "entity_growth": "&" * 300,                                # Escaping grows every character 5x
+    "leading_whitespace": " " * 150 + "hello world " * 30,     # Prefix still fills the limit
+    "whitespace_past_cap": " " * 250 + "hello world " * 30,    # Whitespace alone exceeds the cap
+    "markup_prefix": "<div>" * 45 + "hi there " * 40,          # Stripped to nothing
+    "comment": "<!-- " + "c" * 300 + " -->visible text",       # Swallows the whole capped prefix
+    "tag_at_cut": "x" * 198 + "<b>bold</b> more " * 10,
+    "open_elements": "<b>" * 60 + "word " * 100,               # Closed at the cut
+    "entity_at_cut": "a &amp; b " * 30 + "&amp;" * 40
+}
+
+@pytest.mark.parametrize("text", list(PAST_CAP.values()), ids=list(PAST_CAP))
+def test_matches_baseline_past_the_raw_cap(sanitizer, text):
+    assert len(text) > MAX_LENGTH * 4
+    assert sanitizer.sanitize_input(text) == baseline_sanitize(sanitizer, text)
+
+def test_short_input_matches_baseline(sanitizer):
+    for text in ["hi <b>there</b>", "  spaced\t\tout  ", "<script>alert(1)</script> ok", "a < b & c > d"]:
+        assert sanitizer.sanitize_input(text) == baseline_sanitize(sanitizer, text)